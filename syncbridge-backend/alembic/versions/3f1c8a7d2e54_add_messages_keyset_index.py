@@ -0,0 +1,28 @@
+"""add messages (block_id, created_at, id) index for keyset pagination
+
+Revision ID: 3f1c8a7d2e54
+Revises: 29fd5bdc6b01
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c8a7d2e54'
+down_revision: Union[str, Sequence[str], None] = '29fd5bdc6b01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_block_created_id', 'messages', ['block_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_block_created_id', table_name='messages')
@@ -0,0 +1,78 @@
+"""unique block per (form_id, type, target_key)
+
+Adds blocks.target_key (target_id, with NULL mapped to 0 so general blocks
+participate in the unique key), merges duplicate blocks created by
+concurrent first messages (messages move to the oldest block), then adds
+the unique constraint.
+
+Revision ID: 7a4e2c9b1d30
+Revises: 3f1c8a7d2e54
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4e2c9b1d30'
+down_revision: Union[str, Sequence[str], None] = '3f1c8a7d2e54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _merge_duplicate_blocks(conn) -> None:
+    groups = conn.execute(
+        sa.text(
+            "SELECT form_id, type, target_key FROM blocks "
+            "GROUP BY form_id, type, target_key HAVING COUNT(*) > 1"
+        )
+    ).fetchall()
+    for form_id, block_type, target_key in groups:
+        rows = conn.execute(
+            sa.text(
+                "SELECT id, status, last_message_at FROM blocks "
+                "WHERE form_id = :f AND type = :t AND target_key = :k ORDER BY id"
+            ),
+            {"f": form_id, "t": block_type, "k": target_key},
+        ).fetchall()
+        keep, dupes = rows[0], rows[1:]
+        dupe_ids = [r.id for r in dupes]
+        conn.execute(
+            sa.text("UPDATE messages SET block_id = :keep WHERE block_id IN :ids").bindparams(
+                sa.bindparam("ids", expanding=True)
+            ),
+            {"keep": keep.id, "ids": dupe_ids},
+        )
+        # keep the most recent activity and any urgent flag
+        conn.execute(
+            sa.text("UPDATE blocks SET last_message_at = :last, status = :status WHERE id = :keep"),
+            {
+                "keep": keep.id,
+                "last": max(r.last_message_at for r in rows),
+                "status": "urgent" if any(r.status == "urgent" for r in rows) else keep.status,
+            },
+        )
+        conn.execute(
+            sa.text("DELETE FROM blocks WHERE id IN :ids").bindparams(sa.bindparam("ids", expanding=True)),
+            {"ids": dupe_ids},
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('blocks') as batch_op:
+        batch_op.add_column(sa.Column('target_key', sa.Integer(), nullable=False, server_default='0'))
+    op.execute("UPDATE blocks SET target_key = target_id WHERE target_id IS NOT NULL")
+    _merge_duplicate_blocks(op.get_bind())
+    with op.batch_alter_table('blocks') as batch_op:
+        batch_op.create_unique_constraint('uq_blocks_form_type_target', ['form_id', 'type', 'target_key'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('blocks') as batch_op:
+        batch_op.drop_constraint('uq_blocks_form_type_target', type_='unique')
+        batch_op.drop_column('target_key')
@@ -0,0 +1,54 @@
+"""add files.content_hash for content-addressed storage
+
+Backfills the SHA-256 of every existing attachment still present on disk.
+Existing files stay at their current storage_path; only new uploads go to
+the content-addressed layout.
+
+Revision ID: b83d5f1e6a92
+Revises: 7a4e2c9b1d30
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+import hashlib
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83d5f1e6a92'
+down_revision: Union[str, Sequence[str], None] = '7a4e2c9b1d30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('files', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_files_content_hash', 'files', ['content_hash'], unique=False)
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, storage_path FROM files WHERE content_hash IS NULL")).fetchall()
+    for file_id, storage_path in rows:
+        if not storage_path or not os.path.isfile(storage_path):
+            continue
+        conn.execute(
+            sa.text("UPDATE files SET content_hash = :h WHERE id = :id"),
+            {"h": _sha256(storage_path), "id": file_id},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_files_content_hash', table_name='files')
+    op.drop_column('files', 'content_hash')
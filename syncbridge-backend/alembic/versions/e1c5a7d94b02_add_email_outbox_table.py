@@ -0,0 +1,49 @@
+"""add email_outbox table
+
+Reminder emails are queued here in the transaction that marks their block,
+and sent by the outbox dispatcher with retries and backoff.
+
+Revision ID: e1c5a7d94b02
+Revises: b83d5f1e6a92
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1c5a7d94b02'
+down_revision: Union[str, Sequence[str], None] = 'b83d5f1e6a92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column('idempotency_key', sa.String(128), nullable=False),
+        sa.Column('recipients', sa.JSON, nullable=False),
+        sa.Column('subject', sa.String(255), nullable=False),
+        sa.Column('html', sa.Text, nullable=False),
+        sa.Column('status', sa.Enum('pending', 'sent', 'dead', name='email_outbox_status'), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.Column('last_error', sa.Text, nullable=True),
+        sa.Column('created_at', sa.DateTime, nullable=False, server_default=sa.func.now()),
+        sa.Column('sent_at', sa.DateTime, nullable=True),
+        sa.UniqueConstraint('idempotency_key', name='uq_email_outbox_idempotency_key'),
+    )
+    op.create_index('ix_email_outbox_dispatch', 'email_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_email_outbox_dispatch', 'email_outbox')
+    op.drop_table('email_outbox')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP TYPE IF EXISTS email_outbox_status')
@@ -0,0 +1,37 @@
+"""add scheduler_leases table
+
+Lease rows that elect one process to run the reminder scanners across
+workers and nodes (renewed by heartbeat, taken over once expired).
+
+Revision ID: f4a2c8e61d37
+Revises: e1c5a7d94b02
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a2c8e61d37'
+down_revision: Union[str, Sequence[str], None] = 'e1c5a7d94b02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'scheduler_leases',
+        sa.Column('name', sa.String(64), primary_key=True),
+        sa.Column('holder', sa.String(128), nullable=False),
+        sa.Column('expires_at', sa.DateTime, nullable=False),
+        sa.Column('renewed_at', sa.DateTime, nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('scheduler_leases')
@@ -10,6 +10,7 @@ from app.repositories import licenses as license_repo
 from app.repositories import users as user_repo
 from app.schemas import LoginIn, ReactivateIn, RegisterIn
 from app.utils import create_access_token, error, success
+from app.services.identity_cache import identity_cache
 from app.services.permissions import get_current_user
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
@@ -69,6 +70,7 @@ def login(payload: LoginIn, db: Session = Depends(get_db)):
         user.is_active = 0
         user.updated_at = datetime.utcnow()
         db.add(user); db.commit(); db.refresh(user)
+        identity_cache.invalidate_user(user.id)
         # 细分错误文案，仍使用 FORBIDDEN 代码
         msg = "License invalid or expired"
         if "expired" in err.lower():
@@ -1,41 +1,49 @@
 # app/routers/files.py
 import os
-import uuid
 
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.api.v1.deps import get_db
-from app.models import File as FileModel, Message, User
+from app.models import File as FileModel, User
 from app.repositories import files as file_repo
-from app.repositories import messages as message_repo
+from app.services import previews
+from app.services.access import resolve_block, resolve_file, resolve_form, resolve_message
+from app.services.archives import ArchiveEntry, safe_member_name, stream_zip, unique_arcnames
 from app.services.audit import log_audit
-from app.services.permissions import assert_can_delete_file, assert_can_upload_file, get_current_user
+from app.services.storage import STORAGE_REDIRECT_DOWNLOADS, get_storage, storage_for
+from app.services.uploads import UploadTooLarge
+from app.services.permissions import (
+    assert_can_access_block,
+    assert_can_delete_file,
+    assert_can_upload_file,
+    get_current_user,
+)
 from app.utils import error, success
+from app.utils.conditional import http_date, is_not_modified, strong_etag
+from app.utils.disposition import attachment_disposition
 
 load_dotenv()
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "10485760"))  # 10MB default
 
-# upload dir inside app folder
-HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-UPLOAD_DIR = os.path.join(HERE, "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 router = APIRouter()
 
+
 @router.post("/file")
 def upload_file(message_id: int, file: UploadFile = File(...), current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    m = message_repo.get_by_id(db, message_id)
-    if not m:
+    resolved = resolve_message(db, message_id)
+    if not resolved:
         raise HTTPException(status_code=404, detail=error("Message not found", "NOT_FOUND"))
     # permission + block/form access
-    assert_can_upload_file(m, current, db)
-    # read in chunks to avoid memory blow-up (but here simple)
-    contents = file.file.read()
-    size = len(contents)
-    if size > MAX_FILE_SIZE:
+    assert_can_upload_file(resolved[1], current, db)
+    _, ext = os.path.splitext(file.filename or "")
+    ext = ext.lstrip(".").lower()
+    # stream to a content-addressed blob in chunks; the size limit is enforced while copying
+    try:
+        stored = get_storage().put_stream(file.file, MAX_FILE_SIZE)
+    except UploadTooLarge:
         raise HTTPException(
             status_code=400,
             detail=error(
@@ -43,49 +51,154 @@ def upload_file(message_id: int, file: UploadFile = File(...), current: User = D
                 "VALIDATION_ERROR",
             ),
         )
-    filename = f"{uuid.uuid4().hex}_{file.filename}"
-    _, ext = os.path.splitext(file.filename or "")
-    ext = ext.lstrip(".").lower()
-    path = os.path.join(UPLOAD_DIR, filename)
-    with open(path, "wb") as f:
-        f.write(contents)
-    rec = file_repo.create_record(db, message_id, file.filename, file.content_type or "", size, path, ext)
+    rec = file_repo.create_record(
+        db, message_id, file.filename, file.content_type or "", stored.size, stored.path, ext, stored.sha256
+    )
+    # thumbnails / text snippets are rendered in the background
+    previews.pipeline.schedule(get_storage(), stored.path, stored.size, rec.file_type, ext)
     return success({"file_id": rec.id}, "File uploaded")
 
 @router.get("/file/{id}")
-def get_file(id: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    rec = file_repo.get_by_id(db, id)
-    if not rec:
+def get_file(id: int, request: Request, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Download an attachment.
+
+    Content-addressed files carry a strong ETag (their SHA-256) and a
+    Last-Modified of the upload time; matching If-None-Match /
+    If-Modified-Since gets a 304 without touching storage. Local blobs are
+    served by FileResponse (Range / 206 / If-Range included); object-store
+    blobs redirect to a presigned URL, or are streamed through when
+    redirects are disabled.
+    """
+    # file + message/block/form chain in one query
+    resolved = resolve_file(db, id)
+    if not resolved:
         raise HTTPException(status_code=404, detail=error("Not found", "NOT_FOUND"))
+    rec, access = resolved
     # check permission: ensure requester can access the message's block/form
-    m = message_repo.get_by_id(db, rec.message_id)
-    if not m:
-        raise HTTPException(status_code=404, detail=error("Message not found", "NOT_FOUND"))
-    assert_can_upload_file(m, current, db)
-    # stream the file if it exists on disk
-    if rec.storage_path and os.path.exists(rec.storage_path):
-        return FileResponse(
-            rec.storage_path,
-            media_type=rec.file_type or "application/octet-stream",
-            filename=rec.file_name,
-        )
-    raise HTTPException(status_code=404, detail=error("File content not found", "NOT_FOUND"))
+    assert_can_upload_file(access, current, db)
+
+    headers = {"Cache-Control": "private, no-cache"}
+    if rec.content_hash:
+        # blobs are immutable: the hash is the entity tag
+        headers["ETag"] = strong_etag(rec.content_hash)
+        if rec.created_at is not None:
+            headers["Last-Modified"] = http_date(rec.created_at)
+        if is_not_modified(request.headers, headers["ETag"], rec.created_at):
+            return Response(status_code=304, headers=headers)
+
+    response = _serve(rec.storage_path or "", rec.file_type or "application/octet-stream", headers, rec.file_name)
+    if response is None:
+        raise HTTPException(status_code=404, detail=error("File content not found", "NOT_FOUND"))
+    return response
+
+
+@router.get("/file/{id}/preview")
+def get_file_preview(id: int, request: Request, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Thumbnail (images, first PDF page; WebP) or text snippet of an attachment.
+
+    Previews are rendered in the background after upload; one that is
+    missing is rendered now. 404 when the type has no preview or the
+    renderer is not installed.
+    """
+    resolved = resolve_file(db, id)
+    if not resolved:
+        raise HTTPException(status_code=404, detail=error("Not found", "NOT_FOUND"))
+    rec, access = resolved
+    assert_can_upload_file(access, current, db)
+
+    kind = previews.preview_kind(rec.file_type, rec.file_ext)
+    if kind is None or not rec.content_hash:
+        raise HTTPException(status_code=404, detail=error("No preview for this file type", "NOT_FOUND"))
+
+    headers = {"Cache-Control": "private, no-cache", "ETag": strong_etag(f"{rec.content_hash}-{kind.suffix}")}
+    if is_not_modified(request.headers, headers["ETag"], None):
+        return Response(status_code=304, headers=headers)
+
+    storage = storage_for(rec.storage_path)
+    if not previews.pipeline.ensure(storage, rec.storage_path, kind, rec.file_size):
+        raise HTTPException(status_code=404, detail=error("Preview not available", "NOT_FOUND"))
+    response = _serve(previews.preview_location(rec.storage_path, kind), kind.media_type, headers)
+    if response is None:
+        raise HTTPException(status_code=404, detail=error("Preview not available", "NOT_FOUND"))
+    return response
+
+
+def _serve(location: str, media_type: str, headers: dict, filename: str | None = None):
+    """Response for a stored object: local file, presigned redirect or proxied stream; None if missing."""
+    storage = storage_for(location)
+    local_path = storage.local_path(location)
+    if local_path:
+        return FileResponse(local_path, headers=headers, media_type=media_type, filename=filename)
+    if STORAGE_REDIRECT_DOWNLOADS:
+        url = storage.presigned_url(location, filename or os.path.basename(location), media_type)
+        if url:
+            # the object store serves the bytes (and ranges) directly
+            return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
+    if location and storage.exists(location):
+        if filename is not None:
+            headers["Content-Disposition"] = attachment_disposition(filename)
+        return StreamingResponse(storage.open_stream(location), media_type=media_type, headers=headers)
+    return None
+
 
 @router.delete("/file/{id}")
 def delete_file(id: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    rec = file_repo.get_by_id(db, id)
-    if not rec:
+    resolved = resolve_file(db, id)
+    if not resolved:
         raise HTTPException(status_code=404, detail=error("Not found", "NOT_FOUND"))
-    assert_can_delete_file(rec, current, db)
+    rec, access = resolved
+    assert_can_delete_file(access, current, db)
     
     # Audit log before deletion
     log_audit(db, "file", rec.id, "delete", current.id, {"file_name": rec.file_name, "file_size": rec.file_size, "message_id": rec.message_id}, None)
     
-    # delete file from disk if exists
-    try:
-        if rec.storage_path and os.path.exists(rec.storage_path):
-            os.remove(rec.storage_path)
-    except Exception:
-        pass
     file_repo.delete_record(db, rec)
+    # The blob is left in place: it is shared by content hash, and a concurrent
+    # upload of the same content may be about to reference it again. storage_gc
+    # removes blobs (and their previews) once no row references them.
     return success(None, "File deleted")
+
+
+# ============================================================
+# ZIP export
+# ============================================================
+def _zip_response(db: Session, form_id: int, block_id: int | None, download_name: str) -> StreamingResponse:
+    rows = file_repo.list_for_export(db, form_id, block_id)
+    # everything the stream needs is read now; the generator never touches the session
+    names = unique_arcnames(
+        f"{block_type if not target_id else f'{block_type}-{target_id}'}/{safe_member_name(rec.file_name)}"
+        for rec, block_type, target_id in rows
+    )
+    entries = [
+        ArchiveEntry(arcname=name, location=rec.storage_path, size=rec.file_size, modified=rec.created_at)
+        for name, (rec, _, _) in zip(names, rows)
+    ]
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": attachment_disposition(download_name), "Cache-Control": "private, no-store"},
+    )
+
+
+@router.get("/form/{id}/files.zip")
+def export_form_files(id: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """All attachments of a form as one ZIP (one folder per block), streamed as it is built."""
+    form = resolve_form(db, id)
+    if not form:
+        raise HTTPException(status_code=404, detail=error("Form not found", "NOT_FOUND"))
+    # one check for the whole archive: every file belongs to one of this form's blocks
+    assert_can_access_block(form, current, db)
+    return _zip_response(db, id, None, f"form-{id}-files.zip")
+
+
+@router.get("/block/{id}/files.zip")
+def export_block_files(id: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """All attachments of one block as a ZIP."""
+    resolved = resolve_block(db, id)
+    if not resolved:
+        raise HTTPException(status_code=404, detail=error("Block not found", "NOT_FOUND"))
+    block, form = resolved
+    assert_can_access_block(form, current, db)
+    return _zip_response(db, block.form_id, block.id, f"form-{block.form_id}-block-{block.id}-files.zip")
@@ -8,6 +8,7 @@ from app.models import Form, User
 from app.repositories import forms as form_repo
 from app.schemas import FormCreate, FormUpdate
 from app.services.audit import log_audit
+from app.services.events import FormStatusChanged, bus
 from app.services.permissions import (
     assert_can_create_mainform,
     assert_can_create_subform,
@@ -190,6 +191,7 @@ def update_status(id: int, body: dict = Body(...), current: User = Depends(get_c
                 old_status = f.status if f.status != new_status else "rewrite" if new_status == "processing" else "processing"
                 db.add(f); db.commit(); db.refresh(f)
                 log_audit(db, "form", f.id, "status_change", current.id, {"status": old_status, "approval_flags": 0}, {"status": new_status, "approval_flags": 0})
+                bus.publish(FormStatusChanged(form_id=f.id, status=f.status, approval_flags=f.approval_flags))
                 return success({"status": f.status, "approval_flags": f.approval_flags}, "Status updated (both approved)")
             else:
                 db.add(f); db.commit(); db.refresh(f)
@@ -221,6 +223,7 @@ def update_status(id: int, body: dict = Body(...), current: User = Depends(get_c
                     old_status = f.status if f.status != new_status else "rewrite" if new_status == "processing" else "processing"
                     db.add(f); db.commit(); db.refresh(f)
                     log_audit(db, "form", f.id, "status_change", current.id, {"status": old_status, "approval_flags": 0}, {"status": new_status, "approval_flags": 0})
+                    bus.publish(FormStatusChanged(form_id=f.id, status=f.status, approval_flags=f.approval_flags))
                     return success({"status": f.status, "approval_flags": f.approval_flags}, "Status updated (both approved)")
                 else:
                     db.add(f); db.commit(); db.refresh(f)
@@ -238,5 +241,6 @@ def update_status(id: int, body: dict = Body(...), current: User = Depends(get_c
     
     # Audit log (isolated, failure won't break response)
     log_audit(db, "form", f.id, "status_change", current.id, {"status": old_status}, {"status": new_status})
+    bus.publish(FormStatusChanged(form_id=f.id, status=f.status, approval_flags=f.approval_flags))
     
     return success({"status": f.status, "approval_flags": f.approval_flags}, "Status updated")
@@ -1,35 +1,25 @@
 # app/routers/messages.py
-from typing import Optional
-
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.api.v1.deps import get_db
+from app.api.v1.deps import get_async_db, get_db
 from app.models import Block, Message, User
+from app.repositories import aio
 from app.repositories import blocks as block_repo
 from app.repositories import files as file_repo
-from app.repositories import forms as form_repo
 from app.repositories import messages as message_repo
 from app.schemas import MessageIn, MessageUpdate
+from app.services.access import resolve_block, resolve_form, resolve_message
+from app.services import messaging
 from app.services.audit import log_audit
+from app.services.events import BlockStatusChanged, MessageCreated, MessageDeleted, MessageUpdated, bus
 from app.services.permissions import assert_can_access_block, assert_can_edit_message, assert_can_post_message, get_current_user
-from app.services.websocket_manager import manager
 from app.utils import error, success
 
 router = APIRouter()
 
 
-# ============================================================
-# Helper: build consistent WS room key
-# ============================================================
-def _make_room_key(form_id: int, function_id: Optional[int], nonfunction_id: Optional[int]):
-    if function_id:
-        return f"form:{form_id}:function:{function_id}"
-    if nonfunction_id:
-        return f"form:{form_id}:nonfunction:{nonfunction_id}"
-    return f"form:{form_id}:general"
-
-
 # ============================================================
 # GET messages
 # ============================================================
@@ -40,21 +30,41 @@ def get_messages(
     nonfunction_id: int = None,
     page: int = 1,
     page_size: int = 20,
+    cursor: str = None,
+    include_total: bool = True,
     current: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    form = form_repo.get(db, form_id)
+    """
+    Latest-first message feed of a block.
+
+    Offset mode (``page``) is kept for existing clients; every response also
+    carries ``next_cursor``. Passing it back as ``cursor`` switches to keyset
+    pagination, whose cost does not grow with depth. ``include_total=false``
+    skips the COUNT query.
+    """
+    form = resolve_form(db, form_id)
     if not form:
         raise HTTPException(status_code=404, detail=error("Form not found", "NOT_FOUND"))
 
     assert_can_access_block(form, current, db)
 
-    block = block_repo.get_or_create(db, form_id, function_id, nonfunction_id)
-    items, total = message_repo.list_messages(db, block.id, page, page_size)
-
+    # cached block id: no lookup on the hot path
+    block_id = block_repo.ensure_id(db, form_id, *block_repo.block_key(function_id, nonfunction_id))
+    if cursor:
+        try:
+            items, total, next_cursor = message_repo.list_messages_after_cursor(
+                db, block_id, cursor, page_size, include_total
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail=error("Invalid cursor", "VALIDATION_ERROR"))
+    else:
+        items, total, next_cursor = message_repo.list_messages(db, block_id, page, page_size, include_total)
+
+    attachments_by_message = file_repo.list_by_messages(db, [m.id for m in items])
     out = []
     for m in items:
-        attachments = file_repo.list_by_message(db, m.id)
+        attachments = attachments_by_message[m.id]
         out.append(
             {
                 "id": m.id,
@@ -75,21 +85,21 @@ def get_messages(
         )
 
     return success(
-        {"messages": out, "page": page, "page_size": page_size, "total": total}
+        {"messages": out, "page": page, "page_size": page_size, "total": total, "next_cursor": next_cursor}
     )
 
 
 # ============================================================
 # POST message
-# (Here we add WebSocket broadcast)
+# (WebSocket broadcast via the event bus)
 # ============================================================
 @router.post("/message")
 async def post_message(
     payload: MessageIn,
     current: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    form = form_repo.get(db, payload.form_id)
+    form = await aio.run(db, resolve_form, payload.form_id)
     if not form:
         raise HTTPException(status_code=404, detail=error("Form not found", "NOT_FOUND"))
 
@@ -97,34 +107,31 @@ async def post_message(
     assert_can_access_block(form, current, db)
     assert_can_post_message(form, current)
 
-    # Create / get block
-    block = block_repo.get_or_create(
-        db, payload.form_id, payload.function_id, payload.nonfunction_id
+    # Find/create block, insert message and reset its reminder clock in one transaction
+    msg = await aio.run(
+        db,
+        messaging.post_message,
+        payload.form_id,
+        current.id,
+        payload.text_content,
+        payload.function_id,
+        payload.nonfunction_id,
     )
-
-    msg = message_repo.create_message(db, block.id, current.id, payload.text_content)
-
-    # Track activity time for reminder checks
-    block_repo.touch_activity(db, block)
-
-    # ========== WebSocket Broadcast ==========
-    room = _make_room_key(payload.form_id, payload.function_id, payload.nonfunction_id)
-
-    await manager.broadcast(
-        room,
-        {
-            "type": "message",
-            "action": "create",
-            "message": {
-                "id": msg.id,
-                "block_id": msg.block_id,
-                "user_id": msg.user_id,
-                "text_content": msg.text_content,
-                "created_at": str(msg.created_at),
-            },
-        },
+    block_type, target_id = block_repo.block_key(payload.function_id, payload.nonfunction_id)
+
+    # WebSocket fan-out happens in the event bus dispatcher, not on this request
+    bus.publish(
+        MessageCreated(
+            form_id=payload.form_id,
+            block_type=block_type,
+            target_id=target_id,
+            message_id=msg.id,
+            block_id=msg.block_id,
+            user_id=msg.user_id,
+            text_content=msg.text_content,
+            created_at=msg.created_at,
+        )
     )
-    # =========================================
 
     return success({"message_id": msg.id}, "Message sent")
 
@@ -143,17 +150,17 @@ def update_block_status(
     if status not in ("normal", "urgent"):
         raise HTTPException(status_code=400, detail=error("Invalid status", "VALIDATION_ERROR"))
 
-    block = block_repo.get_by_id(db, id)
-    if not block:
+    resolved = resolve_block(db, id)
+    if not resolved:
         raise HTTPException(status_code=404, detail=error("Block not found", "NOT_FOUND"))
-
-    form = form_repo.get(db, block.form_id)
-    if not form:
-        raise HTTPException(status_code=404, detail=error("Form not found", "NOT_FOUND"))
+    block, form = resolved
 
     assert_can_access_block(form, current, db)
 
     block_repo.update_status(db, block, status)
+    bus.publish(
+        BlockStatusChanged(form_id=block.form_id, block_type=block.type, target_id=block.target_id, block_id=block.id, status=block.status)
+    )
     return success(None, "Block status updated")
 
 
@@ -166,11 +173,12 @@ async def update_message(
     id: int,
     payload: MessageUpdate,
     current: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    msg = message_repo.get_by_id(db, id)
-    if not msg:
+    resolved = await aio.run(db, resolve_message, id)
+    if not resolved:
         raise HTTPException(status_code=404, detail=error("Message not found", "NOT_FOUND"))
+    msg, access = resolved
 
     assert_can_edit_message(msg, current)
 
@@ -178,26 +186,19 @@ async def update_message(
     if not changes:
         raise HTTPException(status_code=400, detail=error("No valid fields to update", "VALIDATION_ERROR"))
 
-    message_repo.update_message(db, msg, changes)
-
-    # WS broadcast updated content
-    block = block_repo.get_by_id(db, msg.block_id)
-    room = _make_room_key(block.form_id, block.target_id if block.type == "function" else None,
-                          block.target_id if block.type == "nonfunction" else None)
-
-    await manager.broadcast(
-        room,
-        {
-            "type": "message",
-            "action": "update",
-            "message": {
-                "id": msg.id,
-                "block_id": msg.block_id,
-                "user_id": msg.user_id,
-                "text_content": msg.text_content,
-                "updated_at": str(msg.updated_at),
-            },
-        },
+    await aio.messages.update_message(db, msg, changes)
+
+    bus.publish(
+        MessageUpdated(
+            form_id=access.form.id,
+            block_type=access.block_type,
+            target_id=access.target_id,
+            message_id=msg.id,
+            block_id=msg.block_id,
+            user_id=msg.user_id,
+            text_content=msg.text_content,
+            updated_at=msg.updated_at,
+        )
     )
 
     return success(None, "Message updated")
@@ -211,32 +212,20 @@ async def update_message(
 async def delete_message(
     id: int,
     current: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    msg = message_repo.get_by_id(db, id)
-    if not msg:
+    resolved = await aio.run(db, resolve_message, id)
+    if not resolved:
         raise HTTPException(status_code=404, detail=error("Message not found", "NOT_FOUND"))
+    msg, access = resolved
 
     assert_can_edit_message(msg, current)
 
-    # Get block info before deletion
-    block = block_repo.get_by_id(db, msg.block_id)
-    room = _make_room_key(block.form_id, block.target_id if block.type == "function" else None,
-                          block.target_id if block.type == "nonfunction" else None)
-
     # Audit log before deletion
-    log_audit(db, "message", msg.id, "delete", current.id, {"text_content": msg.text_content[:100], "block_id": msg.block_id}, None)
-
-    message_repo.delete_message(db, msg)
-
-    # WS broadcast delete event
-    await manager.broadcast(
-        room,
-        {
-            "type": "message",
-            "action": "delete",
-            "message_id": id,
-        },
-    )
+    await aio.run(db, log_audit, "message", msg.id, "delete", current.id, {"text_content": msg.text_content[:100], "block_id": msg.block_id}, None)
+
+    await aio.messages.delete_message(db, msg)
+
+    bus.publish(MessageDeleted(form_id=access.form.id, block_type=access.block_type, target_id=access.target_id, message_id=id))
 
     return success(None, "Message deleted")
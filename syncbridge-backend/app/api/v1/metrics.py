@@ -0,0 +1,37 @@
+# app/routers/metrics.py
+from fastapi import APIRouter, Depends
+
+from app.core.database import async_engine, async_pool_metrics, engine, sync_pool_metrics
+from app.models import User
+from app.services.events import bus
+from app.services.identity_cache import identity_cache
+from app.services.loop_monitor import monitor as loop_monitor
+from app.services.outbox import dispatcher as outbox_dispatcher
+from app.services.previews import pipeline as preview_pipeline
+from app.services.reminders import reminder_lease, scheduler as reminder_scheduler
+from app.services.permissions import get_current_user, require_role
+from app.services.websocket_manager import manager
+from app.utils import success
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("")
+def get_metrics(current: User = Depends(get_current_user)):
+    """Per-worker runtime counters for capacity planning (admin only)."""
+    require_role(current, "admin")
+    return success(
+        {
+            "db_pool": {
+                "sync": sync_pool_metrics.snapshot(engine.pool),
+                "async": async_pool_metrics.snapshot(async_engine.sync_engine.pool),
+            },
+            "websocket": manager.stats(),
+            "event_bus": dict(bus.metrics),
+            "identity_cache": {"hits": identity_cache.hits, "misses": identity_cache.misses},
+            "previews": dict(preview_pipeline.metrics),
+            "email_outbox": outbox_dispatcher.snapshot(),
+            "reminder_scheduler": {**reminder_scheduler.snapshot(), "lease": reminder_lease.snapshot()},
+            "event_loop_lag": loop_monitor.snapshot(),
+        }
+    )
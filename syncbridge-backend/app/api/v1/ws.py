@@ -2,11 +2,10 @@
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.v1.deps import get_db
-from app.repositories import forms as form_repo
-from app.repositories import users as user_repo
+from app.api.v1.deps import get_async_db
+from app.repositories import aio
 from app.services import permissions
 from app.services.websocket_manager import manager
 from app.utils import decode_access_token
@@ -29,7 +28,7 @@ async def websocket_endpoint(websocket: WebSocket,
                              form_id: int = Query(...),
                              function_id: Optional[int] = Query(None),
                              nonfunction_id: Optional[int] = Query(None),
-                             db: Session = Depends(get_db)):
+                             db: AsyncSession = Depends(get_async_db)):
     """
     WebSocket endpoint.
 
@@ -60,13 +59,13 @@ async def websocket_endpoint(websocket: WebSocket,
         await websocket.close(code=1008)
         return
 
-    user = user_repo.get_by_id(db, int(uid))
+    user = await aio.run(db, permissions.load_principal, int(uid), payload.get("iat"))
     if not user:
         await websocket.close(code=1008)
         return
 
     # Validate that requested form exists and user can access its block
-    form = form_repo.get(db, form_id)
+    form = await aio.forms.get(db, form_id)
     if not form:
         await websocket.close(code=1008)
         return
@@ -79,6 +78,10 @@ async def websocket_endpoint(websocket: WebSocket,
         await websocket.close(code=1008)
         return
 
+    # Handshake done: hand the DB connection back to the pool for the
+    # (possibly hours-long) lifetime of the socket.
+    await db.close()
+
     # compute room key
     room = _room_key(form_id, function_id, nonfunction_id)
 
@@ -1,10 +1,14 @@
 import os
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from dotenv import load_dotenv
 
+from app.core.pool_metrics import PoolMetrics, instrumented
 from app.models.base import Base
 
 load_dotenv()
@@ -16,9 +20,68 @@ if not DATABASE_URL:
         "DATABASE_URL is not set. Create a .env file (see .env.template)."
     )
 
+# Sync driver -> asyncio driver used for the non-blocking session
+_ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto the matching asyncio driver."""
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return url  # already an async driver (or one we don't know how to map)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+# Optional override, e.g. ASYNC_DATABASE_URL=mysql+asyncmy://...
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+# Pool tuning (per worker process; total connections = workers * (size + overflow))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds before a pooled connection is replaced; keep below MySQL wait_timeout. -1 = never
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Pre-ping costs a round trip per checkout; with a sane DB_POOL_RECYCLE it can be turned off
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("true", "1", "yes")
+
+sync_pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
+
+
+def engine_options(url: str, pool_cls: type, metrics: PoolMetrics) -> dict:
+    """create_engine kwargs from the DB_POOL_* settings."""
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite uses its own single-connection/static pools; sizing does not apply
+        return options
+    options.update(
+        poolclass=instrumented(pool_cls, metrics),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
+
+
 engine = create_engine(
     DATABASE_URL,
-    pool_pre_ping=True,
+    **engine_options(DATABASE_URL, QueuePool, sync_pool_metrics),
+)
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Used by async routes / the WebSocket handshake so DB I/O never blocks the event loop.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **engine_options(ASYNC_DATABASE_URL, AsyncAdaptedQueuePool, async_pool_metrics),
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+# expire_on_commit=False: attributes stay readable after commit without a lazy
+# (implicitly blocking) reload outside of run_sync.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
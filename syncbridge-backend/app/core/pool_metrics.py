@@ -0,0 +1,84 @@
+"""
+Connection pool instrumentation.
+
+``instrumented(QueuePool, metrics)`` returns a pool class whose ``connect()``
+(one checkout) is timed and counted. The metrics object lives on the class,
+so it survives ``engine.dispose()`` / pool recreation.
+"""
+import threading
+import time
+from collections import deque
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    def __init__(self, name: str, samples: int = 1024):
+        self.name = name
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=samples)
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def record_checkout(self, seconds: float, pool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_latency += seconds
+            self.max_latency = max(self.max_latency, seconds)
+            self._latencies.append(seconds)
+            if pool.overflow() > 0:
+                self.overflow_checkouts += 1
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, pool=None) -> dict:
+        """Counters plus, for a QueuePool, its live size/overflow/saturation."""
+        with self._lock:
+            recent = sorted(self._latencies)
+            out = {
+                "checkouts": self.checkouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "timeouts": self.timeouts,
+                "checkout_latency_ms": {
+                    "avg": round(self.total_latency / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                    "p95": round(recent[int(len(recent) * 0.95) - 1] * 1000, 3) if recent else 0.0,
+                    "max": round(self.max_latency * 1000, 3),
+                },
+            }
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            out.update(
+                {
+                    "pool_size": pool.size(),
+                    "max_overflow": pool._max_overflow,
+                    "checked_out": pool.checkedout(),
+                    "checked_in": pool.checkedin(),
+                    "overflow": max(pool.overflow(), 0),
+                    "saturation": round(pool.checkedout() / capacity, 3) if capacity else 0.0,
+                }
+            )
+        return out
+
+
+class _InstrumentedPool:
+    metrics: PoolMetrics
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start, self)
+        return conn
+
+
+def instrumented(pool_cls: type, metrics: PoolMetrics) -> type:
+    return type(f"Instrumented{pool_cls.__name__}", (_InstrumentedPool, pool_cls), {"metrics": metrics})
@@ -5,8 +5,15 @@ from contextlib import suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.v1 import auth, files, forms, functions, messages, nonfunctions, ws
-from app.services.reminders import start_urgent_loop, start_normal_loop
+from app.api.v1 import auth, files, forms, functions, messages, metrics, nonfunctions, ws
+from app.services.events import bus as event_bus
+from app.services.previews import pipeline as preview_pipeline
+from app.services import background
+from app.services.loop_monitor import monitor as loop_monitor
+from app.services.outbox import dispatcher as outbox_dispatcher, start_outbox_loop
+from app.services.reminders import start_reminder_scheduler
+from app.services.storage_gc import GC_INTERVAL_SECONDS, start_gc_loop
+from app.services.websocket_manager import manager as ws_manager
 
 app = FastAPI()
 
@@ -32,20 +39,41 @@ app.include_router(nonfunctions.router, prefix="/api/v1")
 app.include_router(messages.router, prefix="/api/v1")
 app.include_router(files.router, prefix="/api/v1")
 app.include_router(ws.router, prefix="/api/v1")
+app.include_router(metrics.router, prefix="/api/v1")
 
 
 @app.on_event("startup")
 async def _startup():
-	# 启动两个独立的提醒循环：urgent 每分钟，normal 每小时
-	app.state.reminder_urgent_task = asyncio.create_task(start_urgent_loop())
-	app.state.reminder_normal_task = asyncio.create_task(start_normal_loop())
+	# 订阅 WS backplane，让其他 worker 的 broadcast 也能送达本进程的连接
+	await ws_manager.start()
+	# 后台事件分发：接口提交后立即返回，WS 推送由 dispatcher 完成
+	event_bus.start()
+	# 事件循环延迟采样（/metrics 中的 event_loop_lag）
+	loop_monitor.start()
+	# 提醒调度：睡到最近的 last_message_at + 阈值 再扫描，另有定期全量对账兜底
+	# 多 worker 时只有持有 scheduler_leases 租约的进程在扫描（REMINDER_CLAIM_MODE=skip_locked 则各进程分摊）
+	app.state.reminder_task = asyncio.create_task(start_reminder_scheduler())
+	# 提醒只写入 email_outbox，由 dispatcher 批量发送（退避重试、死信）
+	app.state.outbox_task = asyncio.create_task(start_outbox_loop())
+	# 定期清理孤立附件（删除文件时不再直接删 blob）；多实例时只有持有 storage_gc 租约的进程执行
+	if GC_INTERVAL_SECONDS > 0:
+		app.state.storage_gc_task = asyncio.create_task(start_gc_loop())
 
 
 @app.on_event("shutdown")
 async def _shutdown():
-	for name in ("reminder_urgent_task", "reminder_normal_task"):
+	for name in ("reminder_task", "outbox_task", "storage_gc_task"):
 		task = getattr(app.state, name, None)
 		if task:
 			task.cancel()
 			with suppress(asyncio.CancelledError):
 				await task
+	# 后台 DB / 发信线程池
+	outbox_dispatcher.shutdown()
+	background.shutdown()
+	await loop_monitor.stop()
+	await event_bus.drain()
+	await event_bus.stop()
+	await ws_manager.stop()
+	# 预览渲染进程池
+	preview_pipeline.shutdown()
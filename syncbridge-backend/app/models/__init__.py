@@ -7,6 +7,8 @@ from app.models.block import Block
 from app.models.message import Message
 from app.models.file import File
 from app.models.audit_log import AuditLog
+from app.models.email_outbox import EmailOutbox
+from app.models.scheduler_lease import SchedulerLease
 
 __all__ = [
     "User",
@@ -18,4 +20,6 @@ __all__ = [
     "Message",
     "File",
     "AuditLog",
+    "EmailOutbox",
+    "SchedulerLease",
 ]
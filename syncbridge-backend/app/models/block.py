@@ -1,12 +1,20 @@
-from sqlalchemy import Integer, DateTime, Enum, ForeignKey, func, Index, SmallInteger
+from sqlalchemy import Integer, DateTime, Enum, ForeignKey, func, Index, SmallInteger, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .base import Base
 
+
+def _target_key_default(context) -> int:
+    return context.get_current_parameters().get("target_id") or 0
+
+
 class Block(Base):
     __tablename__ = "blocks"
     __table_args__ = (
         Index("ix_blocks_form_id", "form_id"),
         Index("ix_blocks_reminder_scan", "status", "reminder_sent", "last_message_at"),
+        # one block per thread; target_key is target_id with NULL (general) mapped to 0,
+        # since unique indexes treat NULLs as distinct
+        UniqueConstraint("form_id", "type", "target_key", name="uq_blocks_form_type_target"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -23,6 +31,7 @@ class Block(Base):
         default="general",
     )
     target_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    target_key: Mapped[int] = mapped_column(Integer, nullable=False, default=_target_key_default, server_default="0")
 
     last_message_at: Mapped[object] = mapped_column(DateTime, nullable=False, server_default=func.now())
     reminder_sent: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0)
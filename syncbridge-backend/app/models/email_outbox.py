@@ -0,0 +1,29 @@
+from sqlalchemy import String, Integer, DateTime, Enum, JSON, Text, Index, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        # one row per logical email, e.g. "reminder:<block id>:<last activity>"
+        UniqueConstraint("idempotency_key", name="uq_email_outbox_idempotency_key"),
+        # dispatcher scan: pending rows whose next attempt is due
+        Index("ix_email_outbox_dispatch", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key: Mapped[str] = mapped_column(String(128), nullable=False)
+    recipients: Mapped[list] = mapped_column(JSON, nullable=False)
+    subject: Mapped[str] = mapped_column(String(255), nullable=False)
+    html: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(
+        Enum("pending", "sent", "dead", name="email_outbox_status"),
+        nullable=False,
+        default="pending",
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[object] = mapped_column(DateTime, nullable=False, server_default=func.now())
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[object] = mapped_column(DateTime, nullable=False, server_default=func.now())
+    sent_at: Mapped[object | None] = mapped_column(DateTime, nullable=True)
@@ -6,6 +6,8 @@ class File(Base):
     __tablename__ = "files"
     __table_args__ = (
         Index("ix_files_message_id", "message_id"),
+        # blob reference counting (rows sharing a content-addressed blob)
+        Index("ix_files_content_hash", "content_hash"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -16,6 +18,7 @@ class File(Base):
     file_size: Mapped[int] = mapped_column(Integer, nullable=False)
     file_ext: Mapped[str] = mapped_column(String(16), nullable=False, default="")
     storage_path: Mapped[str] = mapped_column(Text, nullable=False)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)  # sha256 hex
 
     created_at: Mapped[object] = mapped_column(DateTime, nullable=False, server_default=func.now())
 
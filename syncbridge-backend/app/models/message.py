@@ -7,6 +7,8 @@ class Message(Base):
     __table_args__ = (
         Index("ix_messages_block_id", "block_id"),
         Index("ix_messages_user_id", "user_id"),
+        # keyset pagination of a block's feed: WHERE block_id = ? ORDER BY created_at, id
+        Index("ix_messages_block_created_id", "block_id", "created_at", "id"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
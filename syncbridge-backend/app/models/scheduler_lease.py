@@ -0,0 +1,13 @@
+from sqlalchemy import String, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+
+
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+
+    # one row per singleton background job, e.g. "reminders"
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(128), nullable=False)
+    expires_at: Mapped[object] = mapped_column(DateTime, nullable=False)
+    renewed_at: Mapped[object] = mapped_column(DateTime, nullable=False, server_default=func.now())
@@ -0,0 +1,69 @@
+"""
+Async variants of the repository modules.
+
+Each attribute mirrors a sync repository module; calling one of its functions
+with an AsyncSession runs the sync implementation through
+``AsyncSession.run_sync``. The queries then go through the asyncio driver, so
+the event loop is never blocked, and there is still a single implementation
+of every query.
+
+    from app.repositories import aio
+
+    form = await aio.forms.get(db, form_id)
+"""
+from typing import Any, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import blocks as _blocks
+from . import files as _files
+from . import forms as _forms
+from . import functions as _functions
+from . import licenses as _licenses
+from . import messages as _messages
+from . import nonfunctions as _nonfunctions
+from . import users as _users
+
+
+async def run(db: AsyncSession, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run any ``fn(sync_session, *args, **kwargs)`` on an AsyncSession."""
+    return await db.run_sync(fn, *args, **kwargs)
+
+
+class AsyncRepository:
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name: str):
+        fn = getattr(self._module, name)
+        if not callable(fn):
+            return fn
+
+        async def call(db: AsyncSession, *args, **kwargs):
+            return await db.run_sync(fn, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = fn.__doc__
+        return call
+
+
+users = AsyncRepository(_users)
+licenses = AsyncRepository(_licenses)
+forms = AsyncRepository(_forms)
+functions = AsyncRepository(_functions)
+nonfunctions = AsyncRepository(_nonfunctions)
+blocks = AsyncRepository(_blocks)
+messages = AsyncRepository(_messages)
+files = AsyncRepository(_files)
+
+__all__ = [
+    "run",
+    "users",
+    "licenses",
+    "forms",
+    "functions",
+    "nonfunctions",
+    "blocks",
+    "messages",
+    "files",
+]
@@ -1,45 +1,185 @@
+import os
+import threading
+from collections import OrderedDict
 from datetime import datetime
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.models import Block
+from app.services.deadlines import note_activity
+
+BLOCK_ID_CACHE_MAX_ENTRIES = int(os.getenv("BLOCK_ID_CACHE_MAX_ENTRIES", "8192"))
+
+_ON_CONFLICT_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
 
 
 def get_by_id(db: Session, block_id: int) -> Block | None:
     return db.query(Block).filter(Block.id == block_id).first()
 
 
-def get_or_create(db: Session, form_id: int, function_id: int | None = None, nonfunction_id: int | None = None) -> Block:
-    block_type = "general"
-    target_id = None
+def block_key(function_id: int | None = None, nonfunction_id: int | None = None) -> tuple[str, int | None]:
+    """(type, target_id) of the block a function/nonfunction/general thread lives in."""
     if function_id:
-        block_type = "function"
-        target_id = function_id
-    elif nonfunction_id:
-        block_type = "nonfunction"
-        target_id = nonfunction_id
+        return "function", function_id
+    if nonfunction_id:
+        return "nonfunction", nonfunction_id
+    return "general", None
+
 
-    block = (
+def find(db: Session, form_id: int, block_type: str, target_id: int | None) -> Block | None:
+    return (
         db.query(Block)
-        .filter(Block.form_id == form_id, Block.type == block_type, Block.target_id == target_id)
+        .filter(Block.form_id == form_id, Block.type == block_type, Block.target_key == (target_id or 0))
         .first()
     )
-    if block:
-        return block
-
-    now = datetime.utcnow()
-    block = Block(
-        form_id=form_id,
-        type=block_type,
-        target_id=target_id,
-        status="normal",
-        created_at=now,
-        last_message_at=now,
-        reminder_sent=0,
+
+
+def get_or_create(db: Session, form_id: int, function_id: int | None = None, nonfunction_id: int | None = None) -> Block:
+    block_type, target_id = block_key(function_id, nonfunction_id)
+    return get_by_id(db, ensure_id(db, form_id, block_type, target_id))
+
+
+# ============================================================
+# Race-free upsert + id cache
+# ============================================================
+class _BlockIdCache:
+    """LRU of (form_id, type, target_id) -> block id. Block ids never change, only disappear."""
+
+    def __init__(self, max_entries: int = BLOCK_ID_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> int | None:
+        with self._lock:
+            block_id = self._entries.get(key)
+            if block_id is not None:
+                self._entries.move_to_end(key)
+            return block_id
+
+    def put(self, key: tuple, block_id: int) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = block_id
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, key: tuple) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def forget_form(self, form_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == form_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+block_ids = _BlockIdCache()
+
+_blocks = Block.__table__
+_UNIQUE_COLUMNS = ["form_id", "type", "target_key"]
+
+
+def _upsert(db: Session, form_id: int, block_type: str, target_id: int | None, activity: datetime | None) -> int:
+    """
+    INSERT the block or, if it already exists, return the existing id; with
+    ``activity`` the existing row's reminder clock is reset as well. One
+    statement on MySQL / SQLite / PostgreSQL. Does not commit.
+    """
+    now = activity or datetime.utcnow()
+    values = {
+        "form_id": form_id,
+        "type": block_type,
+        "target_id": target_id,
+        "target_key": target_id or 0,
+        "status": "normal",
+        "created_at": now,
+        "last_message_at": now,
+        "reminder_sent": 0,
+    }
+    touch = {"last_message_at": now, "reminder_sent": 0} if activity else {}
+    dialect = db.get_bind().dialect
+
+    if dialect.name == "mysql":
+        # LAST_INSERT_ID(id) makes lastrowid report the existing row on a duplicate
+        stmt = mysql_insert(_blocks).values(**values).on_duplicate_key_update(
+            id=func.last_insert_id(_blocks.c.id), **touch
+        )
+        return db.execute(stmt).lastrowid
+
+    if dialect.name in _ON_CONFLICT_INSERTS and dialect.insert_returning:
+        stmt = _ON_CONFLICT_INSERTS[dialect.name](_blocks).values(**values)
+        # a no-op SET (rather than DO NOTHING) so RETURNING also yields an existing row
+        set_ = touch or {"form_id": stmt.excluded.form_id}
+        stmt = stmt.on_conflict_do_update(index_elements=_UNIQUE_COLUMNS, set_=set_).returning(_blocks.c.id)
+        return db.execute(stmt).scalar_one()
+
+    # Anything else: let the unique key arbitrate, then read the winner
+    try:
+        with db.begin_nested():
+            return db.execute(insert(_blocks).values(**values)).inserted_primary_key[0]
+    except IntegrityError:
+        block_id = _find_id(db, form_id, block_type, target_id)
+        if touch:
+            db.execute(update(_blocks).where(_blocks.c.id == block_id).values(**touch))
+        return block_id
+
+
+def _find_id(db: Session, form_id: int, block_type: str, target_id: int | None) -> int | None:
+    row = (
+        db.query(Block.id)
+        .filter(Block.form_id == form_id, Block.type == block_type, Block.target_key == (target_id or 0))
+        .first()
     )
-    db.add(block)
-    db.commit()
-    db.refresh(block)
-    return block
+    return row[0] if row else None
+
+
+def ensure_id(db: Session, form_id: int, block_type: str, target_id: int | None) -> int:
+    """Id of the block, creating it if needed. Commits only when it had to insert."""
+    key = (form_id, block_type, target_id)
+    block_id = block_ids.get(key)
+    if block_id is not None:
+        return block_id
+    block_id = _find_id(db, form_id, block_type, target_id)
+    if block_id is None:
+        block_id = _upsert(db, form_id, block_type, target_id, None)
+        db.commit()
+    block_ids.put(key, block_id)
+    return block_id
+
+
+def touch_or_create(db: Session, form_id: int, block_type: str, target_id: int | None, now: datetime) -> int:
+    """
+    Reset the block's reminder clock (creating the block if needed) and return
+    its id. A single UPDATE when the id is cached, otherwise a single upsert.
+    Does not commit; the caller owns the transaction.
+    """
+    key = (form_id, block_type, target_id)
+    block_id = block_ids.get(key)
+    if block_id is not None:
+        result = db.execute(
+            update(_blocks).where(_blocks.c.id == block_id).values(last_message_at=now, reminder_sent=0)
+        )
+        if result.rowcount:
+            note_activity(None, now)
+            return block_id
+        block_ids.forget(key)  # deleted with its form since it was cached
+    block_id = _upsert(db, form_id, block_type, target_id, now)
+    block_ids.put(key, block_id)
+    # the status is not read here: wake the scheduler for either threshold
+    note_activity(None, now)
+    return block_id
 
 
 def touch_activity(db: Session, block: Block) -> Block:
@@ -48,6 +188,7 @@ def touch_activity(db: Session, block: Block) -> Block:
     db.add(block)
     db.commit()
     db.refresh(block)
+    note_activity(block.status, block.last_message_at)
     return block
 
 
@@ -58,4 +199,5 @@ def update_status(db: Session, block: Block, status: str) -> Block:
     db.add(block)
     db.commit()
     db.refresh(block)
+    note_activity(block.status, block.last_message_at)
     return block
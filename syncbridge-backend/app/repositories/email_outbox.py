@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import EmailOutbox
+
+
+def _insert_ignoring_duplicates(db: Session):
+    """INSERT that skips rows whose idempotency_key is already queued, instead of failing the batch."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(EmailOutbox).on_conflict_do_nothing(index_elements=[EmailOutbox.idempotency_key])
+    if dialect == "sqlite":
+        return sqlite.insert(EmailOutbox).on_conflict_do_nothing(index_elements=[EmailOutbox.idempotency_key])
+    if dialect in ("mysql", "mariadb"):
+        return insert(EmailOutbox).prefix_with("IGNORE")
+    return insert(EmailOutbox)
+
+
+def add_many(db: Session, emails: list[tuple[str, list[str], str, str]], now: datetime) -> int:
+    """
+    Queue (idempotency_key, recipients, subject, html) emails with one
+    executemany INSERT; no commit, they belong to the caller's transaction.
+    An email whose key is already queued (another scanner got there first) is
+    skipped and the rest still go in. Returns the number of emails inserted.
+    """
+    if not emails:
+        return 0
+    stmt = _insert_ignoring_duplicates(db)
+    rows = [
+        {
+            "idempotency_key": key,
+            "recipients": recipients,
+            "subject": subject,
+            "html": html,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+        }
+        for key, recipients, subject, html in emails
+    ]
+    if db.get_bind().dialect.insert_executemany_returning:
+        return len(db.execute(stmt.returning(EmailOutbox.id), rows).all())
+    # MySQL: rows skipped by INSERT IGNORE do not count as affected
+    return db.execute(stmt, rows).rowcount
+
+
+def _claim(db: Session, ids: list[int], now: datetime, until: datetime) -> set[int]:
+    """
+    Push next_attempt_at of those ``ids`` that are still pending and due; returns
+    the ids this caller won. A row another dispatcher claimed first no longer
+    matches the WHERE clause, so it is not sent twice.
+    """
+    stmt = (
+        update(EmailOutbox)
+        .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+        .values(next_attempt_at=until)
+    )
+    if db.get_bind().dialect.update_returning:
+        return set(db.execute(stmt.where(EmailOutbox.id.in_(ids)).returning(EmailOutbox.id)).scalars())
+    # no UPDATE ... RETURNING (MySQL): one conditional UPDATE per row, its rowcount says who won
+    return {row_id for row_id in ids if db.execute(stmt.where(EmailOutbox.id == row_id)).rowcount}
+
+
+def claim_due(db: Session, now: datetime, limit: int, claim_seconds: float) -> list:
+    """
+    Up to ``limit`` pending emails whose next attempt is due, oldest first, as
+    rows of (id, idempotency_key, recipients, subject, html, attempts).
+    Claiming pushes next_attempt_at past the send timeout, so an email whose
+    dispatcher dies mid-send is picked up again once the claim lapses. Every
+    worker runs a dispatcher: only the rows whose conditional claim succeeded
+    are returned.
+    """
+    rows = (
+        db.query(
+            EmailOutbox.id,
+            EmailOutbox.idempotency_key,
+            EmailOutbox.recipients,
+            EmailOutbox.subject,
+            EmailOutbox.html,
+            EmailOutbox.attempts,
+        )
+        .filter(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(limit)
+        .all()
+    )
+    claimed = _claim(db, [r.id for r in rows], now, now + timedelta(seconds=claim_seconds)) if rows else set()
+    db.commit()
+    return [r for r in rows if r.id in claimed]
+
+
+def mark_sent(db: Session, ids: list[int], now: datetime) -> None:
+    if ids:
+        db.query(EmailOutbox).filter(EmailOutbox.id.in_(ids)).update(
+            {
+                EmailOutbox.status: "sent",
+                EmailOutbox.attempts: EmailOutbox.attempts + 1,
+                EmailOutbox.sent_at: now,
+                EmailOutbox.last_error: None,
+            },
+            synchronize_session=False,
+        )
+
+
+def mark_failed(db: Session, row_id: int, attempts: int, error: str, next_attempt_at: datetime | None) -> None:
+    """Record a failed attempt; ``next_attempt_at=None`` dead-letters the email."""
+    values = {EmailOutbox.attempts: attempts, EmailOutbox.last_error: error[:2000]}
+    if next_attempt_at is None:
+        values[EmailOutbox.status] = "dead"
+    else:
+        values[EmailOutbox.next_attempt_at] = next_attempt_at
+    db.query(EmailOutbox).filter(EmailOutbox.id == row_id).update(values, synchronize_session=False)
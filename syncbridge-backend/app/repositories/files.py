@@ -1,6 +1,8 @@
+from typing import Collection
+
 from sqlalchemy.orm import Session
 
-from app.models import File
+from app.models import Block, File, Message
 
 
 def get_by_id(db: Session, file_id: int) -> File | None:
@@ -15,6 +17,7 @@ def create_record(
     file_size: int,
     storage_path: str,
     file_ext: str,
+    content_hash: str | None = None,
 ) -> File:
     rec = File(
         message_id=message_id,
@@ -23,6 +26,7 @@ def create_record(
         file_size=file_size,
         file_ext=file_ext,
         storage_path=storage_path,
+        content_hash=content_hash,
     )
     db.add(rec)
     db.commit()
@@ -35,5 +39,53 @@ def delete_record(db: Session, rec: File):
     db.commit()
 
 
+def referenced_locations(db: Session, content_hashes: Collection[str], paths: Collection[str]) -> set[str]:
+    """
+    Storage locations still referenced by a row: blobs are looked up by hash
+    (indexed), ``paths`` (legacy, non content-addressed names) by storage_path.
+    """
+    found: set[str] = set()
+    if content_hashes:
+        found.update(p for (p,) in db.query(File.storage_path).filter(File.content_hash.in_(content_hashes)).distinct())
+    if paths:
+        found.update(p for (p,) in db.query(File.storage_path).filter(File.storage_path.in_(paths)).distinct())
+    return found
+
+
+def page_locations(db: Session, after_id: int, limit: int) -> list[tuple[int, str]]:
+    """(id, storage_path) of the next ``limit`` rows after ``after_id`` (keyset pagination)."""
+    return (
+        db.query(File.id, File.storage_path)
+        .filter(File.id > after_id)
+        .order_by(File.id)
+        .limit(limit)
+        .all()
+    )
+
+
 def list_by_message(db: Session, message_id: int) -> list[File]:
     return db.query(File).filter(File.message_id == message_id).all()
+
+
+def list_by_messages(db: Session, message_ids: list[int]) -> dict[int, list[File]]:
+    """Attachments for a whole page of messages in one IN query, keyed by message id."""
+    grouped: dict[int, list[File]] = {mid: [] for mid in message_ids}
+    if not message_ids:
+        return grouped
+    rows = db.query(File).filter(File.message_id.in_(message_ids)).order_by(File.id).all()
+    for f in rows:
+        grouped[f.message_id].append(f)
+    return grouped
+
+
+def list_for_export(db: Session, form_id: int, block_id: int | None = None) -> list[tuple[File, str, int | None]]:
+    """Attachments of a form (or one of its blocks) with their block's (type, target_id), oldest first."""
+    q = (
+        db.query(File, Block.type, Block.target_id)
+        .join(Message, Message.id == File.message_id)
+        .join(Block, Block.id == Message.block_id)
+        .filter(Block.form_id == form_id)
+    )
+    if block_id is not None:
+        q = q.filter(Block.id == block_id)
+    return q.order_by(Block.id, File.id).all()
@@ -5,6 +5,7 @@ from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from app.models import Form, User
+from app.repositories import blocks as block_repo
 
 
 def get(db: Session, form_id: int) -> Form | None:
@@ -80,8 +81,10 @@ def update_form(db: Session, form: Form, changes: dict) -> Form:
 
 
 def delete_form(db: Session, form: Form):
+    form_id = form.id
     db.delete(form)
     db.commit()
+    block_repo.block_ids.forget_form(form_id)
 
 
 def create_subform(db: Session, mainform: Form, creator_id: int, payload: dict) -> Tuple[Form | None, str | None]:
@@ -157,8 +160,10 @@ def merge_subform(db: Session, mainform: Form, subform: Form) -> Form:
     mainform.subform_id = None
     mainform.status = "processing"
     mainform.updated_at = datetime.utcnow()
+    subform_id = subform.id
     db.delete(subform)
     db.commit()
+    block_repo.block_ids.forget_form(subform_id)
     db.refresh(mainform)
 
     return mainform
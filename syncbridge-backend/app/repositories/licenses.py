@@ -2,6 +2,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 
 from app.models import License, User
+from app.services.identity_cache import identity_cache
 
 
 def get_by_key(db: Session, key: str) -> License | None:
@@ -28,6 +29,8 @@ def _activate_license(db: Session, lic: License, user: User):
     user.updated_at = now
 
     db.commit()
+    # role / is_active changed: drop cached principals built from old tokens
+    identity_cache.invalidate_user(user.id)
     db.refresh(user)
     db.refresh(lic)
     return lic
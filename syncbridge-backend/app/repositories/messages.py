@@ -1,4 +1,7 @@
+import base64
 from datetime import datetime
+
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 
 from app.models import Message
@@ -8,16 +11,72 @@ def get_by_id(db: Session, message_id: int) -> Message | None:
     return db.query(Message).filter(Message.id == message_id).first()
 
 
-def list_messages(db: Session, block_id: int, page: int, page_size: int):
-    # latest-first feed so page 1 shows most recent messages
-    query = db.query(Message).filter(Message.block_id == block_id).order_by(Message.created_at.desc())
-    total = query.count()
+def encode_cursor(msg: Message) -> str:
+    """Opaque keyset cursor pointing just past ``msg`` in the latest-first feed."""
+    raw = f"{msg.created_at.isoformat()}|{msg.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Raises ValueError for anything that was not produced by encode_cursor."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        created_at, msg_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), int(msg_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _feed(db: Session, block_id: int):
+    # latest-first feed so page 1 shows most recent messages;
+    # id breaks created_at ties so the order is total (needed for keyset paging)
+    # served by ix_messages_block_created_id
+    return (
+        db.query(Message)
+        .filter(Message.block_id == block_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+    )
+
+
+def _page(items: list[Message], page_size: int):
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        # page_size=0 yields an empty page and nothing to point past
+        next_cursor = encode_cursor(items[-1]) if items else None
+    return items, next_cursor
+
+
+def list_messages(db: Session, block_id: int, page: int, page_size: int, with_total: bool = True):
+    """Offset pagination. Returns (items, total, next_cursor); total is None when skipped."""
+    query = _feed(db, block_id)
+    total = query.count() if with_total else None
     items = (
         query.offset(max(page - 1, 0) * page_size)
-        .limit(page_size)
+        .limit(page_size + 1)
+        .all()
+    )
+    items, next_cursor = _page(items, page_size)
+    return items, total, next_cursor
+
+
+def list_messages_after_cursor(db: Session, block_id: int, cursor: str, page_size: int, with_total: bool = True):
+    """Keyset pagination: every page costs the same index range scan as page 1."""
+    created_at, msg_id = decode_cursor(cursor)
+    query = _feed(db, block_id)
+    total = query.count() if with_total else None
+    items = (
+        query.filter(
+            or_(
+                Message.created_at < created_at,
+                and_(Message.created_at == created_at, Message.id < msg_id),
+            )
+        )
+        .limit(page_size + 1)
         .all()
     )
-    return items, total
+    items, next_cursor = _page(items, page_size)
+    return items, total, next_cursor
 
 
 def create_message(db: Session, block_id: int, user_id: int, text: str) -> Message:
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import SchedulerLease
+
+
+def try_acquire(db: Session, name: str, holder: str, now: datetime, ttl_seconds: float) -> bool:
+    """
+    Take or renew the lease ``name`` until now + ttl. A single conditional
+    UPDATE (held by ``holder`` or expired) arbitrates between processes; the
+    row is inserted the first time. Commits.
+    """
+    values = {
+        SchedulerLease.holder: holder,
+        SchedulerLease.expires_at: now + timedelta(seconds=ttl_seconds),
+        SchedulerLease.renewed_at: now,
+    }
+    updated = (
+        db.query(SchedulerLease)
+        .filter(
+            SchedulerLease.name == name,
+            or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now),
+        )
+        .update(values, synchronize_session=False)
+    )
+    if updated:
+        db.commit()
+        return True
+    if db.query(SchedulerLease.name).filter(SchedulerLease.name == name).first() is not None:
+        db.rollback()
+        return False
+    db.add(SchedulerLease(name=name, holder=holder, expires_at=values[SchedulerLease.expires_at], renewed_at=now))
+    try:
+        db.commit()
+    except IntegrityError:
+        # another process created it first
+        db.rollback()
+        return False
+    return True
+
+
+def release(db: Session, name: str, holder: str, now: datetime) -> None:
+    """Expire the lease now if ``holder`` still has it, so a standby can take over at once."""
+    db.query(SchedulerLease).filter(SchedulerLease.name == name, SchedulerLease.holder == holder).update(
+        {SchedulerLease.expires_at: now}, synchronize_session=False
+    )
+    db.commit()
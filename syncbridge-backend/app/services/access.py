@@ -0,0 +1,183 @@
+"""
+Access resolution for message / file routes.
+
+A permission check needs the owning form's (user_id, developer_id, status).
+Instead of walking File -> Message -> Block -> Form one query at a time, the
+resolvers below fetch the row together with that chain in a single joined
+query.
+
+The form tuple is additionally kept in a short TTL cache. Any flush that
+modifies or deletes a Form drops its entry (see ``_invalidate_forms``), so
+within this process the cache is never staler than the database; other
+workers converge within FORM_ACCESS_CACHE_TTL_SECONDS. Set it to 0 to disable.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import Block, File, Form, Message
+
+FORM_ACCESS_CACHE_TTL_SECONDS = float(os.getenv("FORM_ACCESS_CACHE_TTL_SECONDS", "5"))
+FORM_ACCESS_CACHE_MAX_ENTRIES = int(os.getenv("FORM_ACCESS_CACHE_MAX_ENTRIES", "4096"))
+
+
+@dataclass(frozen=True)
+class FormAccess:
+    """The Form columns the permission rules look at (duck-types ``Form``)."""
+
+    id: int
+    user_id: int | None
+    developer_id: int | None
+    status: str
+
+
+@dataclass(frozen=True)
+class MessageAccess:
+    message_id: int
+    message_user_id: int
+    block_id: int
+    block_type: str
+    target_id: int | None
+    form: FormAccess
+
+
+class FormAccessCache:
+    def __init__(
+        self,
+        ttl: float = FORM_ACCESS_CACHE_TTL_SECONDS,
+        max_entries: int = FORM_ACCESS_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: dict[int, tuple[float, FormAccess]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, form_id: int) -> FormAccess | None:
+        with self._lock:
+            entry = self._entries.get(form_id)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[form_id]
+                return None
+            return entry[1]
+
+    def put(self, access: FormAccess) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_entries and access.id not in self._entries:
+                self._entries.clear()
+            self._entries[access.id] = (self.clock() + self.ttl, access)
+
+    def invalidate(self, form_id: int) -> None:
+        with self._lock:
+            self._entries.pop(form_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+form_access_cache = FormAccessCache()
+
+_FORM_COLUMNS = (Form.id, Form.user_id, Form.developer_id, Form.status)
+
+
+def _form_access(form_id, user_id, developer_id, status) -> FormAccess:
+    access = FormAccess(form_id, user_id, developer_id, status)
+    form_access_cache.put(access)
+    return access
+
+
+# ============================================================
+# Resolvers
+# ============================================================
+def resolve_form(db: Session, form_id: int) -> FormAccess | None:
+    cached = form_access_cache.get(form_id)
+    if cached is not None:
+        return cached
+    row = db.query(*_FORM_COLUMNS).filter(Form.id == form_id).first()
+    return _form_access(*row) if row else None
+
+
+def resolve_block(db: Session, block_id: int) -> tuple[Block, FormAccess] | None:
+    row = (
+        db.query(Block, *_FORM_COLUMNS)
+        .join(Form, Form.id == Block.form_id)
+        .filter(Block.id == block_id)
+        .first()
+    )
+    if row is None:
+        return None
+    return row[0], _form_access(*row[1:])
+
+
+def _message_access(msg: Message, block_type, target_id, *form_row) -> MessageAccess:
+    return MessageAccess(
+        message_id=msg.id,
+        message_user_id=msg.user_id,
+        block_id=msg.block_id,
+        block_type=block_type,
+        target_id=target_id,
+        form=_form_access(*form_row),
+    )
+
+
+def resolve_message(db: Session, message_id: int) -> tuple[Message, MessageAccess] | None:
+    """Message plus its block/form access tuple, in one query."""
+    row = (
+        db.query(Message, Block.type, Block.target_id, *_FORM_COLUMNS)
+        .join(Block, Block.id == Message.block_id)
+        .join(Form, Form.id == Block.form_id)
+        .filter(Message.id == message_id)
+        .first()
+    )
+    if row is None:
+        return None
+    return row[0], _message_access(*row)
+
+
+def resolve_file(db: Session, file_id: int) -> tuple[File, MessageAccess] | None:
+    """File record plus the access tuple of the message it is attached to, in one query."""
+    row = (
+        db.query(File, Message, Block.type, Block.target_id, *_FORM_COLUMNS)
+        .join(Message, Message.id == File.message_id)
+        .join(Block, Block.id == Message.block_id)
+        .join(Form, Form.id == Block.form_id)
+        .filter(File.id == file_id)
+        .first()
+    )
+    if row is None:
+        return None
+    return row[0], _message_access(*row[1:])
+
+
+# ============================================================
+# Invalidation
+# ============================================================
+@event.listens_for(Session, "after_flush")
+def _invalidate_forms(session, flush_context):
+    changed = [obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, Form)]
+    for form_id in changed:
+        form_access_cache.invalidate(form_id)
+    session.info.setdefault("changed_form_ids", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_forms_on_commit(session):
+    # A concurrent reader may have re-cached the pre-commit row after the flush
+    for form_id in session.info.pop("changed_form_ids", ()):
+        form_access_cache.invalidate(form_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_forms(session):
+    session.info.pop("changed_form_ids", None)
@@ -0,0 +1,47 @@
+"""
+DB access for background loops running on the API event loop.
+
+The reminder scanners and the email outbox dispatcher use the sync
+repositories; ``run_db`` runs such a function on a small dedicated thread
+pool (BACKGROUND_DB_THREADS), with a session of its own, so a slow query
+never stalls WebSockets or async routes. Leader-lease heartbeats use a pool
+of their own (``pool=LEASE_POOL``): a backlog of scan or GC work must not
+hold up a renewal.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from app.core.database import SessionLocal
+
+BACKGROUND_DB_THREADS = int(os.getenv("BACKGROUND_DB_THREADS", "2"))
+
+DEFAULT_POOL = "background-db"
+LEASE_POOL = "lease-db"
+_POOL_THREADS = {DEFAULT_POOL: BACKGROUND_DB_THREADS, LEASE_POOL: 2}
+
+_pools: dict[str, ThreadPoolExecutor] = {}
+
+
+def _with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def run_db(fn, *args, pool: str = DEFAULT_POOL):
+    """Run ``fn(session, *args)`` on a background DB thread."""
+    executor = _pools.get(pool)
+    if executor is None:
+        executor = _pools[pool] = ThreadPoolExecutor(max_workers=_POOL_THREADS[pool], thread_name_prefix=pool)
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(_with_session, fn, *args))
+
+
+def shutdown() -> None:
+    pools = list(_pools.values())
+    _pools.clear()
+    for executor in pools:
+        executor.shutdown(wait=False, cancel_futures=True)
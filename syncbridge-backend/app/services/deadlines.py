@@ -0,0 +1,92 @@
+"""
+Upcoming reminder deadlines, in memory.
+
+A block is due for a reminder at ``last_message_at + threshold`` (URGENT_MINUTES
+for urgent blocks, NORMAL_HOURS for normal ones). Instead of polling, the
+reminder scheduler sleeps until the earliest deadline in ``deadlines``:
+
+- writes that reset a block's reminder clock (blocks.touch_activity,
+  update_status, touch_or_create) push its new deadline;
+- after each scan, and every REMINDER_REFRESH_SECONDS, the scheduler pushes
+  the next deadline still pending in the DB, which picks up activity handled
+  by other workers.
+
+Only a deadline earlier than the one already queued for the same status
+changes anything (the scan at the earlier time re-reads the DB), so the heap
+holds a handful of entries however busy the worker is. Pushes come from
+request threads; ``on_earlier`` lets the scheduler wake up early.
+"""
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable
+
+URGENT_MINUTES = int(os.getenv("REMINDER_URGENT_MINUTES", "5"))
+NORMAL_HOURS = int(os.getenv("REMINDER_NORMAL_HOURS", "48"))
+
+THRESHOLDS = {
+    "urgent": timedelta(minutes=URGENT_MINUTES),
+    "normal": timedelta(hours=NORMAL_HOURS),
+}
+
+
+class DeadlineHeap:
+    def __init__(self):
+        self._heap: list[tuple[datetime, str]] = []
+        self._earliest: dict[str, datetime] = {}  # live entry per status; older heap entries are stale
+        self._lock = threading.Lock()
+        self.on_earlier: Callable[[], None] | None = None
+
+    def push(self, status: str, due: datetime) -> bool:
+        """Queue a wake-up for ``status`` at ``due``; False when an earlier one is already queued."""
+        with self._lock:
+            current = self._earliest.get(status)
+            if current is not None and current <= due:
+                return False
+            self._earliest[status] = due
+            heapq.heappush(self._heap, (due, status))
+            earliest = self._heap[0][0] == due
+        callback = self.on_earlier
+        if earliest and callback is not None:
+            callback()
+        return True
+
+    def _drop_stale(self) -> None:
+        while self._heap and self._earliest.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> datetime | None:
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> set[str]:
+        """Statuses with a deadline at or before ``now`` (removed from the heap)."""
+        due: set[str] = set()
+        with self._lock:
+            self._drop_stale()
+            while self._heap and self._heap[0][0] <= now:
+                _, status = heapq.heappop(self._heap)
+                del self._earliest[status]
+                due.add(status)
+                self._drop_stale()
+        return due
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+            self._earliest.clear()
+
+
+deadlines = DeadlineHeap()
+
+
+def due_at(status: str, last_message_at: datetime) -> datetime:
+    return last_message_at + THRESHOLDS[status]
+
+
+def note_activity(status: str | None, at: datetime) -> None:
+    """A block's reminder clock restarted at ``at``; ``status=None`` when the writer does not know it."""
+    for name in (status,) if status else THRESHOLDS:
+        deadlines.push(name, due_at(name, at))
@@ -0,0 +1,222 @@
+"""
+In-process event bus.
+
+Routers publish typed events after their DB commit and return immediately;
+dispatcher tasks deliver the events to subscribed handlers (WebSocket fan-out
+today) in the background. Events for the same room always go through the same
+dispatcher, so a client never sees an update before the matching create.
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from app.services.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUS_WORKERS = int(os.getenv("EVENT_BUS_WORKERS", "4"))
+EVENT_BUS_QUEUE_SIZE = int(os.getenv("EVENT_BUS_QUEUE_SIZE", "10000"))
+
+
+def room_key(form_id: int, block_type: str = "general", target_id: int | None = None) -> str:
+    """Stable WS room key for a block (see api/v1/ws.py)."""
+    if block_type == "function" and target_id:
+        return f"form:{form_id}:function:{target_id}"
+    if block_type == "nonfunction" and target_id:
+        return f"form:{form_id}:nonfunction:{target_id}"
+    return f"form:{form_id}:general"
+
+
+# ============================================================
+# Events
+# ============================================================
+@dataclass(frozen=True)
+class BlockEvent:
+    form_id: int
+    block_type: str
+    target_id: int | None
+
+    @property
+    def room(self) -> str:
+        return room_key(self.form_id, self.block_type, self.target_id)
+
+
+@dataclass(frozen=True)
+class MessageCreated(BlockEvent):
+    message_id: int
+    block_id: int
+    user_id: int
+    text_content: str
+    created_at: datetime
+
+    def to_frame(self) -> dict:
+        return {
+            "type": "message",
+            "action": "create",
+            "message": {
+                "id": self.message_id,
+                "block_id": self.block_id,
+                "user_id": self.user_id,
+                "text_content": self.text_content,
+                "created_at": self.created_at,
+            },
+        }
+
+
+@dataclass(frozen=True)
+class MessageUpdated(BlockEvent):
+    message_id: int
+    block_id: int
+    user_id: int
+    text_content: str
+    updated_at: datetime
+
+    def to_frame(self) -> dict:
+        return {
+            "type": "message",
+            "action": "update",
+            "message": {
+                "id": self.message_id,
+                "block_id": self.block_id,
+                "user_id": self.user_id,
+                "text_content": self.text_content,
+                "updated_at": self.updated_at,
+            },
+        }
+
+
+@dataclass(frozen=True)
+class MessageDeleted(BlockEvent):
+    message_id: int
+
+    def to_frame(self) -> dict:
+        return {"type": "message", "action": "delete", "message_id": self.message_id}
+
+
+@dataclass(frozen=True)
+class BlockStatusChanged(BlockEvent):
+    block_id: int
+    status: str
+
+    def to_frame(self) -> dict:
+        return {"type": "block", "action": "status", "block_id": self.block_id, "status": self.status}
+
+
+@dataclass(frozen=True)
+class FormStatusChanged:
+    form_id: int
+    status: str
+    approval_flags: int
+
+    @property
+    def room(self) -> str:
+        return room_key(self.form_id)
+
+    def to_frame(self) -> dict:
+        return {
+            "type": "form",
+            "action": "status",
+            "form_id": self.form_id,
+            "status": self.status,
+            "approval_flags": self.approval_flags,
+        }
+
+
+Handler = Callable[[Any], Awaitable[None]]
+
+
+# ============================================================
+# Bus
+# ============================================================
+class EventBus:
+    def __init__(self, workers: int = EVENT_BUS_WORKERS, queue_size: int = EVENT_BUS_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.handlers: dict[type, list[Handler]] = defaultdict(list)
+        self.metrics = {"published": 0, "delivered": 0, "dropped": 0, "handler_errors": 0}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+        self._start_lock = threading.Lock()
+
+    def subscribe(self, event_type: type, handler: Handler) -> None:
+        self.handlers[event_type].append(handler)
+
+    def _running(self) -> bool:
+        return self._loop is not None and not self._loop.is_closed() and bool(self._tasks)
+
+    def start(self) -> None:
+        """Spawn dispatcher tasks on the running loop (idempotent per loop)."""
+        loop = asyncio.get_running_loop()
+        with self._start_lock:
+            if self._running() and self._loop is loop:
+                return
+            self._loop = loop
+            self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+            self._tasks = [asyncio.create_task(self._dispatch(q)) for q in self._queues]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._loop = None
+
+    def publish(self, event) -> None:
+        """Fire-and-forget; safe to call from the event loop or from a worker thread."""
+        self.metrics["published"] += 1
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Sync route running in the threadpool: hand over to the bus loop.
+            if not self._running():
+                self.metrics["dropped"] += 1
+                logger.debug("Event bus not running; dropped %s", type(event).__name__)
+                return
+            self._loop.call_soon_threadsafe(self._enqueue, event)
+            return
+        self.start()
+        self._enqueue(event)
+
+    def _enqueue(self, event) -> None:
+        # Same room -> same dispatcher keeps per-room ordering
+        queue = self._queues[hash(event.room) % len(self._queues)]
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.metrics["dropped"] += 1
+            logger.warning("Event bus queue full; dropped %s", type(event).__name__)
+
+    async def _dispatch(self, queue: asyncio.Queue) -> None:
+        while True:
+            event = await queue.get()
+            for handler in self.handlers.get(type(event), ()):
+                try:
+                    await handler(event)
+                    self.metrics["delivered"] += 1
+                except Exception:
+                    self.metrics["handler_errors"] += 1
+                    logger.exception("Event handler failed for %s", type(event).__name__)
+            queue.task_done()
+
+    async def drain(self) -> None:
+        """Wait until every queued event has been dispatched (tests / shutdown)."""
+        if self._running():
+            await asyncio.gather(*(q.join() for q in self._queues))
+
+
+async def _fan_out(event) -> None:
+    await manager.broadcast(event.room, event.to_frame())
+
+
+bus = EventBus()
+for _event_type in (MessageCreated, MessageUpdated, MessageDeleted, BlockStatusChanged, FormStatusChanged):
+    bus.subscribe(_event_type, _fan_out)
@@ -0,0 +1,81 @@
+"""
+Short-lived principal cache for authenticated requests.
+
+Keyed by (user id, token iat) so a freshly issued token never reuses an entry
+built for an older one. Entries are detached snapshots of the User row;
+callers merge them into their own session (``Session.merge(load=False)``),
+so nothing is shared or mutated across requests.
+
+Invalidation is explicit (role / is_active / license changes) within this
+process; other workers see the change once their entry's TTL expires.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.models import User
+
+IDENTITY_CACHE_TTL_SECONDS = float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "30"))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "4096"))
+
+
+def _snapshot(user: User) -> User:
+    copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+class IdentityCache:
+    def __init__(
+        self,
+        ttl: float = IDENTITY_CACHE_TTL_SECONDS,
+        max_entries: int = IDENTITY_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: OrderedDict[tuple[int, object], tuple[float, User]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, iat) -> User | None:
+        key = (user_id, iat)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, iat, user: User) -> None:
+        if self.ttl <= 0:
+            return
+        snapshot = _snapshot(user)
+        with self._lock:
+            self._entries[(user_id, iat)] = (self.clock() + self.ttl, snapshot)
+            self._entries.move_to_end((user_id, iat))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,144 @@
+"""
+DB-backed leader lease for singleton background jobs.
+
+Every worker runs ``LeaderLease.run(work)``; only the holder of the
+``scheduler_leases`` row runs ``work``. The holder renews the lease every
+SCHEDULER_LEASE_RENEW_SECONDS (a heartbeat that pushes expires_at to
+now + SCHEDULER_LEASE_TTL_SECONDS); standbys try to take it at the same
+pace and succeed once it has expired.
+
+- Failover: a clean shutdown releases the lease, so a standby takes over at
+  its next attempt (within one renew interval); a crashed holder is
+  replaced within TTL + one renew interval.
+- A holder that cannot renew (DB unreachable, lease taken) stops ``work``
+  before its last successful renewal runs out, so two leaders never
+  overlap as long as the nodes' clocks agree to within the TTL margin.
+  A renewal that has not returned by then (stalled DB) counts as lost.
+  Heartbeats run on their own threads (background.LEASE_POOL), so busy
+  scan or GC work cannot delay them.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from contextlib import suppress
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from app.repositories import scheduler_leases as lease_repo
+from app.services.background import LEASE_POOL, run_db
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_LEASE_TTL_SECONDS = float(os.getenv("SCHEDULER_LEASE_TTL_SECONDS", "30"))
+SCHEDULER_LEASE_RENEW_SECONDS = float(os.getenv("SCHEDULER_LEASE_RENEW_SECONDS", "10"))
+
+
+def default_holder() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def _bounded(awaitable: Awaitable, timeout: float):
+    """
+    ``await awaitable`` for at most ``timeout`` seconds (asyncio.TimeoutError
+    after that). Not wait_for: before Python 3.12 it can swallow a
+    cancellation that races the result, and ``run`` would never stop.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if not done:
+        task.cancel()
+        raise asyncio.TimeoutError()
+    return task.result()
+
+
+class LeaderLease:
+    def __init__(
+        self,
+        name: str,
+        ttl: float = SCHEDULER_LEASE_TTL_SECONDS,
+        renew: float = SCHEDULER_LEASE_RENEW_SECONDS,
+        holder: str | None = None,
+        clock=datetime.utcnow,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.renew = renew
+        self.holder = holder or default_holder()
+        self.clock = clock
+        self.metrics = {"acquired": 0, "lost": 0, "errors": 0}
+        self._valid_until: datetime | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._valid_until is not None and self.clock() < self._valid_until
+
+    async def _heartbeat(self) -> bool:
+        """Take or renew the lease; True while this process may run the job."""
+        now = self.clock()
+        # a leader must hear back before its lease runs out; a standby within one TTL
+        timeout = (self._valid_until - now).total_seconds() if self.is_leader else self.ttl
+        try:
+            held = await _bounded(
+                run_db(lease_repo.try_acquire, self.name, self.holder, now, self.ttl, pool=LEASE_POOL),
+                max(0.0, timeout),
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Lease %s heartbeat timed out after %.1fs", self.name, timeout)
+            self.metrics["errors"] += 1
+            self._valid_until = None
+            return False
+        except Exception:
+            logger.exception("Lease %s heartbeat failed", self.name)
+            self.metrics["errors"] += 1
+            # keep going on the last renewal until it runs out
+            if not self.is_leader:
+                self._valid_until = None
+            return self._valid_until is not None
+        # counted from before the round trip, so the local view never outlives the row
+        self._valid_until = now + timedelta(seconds=self.ttl) if held else None
+        return held
+
+    async def _release(self) -> None:
+        if self._valid_until is None:
+            return
+        self._valid_until = None
+        with suppress(Exception):
+            await _bounded(run_db(lease_repo.release, self.name, self.holder, self.clock(), pool=LEASE_POOL), self.renew)
+
+    async def run(self, work: Callable[[], Awaitable]) -> None:
+        """Run ``work`` only while holding the lease; it is cancelled when the lease is lost."""
+        task: asyncio.Task | None = None
+        try:
+            while True:
+                leader = await self._heartbeat()
+                if leader and (task is None or task.done()):
+                    logger.info("Lease %s acquired by %s", self.name, self.holder)
+                    self.metrics["acquired"] += 1
+                    task = asyncio.create_task(work())
+                elif not leader and task is not None:
+                    logger.warning("Lease %s lost by %s", self.name, self.holder)
+                    self.metrics["lost"] += 1
+                    task.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await task
+                    task = None
+                delay = self.renew
+                if self._valid_until is not None:
+                    # wake up in time to stop work if renewals keep failing
+                    delay = min(delay, max(0.0, (self._valid_until - self.clock()).total_seconds()))
+                await asyncio.sleep(delay)
+        finally:
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+            await self._release()
+
+    def snapshot(self) -> dict:
+        return {**self.metrics, "name": self.name, "holder": self.holder, "is_leader": self.is_leader}
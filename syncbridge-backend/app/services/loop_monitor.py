@@ -0,0 +1,66 @@
+"""
+Event-loop lag monitor.
+
+A background task sleeps LOOP_LAG_INTERVAL_SECONDS and records how much
+later than requested it woke up. Anything that blocks the loop (sync DB
+calls, blocking HTTP, CPU work in a coroutine) shows up directly as lag, and
+every WebSocket and async route on the worker is delayed by the same amount.
+Exposed per worker in GET /metrics.
+"""
+import asyncio
+import os
+from collections import deque
+from contextlib import suppress
+
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", "600"))  # recent samples kept for percentiles
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS, window: int = LOOP_LAG_WINDOW):
+        self.interval = interval
+        self.samples = 0
+        self.max = 0.0
+        self._recent: deque[float] = deque(maxlen=window)
+        self._task: asyncio.Task | None = None
+
+    def record(self, lag: float) -> None:
+        lag = max(lag, 0.0)
+        self.samples += 1
+        self.max = max(self.max, lag)
+        self._recent.append(lag)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(loop.time() - start - self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def snapshot(self) -> dict:
+        recent = sorted(self._recent)
+
+        def pct(p: float) -> float:
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 2) if recent else 0.0
+
+        return {
+            "samples": self.samples,
+            "last_ms": round(self._recent[-1] * 1000, 2) if self._recent else 0.0,
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+monitor = LoopLagMonitor()
@@ -0,0 +1,45 @@
+"""
+Transactional message posting.
+
+Posting a chat line touches two rows: the block (found or created, and its
+reminder clock reset) and the new message. Both are written in one
+transaction, so a post costs a single commit instead of the separate
+get_or_create / create_message / touch_activity commits (and their refreshes).
+"""
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from app.models import Message
+from app.repositories import blocks as block_repo
+
+
+def post_message(
+    db: Session,
+    form_id: int,
+    user_id: int,
+    text: str,
+    function_id: int | None = None,
+    nonfunction_id: int | None = None,
+) -> Message:
+    """
+    Append a message to the form's block, creating the block if needed.
+
+    Two statements: the block upsert (or a bare UPDATE when its id is cached)
+    and the message INSERT. Every attribute callers need is set in Python or
+    by the INSERT, so on a session with ``expire_on_commit=False`` (the async
+    routes) nothing is re-read after the commit.
+    """
+    block_type, target_id = block_repo.block_key(function_id, nonfunction_id)
+    now = datetime.utcnow()
+    try:
+        # Track activity time for reminder checks
+        block_id = block_repo.touch_or_create(db, form_id, block_type, target_id, now)
+        msg = Message(block_id=block_id, user_id=user_id, text_content=text, created_at=now, updated_at=now)
+        db.add(msg)
+        db.flush()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return msg
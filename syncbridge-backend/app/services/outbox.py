@@ -0,0 +1,205 @@
+"""
+Transactional email outbox.
+
+Producers (the reminder scanners) never send mail themselves: they add an
+``email_outbox`` row in the same transaction that records why the email is
+owed (e.g. blocks.reminder_sent = 1), so an email is queued exactly when
+that change commits. ``OutboxDispatcher`` drains the table in batches:
+
+- sends run on a bounded thread pool (send_email is blocking HTTP), at most
+  OUTBOX_SEND_CONCURRENCY at a time, each limited to OUTBOX_SEND_TIMEOUT_SECONDS;
+- a failed attempt is retried with exponential backoff
+  (OUTBOX_BACKOFF_BASE_SECONDS * 2^(attempt-1), capped at
+  OUTBOX_BACKOFF_MAX_SECONDS), so a provider outage does not turn into a
+  retry storm;
+- after OUTBOX_MAX_ATTEMPTS the row is dead-lettered (status "dead") and
+  kept for inspection;
+- every send carries the row's idempotency key, so a resend after a crash
+  between "sent" and the DB update is deduplicated by the provider.
+
+Queued / sent / failed / dead counts (total and last full minute) are in
+GET /metrics under ``email_outbox``.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.repositories import email_outbox as outbox_repo
+from app.services.background import run_db
+from app.utils.email_client import send_email
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_SEND_CONCURRENCY = int(os.getenv("OUTBOX_SEND_CONCURRENCY", "8"))
+OUTBOX_SEND_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_SEND_TIMEOUT_SECONDS", "15"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "30"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+# a claimed row is retried after this long if its dispatcher never reports back
+OUTBOX_CLAIM_SECONDS = float(os.getenv("OUTBOX_CLAIM_SECONDS", "300"))
+
+
+def enqueue_many(db: Session, emails: list[tuple[str, list[str], str, str]]) -> int:
+    """
+    Queue (idempotency_key, recipients, subject, html) emails inside the
+    caller's transaction: they are committed, or rolled back, with it.
+    Emails whose key is already queued are skipped; returns the number queued.
+    """
+    return outbox_repo.add_many(db, emails, datetime.utcnow())
+
+
+def enqueue(db: Session, idempotency_key: str, recipients: list[str], subject: str, html: str) -> int:
+    return enqueue_many(db, [(idempotency_key, recipients, subject, html)])
+
+
+class ThroughputCounter:
+    """Event count in total and for the last full minute."""
+
+    def __init__(self, clock=time.time):
+        self.total = 0
+        self._clock = clock
+        self._minute: int | None = None
+        self._current = 0
+        self._previous = 0
+
+    def _roll(self) -> None:
+        minute = int(self._clock() // 60)
+        if minute != self._minute:
+            self._previous = self._current if self._minute is not None and minute == self._minute + 1 else 0
+            self._current = 0
+            self._minute = minute
+
+    def add(self, n: int = 1) -> None:
+        self._roll()
+        self._current += n
+        self.total += n
+
+    def snapshot(self) -> dict:
+        self._roll()
+        return {"total": self.total, "last_minute": self._previous}
+
+
+class OutboxDispatcher:
+    def __init__(
+        self,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        concurrency: int = OUTBOX_SEND_CONCURRENCY,
+        timeout: float = OUTBOX_SEND_TIMEOUT_SECONDS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        backoff_base: float = OUTBOX_BACKOFF_BASE_SECONDS,
+        backoff_max: float = OUTBOX_BACKOFF_MAX_SECONDS,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.counters = {name: ThroughputCounter() for name in ("queued", "sent", "failed", "dead")}
+        self._pool: ThreadPoolExecutor | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt after ``attempts`` failed ones."""
+        return min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+
+    def record_queued(self, n: int) -> None:
+        if n:
+            self.counters["queued"].add(n)
+
+    def wake(self) -> None:
+        """Start the next batch now instead of at the next poll (call from the loop's thread)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _send(self, semaphore: asyncio.Semaphore, row) -> str | None:
+        """None on success, otherwise the error to record."""
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="outbox-send")
+            future = loop.run_in_executor(
+                self._pool, lambda: send_email(list(row.recipients), row.subject, row.html, idempotency_key=row.idempotency_key)
+            )
+            try:
+                await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                return f"timed out after {self.timeout:.0f}s"
+            except Exception as exc:
+                return f"{type(exc).__name__}: {exc}"
+        return None
+
+    def _record(self, db: Session, rows: list, errors: list[str | None], now: datetime) -> int:
+        """Store the outcome of a batch; returns how many emails were dead-lettered."""
+        dead = 0
+        outbox_repo.mark_sent(db, [row.id for row, err in zip(rows, errors) if err is None], now)
+        for row, err in zip(rows, errors):
+            if err is None:
+                continue
+            attempts = row.attempts + 1
+            if attempts >= self.max_attempts:
+                logger.error("Email %s dead-lettered after %d attempts: %s", row.idempotency_key, attempts, err)
+                outbox_repo.mark_failed(db, row.id, attempts, err, None)
+                dead += 1
+            else:
+                logger.warning("Email %s failed (attempt %d): %s", row.idempotency_key, attempts, err)
+                outbox_repo.mark_failed(db, row.id, attempts, err, now + timedelta(seconds=self.backoff(attempts)))
+        db.commit()
+        return dead
+
+    async def dispatch_once(self) -> int:
+        """Send one batch of due emails; returns how many were claimed."""
+        rows = await run_db(
+            outbox_repo.claim_due, datetime.utcnow(), self.batch_size, max(OUTBOX_CLAIM_SECONDS, self.timeout * 2)
+        )
+        if not rows:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errors = await asyncio.gather(*(self._send(semaphore, row) for row in rows))
+        dead = await run_db(self._record, rows, errors, datetime.utcnow())
+        sent = sum(1 for err in errors if err is None)
+        self.counters["sent"].add(sent)
+        self.counters["failed"].add(len(rows) - sent)
+        self.counters["dead"].add(dead)
+        return len(rows)
+
+    async def drain(self) -> None:
+        """Dispatch until no email is due."""
+        while await self.dispatch_once() >= self.batch_size:
+            pass
+
+    async def run(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.drain()
+            except Exception:
+                # keep the loop alive
+                logger.exception("Outbox dispatch failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def snapshot(self) -> dict:
+        return {name: counter.snapshot() for name, counter in self.counters.items()}
+
+    def shutdown(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+dispatcher = OutboxDispatcher()
+
+
+async def start_outbox_loop():
+    await dispatcher.run()
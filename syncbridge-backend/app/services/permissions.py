@@ -3,13 +3,27 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from app.api.v1.deps import get_db
-from app.models import Block, File, Form, Message, Function, NonFunction, User
+from app.models import Form, Message, Function, NonFunction, User
 from app.repositories import users as user_repo, forms as form_repo
+from app.services.access import MessageAccess
+from app.services.identity_cache import identity_cache
 from app.utils import decode_token, error
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
+def load_principal(db: Session, user_id: int, iat=None) -> User | None:
+    """User for a verified token, served from the identity cache when possible."""
+    cached = identity_cache.get(user_id, iat)
+    if cached is not None:
+        # attach a per-session copy without a SELECT
+        return db.merge(cached, load=False)
+    user = user_repo.get_by_id(db, user_id)
+    if user is not None:
+        identity_cache.put(user_id, iat, user)
+    return user
+
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     payload = decode_token(token)
     if not payload:
@@ -17,7 +31,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     uid = payload.get("sub")
     if uid is None:
         raise HTTPException(status_code=401, detail=error("Invalid token payload", "UNAUTHORIZED"))
-    user = user_repo.get_by_id(db, int(uid))
+    user = load_principal(db, int(uid), payload.get("iat"))
     if not user:
         raise HTTPException(status_code=401, detail=error("User not found", "UNAUTHORIZED"))
     return user
@@ -160,20 +174,13 @@ def assert_can_edit_message(msg: Message, current: User):
 
 # ---------- Files ----------
 
-def assert_can_upload_file(message: Message, current: User, db: Session):
-    block = db.query(Block).filter(Block.id == message.block_id).first()
-    if not block:
-        raise HTTPException(status_code=404, detail=error("Block not found", "NOT_FOUND"))
-    form = db.query(Form).filter(Form.id == block.form_id).first()
-    assert_can_access_block(form, current, db)
+def assert_can_upload_file(access: MessageAccess, current: User, db: Session):
+    assert_can_access_block(access.form, current, db)
     return True
 
 
-def assert_can_delete_file(file_rec: File, current: User, db: Session):
-    msg = db.query(Message).filter(Message.id == file_rec.message_id).first()
-    if not msg:
-        raise HTTPException(status_code=404, detail=error("Message not found", "NOT_FOUND"))
-    if msg.user_id != current.id:
+def assert_can_delete_file(access: MessageAccess, current: User, db: Session):
+    if access.message_user_id != current.id:
         raise HTTPException(status_code=403, detail=error("Only sender can delete file", "FORBIDDEN"))
 
 
@@ -0,0 +1,217 @@
+"""
+Attachment previews.
+
+After an upload, a preview is rendered in the background and stored next to
+the blob (``<blob location>.preview.<ext>``):
+
+- images: a WebP thumbnail (Pillow)
+- PDFs: the first page as a WebP thumbnail (pypdfium2 + Pillow)
+- text: the first PREVIEW_TEXT_CHARS characters as UTF-8 text
+
+Rendering is CPU-bound, so it runs in a bounded process pool
+(PREVIEW_WORKERS processes; 0 renders in the calling thread). Previews are
+keyed by content, so identical attachments share one. A missing preview
+(never generated, lost, or a renderer that was not installed at upload
+time) is generated on demand by GET /file/{id}/preview.
+
+Pillow and pypdfium2 are optional: without them image / PDF previews are
+simply unavailable.
+"""
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from app.services.storage import StorageBackend
+from app.services.uploads import discard
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+PREVIEW_MAX_SIZE = int(os.getenv("PREVIEW_MAX_SIZE", "512"))  # px, longest edge
+PREVIEW_TEXT_CHARS = int(os.getenv("PREVIEW_TEXT_CHARS", "2000"))
+PREVIEW_TIMEOUT_SECONDS = float(os.getenv("PREVIEW_TIMEOUT_SECONDS", "20"))
+# Larger sources are not previewed (rendering cost grows with pixels / pages)
+PREVIEW_MAX_SOURCE_BYTES = int(os.getenv("PREVIEW_MAX_SOURCE_BYTES", str(50 * 1024 * 1024)))
+
+_IMAGE_EXTS = {"png", "jpg", "jpeg", "gif", "webp", "bmp", "tif", "tiff"}
+_TEXT_EXTS = {"txt", "md", "csv", "json", "log", "xml", "yaml", "yml", "py", "js", "ts", "html", "css", "sql"}
+
+
+@dataclass(frozen=True)
+class PreviewKind:
+    name: str
+    suffix: str
+    media_type: str
+
+
+IMAGE = PreviewKind("image", "preview.webp", "image/webp")
+PDF = PreviewKind("pdf", "preview.webp", "image/webp")
+TEXT = PreviewKind("text", "preview.txt", "text/plain; charset=utf-8")
+
+
+def preview_kind(file_type: str | None, file_ext: str | None) -> PreviewKind | None:
+    file_type = (file_type or "").lower()
+    file_ext = (file_ext or "").lower()
+    if file_type == "application/pdf" or file_ext == "pdf":
+        return PDF
+    if file_type.startswith("image/") or file_ext in _IMAGE_EXTS:
+        return IMAGE
+    if file_type.startswith("text/") or file_type == "application/json" or file_ext in _TEXT_EXTS:
+        return TEXT
+    return None
+
+
+def preview_location(blob_location: str, kind: PreviewKind) -> str:
+    return f"{blob_location}.{kind.suffix}"
+
+
+# ============================================================
+# Renderers (run in worker processes; must stay top-level and picklable)
+# ============================================================
+def _thumbnail_webp(image, max_size: int) -> bytes:
+    image.thumbnail((max_size, max_size))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    buf = io.BytesIO()
+    image.save(buf, format="WEBP", quality=80)
+    return buf.getvalue()
+
+
+def render_preview(kind_name: str, src_path: str, max_size: int, text_chars: int) -> bytes | None:
+    """Render a preview of the file at ``src_path``; None when the renderer is unavailable."""
+    if kind_name == "text":
+        with open(src_path, "rb") as f:
+            # up to 4 bytes per character in UTF-8
+            raw = f.read(text_chars * 4)
+        return raw.decode("utf-8", errors="replace")[:text_chars].encode("utf-8")
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    if kind_name == "image":
+        with Image.open(src_path) as image:
+            image.seek(0)  # first frame of animations
+            return _thumbnail_webp(image.copy(), max_size)
+    if kind_name == "pdf":
+        try:
+            import pypdfium2
+        except ImportError:
+            return None
+        pdf = pypdfium2.PdfDocument(src_path)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            bitmap = page.render(scale=max_size / max(width, height, 1))
+            return _thumbnail_webp(bitmap.to_pil(), max_size)
+        finally:
+            pdf.close()
+    return None
+
+
+# ============================================================
+# Pipeline
+# ============================================================
+class PreviewPipeline:
+    def __init__(self, workers: int = PREVIEW_WORKERS, timeout: float = PREVIEW_TIMEOUT_SECONDS):
+        self.workers = workers
+        self.timeout = timeout
+        self.metrics = {"generated": 0, "unavailable": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+        self._processes: ProcessPoolExecutor | None = None
+        self._threads: ThreadPoolExecutor | None = None
+
+    def _render(self, kind: PreviewKind, src_path: str) -> bytes | None:
+        if self.workers <= 0:
+            return render_preview(kind.name, src_path, PREVIEW_MAX_SIZE, PREVIEW_TEXT_CHARS)
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=self.workers)
+        future = self._processes.submit(render_preview, kind.name, src_path, PREVIEW_MAX_SIZE, PREVIEW_TEXT_CHARS)
+        return future.result(timeout=self.timeout)
+
+    def _generate(self, storage: StorageBackend, blob_location: str, kind: PreviewKind) -> bool:
+        target = preview_location(blob_location, kind)
+        if storage.exists(target):
+            return True
+        src_path = storage.local_path(blob_location)
+        tmp_path = None
+        try:
+            if src_path is None:
+                # remote blob: the renderer needs a local file
+                fd, tmp_path = tempfile.mkstemp(prefix=".preview-src-")
+                with os.fdopen(fd, "wb") as out:
+                    for chunk in storage.open_stream(blob_location):
+                        out.write(chunk)
+                src_path = tmp_path
+            data = self._render(kind, src_path)
+        except Exception:
+            self.metrics["failed"] += 1
+            logger.exception("Preview generation failed for %s", blob_location)
+            return False
+        finally:
+            if tmp_path:
+                discard(tmp_path)
+        if data is None:
+            self.metrics["unavailable"] += 1
+            return False
+        storage.put_bytes(target, data, kind.media_type)
+        self.metrics["generated"] += 1
+        return True
+
+    def _submit(self, storage: StorageBackend, blob_location: str, kind: PreviewKind) -> Future:
+        target = preview_location(blob_location, kind)
+        with self._lock:
+            future = self._inflight.get(target)
+            if future is not None:
+                return future  # same content already being rendered
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix="preview")
+            future = self._threads.submit(self._generate, storage, blob_location, kind)
+            self._inflight[target] = future
+        future.add_done_callback(lambda _f: self._forget(target))
+        return future
+
+    def _forget(self, target: str) -> None:
+        with self._lock:
+            self._inflight.pop(target, None)
+
+    def schedule(self, storage: StorageBackend, blob_location: str, size: int, file_type: str, file_ext: str) -> None:
+        """Fire-and-forget preview generation after an upload."""
+        kind = preview_kind(file_type, file_ext)
+        if kind is None or size > PREVIEW_MAX_SOURCE_BYTES:
+            return
+        if self.workers <= 0:
+            self._generate(storage, blob_location, kind)
+            return
+        self._submit(storage, blob_location, kind)
+
+    def ensure(self, storage: StorageBackend, blob_location: str, kind: PreviewKind, size: int) -> bool:
+        """Make sure the preview exists, rendering it now if needed (lazy regeneration)."""
+        if size > PREVIEW_MAX_SOURCE_BYTES:
+            return False  # never rendered, same as schedule()
+        if storage.exists(preview_location(blob_location, kind)):
+            return True
+        if self.workers <= 0:
+            return self._generate(storage, blob_location, kind)
+        try:
+            return self._submit(storage, blob_location, kind).result(timeout=self.timeout)
+        except Exception:
+            logger.warning("Preview for %s not ready in %.0fs", blob_location, self.timeout)
+            return False
+
+    def shutdown(self) -> None:
+        with self._lock:
+            processes, self._processes = self._processes, None
+            threads, self._threads = self._threads, None
+        if threads is not None:
+            threads.shutdown(wait=False, cancel_futures=True)
+        if processes is not None:
+            processes.shutdown(wait=False, cancel_futures=True)
+
+
+pipeline = PreviewPipeline()
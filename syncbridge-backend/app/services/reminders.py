@@ -1,133 +1,419 @@
 import asyncio
+import hashlib
+import logging
 import os
 from contextlib import suppress
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
 
-from app.core.database import SessionLocal
 from app.models import Block, Form, User
-from app.utils.email_client import send_email
+from app.services import outbox
+from app.services.background import run_db
+from app.services.deadlines import THRESHOLDS, DeadlineHeap, deadlines, due_at
+from app.services.leases import LeaderLease
 
-# thresholds
-URGENT_MINUTES = int(os.getenv("REMINDER_URGENT_MINUTES", "5"))
-NORMAL_HOURS = int(os.getenv("REMINDER_NORMAL_HOURS", "48"))
+# full scan of every status even when no deadline is queued (activity seen by other workers, missed pushes)
+REMINDER_RECONCILE_SECONDS = float(os.getenv("REMINDER_RECONCILE_SECONDS", "900"))
+# how often the next pending deadline of every status is re-read from the DB, so activity
+# handled by other workers (not pushed to this process's heap) is picked up in time;
+# never longer than the urgent threshold
+REMINDER_REFRESH_SECONDS = min(
+    float(os.getenv("REMINDER_REFRESH_SECONDS", "60")), THRESHOLDS["urgent"].total_seconds()
+)
 
-# loop intervals
-URGENT_CHECK_SECONDS = int(os.getenv("REMINDER_URGENT_CHECK_SECONDS", "60"))  # 每分钟
-NORMAL_CHECK_SECONDS = int(os.getenv("REMINDER_NORMAL_CHECK_SECONDS", "3600"))  # 每小时
+# due blocks fetched (and marked / queued) per round trip
+REMINDER_PAGE_SIZE = int(os.getenv("REMINDER_PAGE_SIZE", "200"))
+# one summary email per recipient per cycle instead of one email per block
+REMINDER_DIGEST = os.getenv("REMINDER_DIGEST", "false").lower() in ("true", "1", "yes")
+# "lease": one process (the holder of the "reminders" lease) runs the scheduler;
+# "skip_locked": every process runs it and claims due blocks with FOR UPDATE SKIP LOCKED
+REMINDER_CLAIM_MODE = os.getenv("REMINDER_CLAIM_MODE", "lease").lower()
 
+logger = logging.getLogger(__name__)
 
-def _fetch_due_urgent_blocks(db: Session):
-    now = datetime.utcnow()
-    urgent_deadline = now - timedelta(minutes=URGENT_MINUTES)
+
+@dataclass(frozen=True)
+class DueReminder:
+    """A due block with everything needed to send its reminder (one joined row)."""
+    block_id: int
+    status: str
+    block_type: str
+    last_message_at: datetime | None
+    form_id: int | None  # None: the form is gone
+    form_title: str | None
+    recipients: tuple[str, ...]
+
+
+def _due_query(db: Session):
+    client, developer = aliased(User), aliased(User)
     return (
-        db.query(Block)
-        .filter(
-            Block.reminder_sent == 0,
-            (Block.status == "urgent") & (Block.last_message_at <= urgent_deadline),
+        db.query(
+            Block.id,
+            Block.status,
+            Block.type,
+            Block.last_message_at,
+            Form.id,
+            Form.title,
+            client.email,
+            developer.email,
         )
-        .order_by(Block.last_message_at.asc())
-        .all()
+        .outerjoin(Form, Form.id == Block.form_id)
+        .outerjoin(client, client.id == Form.user_id)
+        .outerjoin(developer, developer.id == Form.developer_id)
     )
 
 
-def _fetch_due_normal_blocks(db: Session):
-    now = datetime.utcnow()
-    normal_deadline = now - timedelta(hours=NORMAL_HOURS)
-    return (
-        db.query(Block)
-        .filter(
-            Block.reminder_sent == 0,
-            (Block.status == "normal") & (Block.last_message_at <= normal_deadline),
-        )
-        .order_by(Block.last_message_at.asc())
-        .all()
+def _to_reminder(row) -> DueReminder:
+    block_id, status, block_type, last_message_at, form_id, form_title, client_email, developer_email = row
+    # client first; drop empty and duplicate addresses
+    recipients = tuple(dict.fromkeys(e for e in (client_email, developer_email) if e))
+    return DueReminder(block_id, status, block_type, last_message_at, form_id, form_title, recipients)
+
+
+def _fetch_due_page(
+    db: Session,
+    status: str,
+    deadline: datetime,
+    after: tuple[datetime, int] | None,
+    limit: int,
+    skip_locked: bool = False,
+) -> list[DueReminder]:
+    """
+    Next page of due blocks of ``status``, oldest activity first, keyset-paginated
+    on (last_message_at, id) so blocks whose send failed are not fetched again
+    in the same cycle. Served by ix_blocks_reminder_scan. With ``skip_locked``
+    the block rows stay locked until the caller commits, and rows another
+    scanner holds are skipped instead of waited for.
+    """
+    q = _due_query(db).filter(
+        Block.reminder_sent == 0,
+        Block.status == status,
+        Block.last_message_at <= deadline,
     )
+    if after is not None:
+        last_at, last_id = after
+        q = q.filter(
+            (Block.last_message_at > last_at) | ((Block.last_message_at == last_at) & (Block.id > last_id))
+        )
+    q = q.order_by(Block.last_message_at.asc(), Block.id.asc()).limit(limit)
+    if skip_locked:
+        # only the blocks: forms / users are on the nullable side of the outer joins
+        q = q.with_for_update(skip_locked=True, of=Block)
+    return [_to_reminder(row) for row in q.all()]
 
 
-def _collect_recipients(db: Session, form: Form) -> list[str]:
-    recipients: list[str] = []
-    client = db.get(User, form.user_id)
-    if client and client.email:
-        recipients.append(client.email)
-    if form.developer_id:
-        developer = db.get(User, form.developer_id)
-        if developer and developer.email:
-            recipients.append(developer.email)
-    # remove duplicates while preserving order
-    unique: list[str] = []
-    for email in recipients:
-        if email not in unique:
-            unique.append(email)
-    return unique
-
-
-def _format_email(block: Block, form: Form) -> tuple[str, str]:
-    subject = f"[SyncBridge] {block.status.title()} reminder for form {form.id}"
-    last_ts = block.last_message_at.strftime("%Y-%m-%d %H:%M:%S UTC") if block.last_message_at else "unknown"
+def _format_email(reminder: DueReminder) -> tuple[str, str]:
+    subject = f"[SyncBridge] {reminder.status.title()} reminder for form {reminder.form_id}"
+    last_ts = reminder.last_message_at.strftime("%Y-%m-%d %H:%M:%S UTC") if reminder.last_message_at else "unknown"
     html = (
-        f"<p>Form: {form.title}</p>"
-        f"<p>Status: {block.status}</p>"
-        f"<p>Block type: {block.type}</p>"
+        f"<p>Form: {reminder.form_title}</p>"
+        f"<p>Status: {reminder.status}</p>"
+        f"<p>Block type: {reminder.block_type}</p>"
         f"<p>Last message at: {last_ts}</p>"
         f"<p>This is an automated reminder from bridge-no-reply@icu.584743.xyz.</p>"
     )
     return subject, html
 
 
-def _process_blocks(db: Session, blocks: list[Block]) -> None:
-    for block in blocks:
-        form = db.get(Form, block.form_id)
-        if not form:
-            block.reminder_sent = 1
-            db.add(block)
-            db.commit()
-            continue
-        recipients = _collect_recipients(db, form)
-        if not recipients:
-            block.reminder_sent = 1
-            db.add(block)
-            db.commit()
-            continue
-        subject, html = _format_email(block, form)
-        try:
-            send_email(recipients, subject, html)
-            block.reminder_sent = 1
-            db.add(block)
-            db.commit()
-        except Exception:
-            # Keep reminder_sent as is to retry next cycle
-            db.rollback()
-
-async def start_urgent_loop():
-    while True:
-        try:
-            db = SessionLocal()
+def _format_digest(reminders: list[DueReminder]) -> tuple[str, str]:
+    """One summary email for all of a recipient's due blocks (a single block reads as a plain reminder)."""
+    if len(reminders) == 1:
+        return _format_email(reminders[0])
+    statuses = sorted({r.status for r in reminders})
+    subject = f"[SyncBridge] {len(reminders)} {'/'.join(statuses)} blocks are waiting for a reply"
+    items = "".join(
+        f"<li>Form {r.form_id} ({r.form_title}): {r.block_type} block, {r.status}, last message at "
+        f"{r.last_message_at.strftime('%Y-%m-%d %H:%M:%S UTC') if r.last_message_at else 'unknown'}</li>"
+        for r in reminders
+    )
+    html = (
+        f"<p>{len(reminders)} blocks have had no reply for a while:</p>"
+        f"<ul>{items}</ul>"
+        f"<p>This is an automated reminder from bridge-no-reply@icu.584743.xyz.</p>"
+    )
+    return subject, html
+
+
+def _idempotency_key(reminder: DueReminder) -> str:
+    # one reminder per block per idle period: new activity gives a new key
+    return f"reminder:{reminder.block_id}:{reminder.last_message_at:%Y%m%dT%H%M%S%f}"
+
+
+def _digest_key(email: str, reminders: list[DueReminder]) -> str:
+    # same recipient and same set of idle periods -> same digest
+    parts = [email] + sorted(_idempotency_key(r) for r in reminders)
+    return "reminder-digest:" + hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def _mark(db: Session, block_ids: list[int], deadline: datetime) -> set[int]:
+    """Set reminder_sent on due blocks (one UPDATE per REMINDER_PAGE_SIZE ids); returns the ids it armed."""
+    marked: set[int] = set()
+    for i in range(0, len(block_ids), REMINDER_PAGE_SIZE):
+        chunk = block_ids[i:i + REMINDER_PAGE_SIZE]
+        # a message that arrived since the page was read reset the block; leave it for its next deadline
+        db.query(Block).filter(
+            Block.id.in_(chunk), Block.reminder_sent == 0, Block.last_message_at <= deadline
+        ).update({Block.reminder_sent: 1}, synchronize_session=False)
+        # only the blocks this UPDATE armed get an email
+        marked.update(
+            block_id
+            for (block_id,) in db.query(Block.id).filter(
+                Block.id.in_(chunk), Block.reminder_sent == 1, Block.last_message_at <= deadline
+            )
+        )
+    return marked
+
+
+def _commit_queued(db: Session, emails: list) -> int:
+    queued = outbox.enqueue_many(db, emails)
+    db.commit()
+    if queued < len(emails):
+        # keys another scanner queued first; the rest of the batch went in
+        logger.info("Skipped %d reminder(s) already queued elsewhere", len(emails) - queued)
+    return queued
+
+
+def _enqueue(db: Session, reminders: list[DueReminder], deadline: datetime) -> int:
+    """
+    Mark a batch of blocks reminded and queue their emails in the outbox, in one
+    transaction and with one UPDATE for the batch; returns the number of emails queued.
+    """
+    if not reminders:
+        return 0
+    marked = _mark(db, [r.block_id for r in reminders], deadline)
+    emails = [
+        (_idempotency_key(r), list(r.recipients), *_format_email(r))
+        for r in reminders
+        # no form / no address: nothing to send, but do not pick the block up again
+        if r.block_id in marked and r.form_id is not None and r.recipients
+    ]
+    return _commit_queued(db, emails)
+
+
+def _enqueue_digests(db: Session, reminders: list[DueReminder], deadline: datetime) -> int:
+    """
+    Digest mode: mark all of a cycle's due blocks and queue one email per
+    recipient listing their blocks, in a single transaction (a block shared by
+    client and developer appears in both digests). Returns the number of emails queued.
+    """
+    if not reminders:
+        return 0
+    marked = _mark(db, [r.block_id for r in reminders], deadline)
+    by_recipient: dict[str, list[DueReminder]] = {}
+    for r in reminders:
+        if r.block_id in marked and r.form_id is not None:
+            for email in r.recipients:
+                by_recipient.setdefault(email, []).append(r)
+    emails = [
+        (_digest_key(email, items), [email], *_format_digest(items))
+        for email, items in by_recipient.items()
+    ]
+    return _commit_queued(db, emails)
+
+
+def _collect_due(
+    db: Session, status: str, deadline: datetime, page_size: int, skip_locked: bool = False
+) -> list[DueReminder]:
+    """Every due block of the cycle, read page by page (digests need all of a recipient's blocks)."""
+    due: list[DueReminder] = []
+    after = None
+    while page := _fetch_due_page(db, status, deadline, after, page_size, skip_locked):
+        due.extend(page)
+        after = (page[-1].last_message_at, page[-1].block_id)
+    return due
+
+
+def _scan_digest(db: Session, status: str, deadline: datetime, page_size: int, skip_locked: bool = False) -> int:
+    return _enqueue_digests(db, _collect_due(db, status, deadline, page_size, skip_locked), deadline)
+
+
+def _claim_page(
+    db: Session, status: str, deadline: datetime, after: tuple[datetime, int] | None, limit: int
+) -> tuple[tuple[datetime, int] | None, int]:
+    """
+    Lock a page of due blocks (skipping those another scanner holds), mark
+    them and queue their emails in that one transaction. Returns the keyset
+    cursor for the next page (None when done) and the number of emails queued.
+    """
+    page = _fetch_due_page(db, status, deadline, after, limit, skip_locked=True)
+    if not page:
+        db.rollback()
+        return None, 0
+    return (page[-1].last_message_at, page[-1].block_id), _enqueue(db, page, deadline)
+
+
+def _skip_locked(skip_locked: bool | None) -> bool:
+    return REMINDER_CLAIM_MODE == "skip_locked" if skip_locked is None else skip_locked
+
+
+# ============================================================
+# Off-loop scanning
+# ============================================================
+async def scan_due_async(
+    status: str,
+    deadline: datetime,
+    page_size: int = REMINDER_PAGE_SIZE,
+    digest: bool | None = None,
+    skip_locked: bool | None = None,
+) -> int:
+    """
+    Queue reminders for every ``status`` block idle since ``deadline``, page by
+    page, without blocking the event loop: each page is read and queued on a
+    background DB thread. Returns the number of emails queued.
+    """
+    skip_locked = _skip_locked(skip_locked)
+    queued = 0
+    if REMINDER_DIGEST if digest is None else digest:
+        queued = await run_db(_scan_digest, status, deadline, page_size, skip_locked)
+    elif skip_locked:
+        # read, mark and queue each page in one transaction so its row locks hold until commit
+        after = None
+        while True:
+            after, n = await run_db(_claim_page, status, deadline, after, page_size)
+            queued += n
+            if after is None:
+                break
+    else:
+        after = None
+        while page := await run_db(_fetch_due_page, status, deadline, after, page_size):
+            queued += await run_db(_enqueue, page, deadline)
+            after = (page[-1].last_message_at, page[-1].block_id)
+    outbox.dispatcher.record_queued(queued)
+    if queued:
+        outbox.dispatcher.wake()
+    return queued
+
+
+def _oldest_pending(db: Session, status: str) -> datetime | None:
+    """Earliest last_message_at among ``status`` blocks not reminded yet (ix_blocks_reminder_scan)."""
+    return (
+        db.query(func.min(Block.last_message_at))
+        .filter(Block.status == status, Block.reminder_sent == 0)
+        .scalar()
+    )
+
+
+# ============================================================
+# Deadline-driven scheduler
+# ============================================================
+class ReminderScheduler:
+    """
+    Sleeps until the earliest queued deadline (``last_message_at + threshold``),
+    scans the statuses that are due, then queues the next deadline still
+    pending in the DB. Every ``refresh_seconds`` the next pending deadline of
+    each status is read from the DB (one MIN per status), which covers blocks
+    touched on other workers; every ``reconcile_seconds`` all statuses are
+    scanned regardless, as a last safety net.
+    """
+
+    def __init__(
+        self,
+        heap: DeadlineHeap = deadlines,
+        clock=datetime.utcnow,
+        scan=None,
+        reconcile_seconds: float = REMINDER_RECONCILE_SECONDS,
+        refresh_seconds: float = REMINDER_REFRESH_SECONDS,
+        min_interval_seconds: float = 1.0,
+        retry_seconds: float = 60.0,
+    ):
+        self.heap = heap
+        self.clock = clock
+        self.scan = scan or scan_due_async
+        self.reconcile = timedelta(seconds=reconcile_seconds)
+        self.refresh = timedelta(seconds=refresh_seconds)
+        # lower bound between two scans of a status, so a block the scan left pending cannot spin the loop
+        self.min_interval = timedelta(seconds=min_interval_seconds)
+        self.retry = timedelta(seconds=retry_seconds)
+        self.metrics = {"scans": 0, "reconciliations": 0, "refreshes": 0, "queued": 0, "errors": 0}
+        self._reconcile_at: datetime | None = None
+        self._refresh_at: datetime | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    async def tick(self) -> None:
+        """
+        Scan every status whose deadline has passed (all of them when a
+        reconciliation is due), and re-read the next pending deadline of the
+        others when a refresh is due.
+        """
+        now = self.clock()
+        statuses = self.heap.pop_due(now)
+        if self._reconcile_at is None or now >= self._reconcile_at:
+            statuses = set(THRESHOLDS)
+            self._reconcile_at = now + self.reconcile
+            self.metrics["reconciliations"] += 1
+        refresh = self._refresh_at is None or now >= self._refresh_at
+        if refresh:
+            self._refresh_at = now + self.refresh
+            self.metrics["refreshes"] += 1
+        for status in sorted(THRESHOLDS):
+            if status not in statuses and not refresh:
+                continue
             try:
-                blocks = _fetch_due_urgent_blocks(db)
-                _process_blocks(db, blocks)
-            finally:
-                db.close()
-        except Exception:
-            # swallow to keep loop alive
-            pass
-        await asyncio.sleep(URGENT_CHECK_SECONDS)
-
-
-async def start_normal_loop():
-    while True:
+                if status in statuses:
+                    self.metrics["queued"] += await self.scan(status, now - THRESHOLDS[status])
+                    self.metrics["scans"] += 1
+                oldest = await run_db(_oldest_pending, status)
+            except Exception:
+                logger.exception("Reminder scan (%s) failed", status)
+                self.metrics["errors"] += 1
+                self.heap.push(status, now + self.retry)
+                continue
+            if oldest is not None:
+                self.heap.push(status, max(due_at(status, oldest), now + self.min_interval))
+
+    def delay(self) -> float:
+        """Seconds until the next deadline, DB refresh or reconciliation."""
+        now = self.clock()
+        targets = [t for t in (self._reconcile_at, self._refresh_at, self.heap.next_due()) if t is not None]
+        return max(0.0, (min(targets, default=now) - now).total_seconds())
+
+    def wake(self) -> None:
+        """Re-read the next deadline now; safe from any thread."""
+        if self._loop is not None and self._wakeup is not None:
+            with suppress(RuntimeError):  # loop already closed
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # (re)started, e.g. after taking over the lease: deadlines seen by the old leader are not queued here
+        self._reconcile_at = None
+        self._refresh_at = None
+        self.heap.on_earlier = self.wake
         try:
-            db = SessionLocal()
-            try:
-                blocks = _fetch_due_normal_blocks(db)
-                _process_blocks(db, blocks)
-            finally:
-                db.close()
-        except Exception:
-            # swallow to keep loop alive
-            pass
-        await asyncio.sleep(NORMAL_CHECK_SECONDS)
+            while True:
+                try:
+                    await self.tick()
+                except Exception:
+                    # keep the loop alive
+                    logger.exception("Reminder scheduler tick failed")
+                # cleared before reading the heap: a push from here on wakes the wait below
+                self._wakeup.clear()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), self.delay())
+        finally:
+            self.heap.on_earlier = None
+            self._loop = None
+
+    def snapshot(self) -> dict:
+        next_due = self.heap.next_due()
+        return {**self.metrics, "next_due": next_due.isoformat() if next_due else None}
+
+
+scheduler = ReminderScheduler()
+reminder_lease = LeaderLease("reminders")
+
+
+async def start_reminder_scheduler():
+    if REMINDER_CLAIM_MODE == "skip_locked":
+        # every worker scans; concurrent scanners split the due blocks between them
+        await scheduler.run()
+    else:
+        await reminder_lease.run(scheduler.run)
 
 
 def stop_task(task: asyncio.Task | None):
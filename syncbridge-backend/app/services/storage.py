@@ -0,0 +1,291 @@
+"""
+Attachment storage backends.
+
+Routers never touch the file system directly; they go through a
+``StorageBackend``:
+
+- ``LocalStorage``: content-addressed blobs under UPLOAD_DIR (default; the
+  location stored in ``files.storage_path`` is the absolute blob path).
+- ``S3Storage``: the same blob layout in an S3-compatible bucket (AWS, MinIO,
+  ...). Locations look like ``s3://<bucket>/<key>``. Downloads can be
+  redirected to a presigned URL so large files bypass the API workers.
+
+Select with STORAGE_BACKEND=local|s3. A row is always served by the backend
+that wrote it (``storage_for(location)``), so switching backends does not
+orphan existing attachments. boto3 is only needed for the S3 backend.
+"""
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator
+
+from app.services.uploads import UPLOAD_CHUNK_SIZE, StoredUpload, discard, spool, store_blob
+from app.utils.disposition import attachment_disposition
+
+try:  # optional: only the S3 backend needs it
+    import boto3
+except ImportError:  # pragma: no cover - depends on environment
+    boto3 = None
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR") or os.path.join(_APP_DIR, "api", "uploads")
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "attachments")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None  # MinIO / other S3-compatible stores
+S3_REGION = os.getenv("S3_REGION") or None
+S3_PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", "300"))
+STORAGE_REDIRECT_DOWNLOADS = os.getenv("STORAGE_REDIRECT_DOWNLOADS", "true").lower() in ("true", "1", "yes")
+
+
+def _blob_key(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    location: str
+    size: int
+    modified: float  # POSIX timestamp
+
+
+class StorageBackend:
+    """Content-addressed blob storage; ``location`` is what goes into files.storage_path."""
+
+    def put_stream(self, src: BinaryIO, max_bytes: int) -> StoredUpload:
+        """Store ``src`` in chunks; raises uploads.UploadTooLarge past ``max_bytes``."""
+        raise NotImplementedError
+
+    def put_bytes(self, location: str, data: bytes, content_type: str) -> None:
+        """Write a small derived object (e.g. a preview) next to a blob."""
+        raise NotImplementedError
+
+    def exists(self, location: str) -> bool:
+        raise NotImplementedError
+
+    def modified(self, location: str) -> float | None:
+        """Last write of ``location`` (POSIX timestamp), None when it does not exist."""
+        raise NotImplementedError
+
+    def open_stream(self, location: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def delete(self, location: str) -> None:
+        raise NotImplementedError
+
+    def iter_objects(self) -> Iterator[StoredObject]:
+        """Everything stored by this backend (blobs, previews, temp files), lazily."""
+        raise NotImplementedError
+
+    def local_path(self, location: str) -> str | None:
+        """Path on this host, if the blob lives on the local file system."""
+        return None
+
+    def presigned_url(self, location: str, filename: str, content_type: str) -> str | None:
+        """Short-lived direct download URL, if the backend supports one."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str = UPLOAD_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put_stream(self, src: BinaryIO, max_bytes: int) -> StoredUpload:
+        return store_blob(src, self.root, max_bytes)
+
+    def put_bytes(self, location: str, data: bytes, content_type: str) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(location), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.replace(tmp_path, location)
+        except BaseException:
+            discard(tmp_path)
+            raise
+
+    def exists(self, location: str) -> bool:
+        return bool(location) and os.path.isfile(location)
+
+    def modified(self, location: str) -> float | None:
+        try:
+            return os.stat(location).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def open_stream(self, location: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        with open(location, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def delete(self, location: str) -> None:
+        discard(location)
+
+    def iter_objects(self) -> Iterator[StoredObject]:
+        # depth-first, one directory listing at a time (blob fan-out keeps them small)
+        stack = [self.root]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue  # removed while listing
+                        yield StoredObject(entry.path, st.st_size, st.st_mtime)
+
+    def local_path(self, location: str) -> str | None:
+        return location if self.exists(location) else None
+
+
+class S3Storage(StorageBackend):
+    """
+    S3-compatible backend. ``client`` is a boto3 S3 client (or anything with
+    the same methods); uploads are spooled to a local temp file first, since
+    the key is the content hash and is only known once the upload is read.
+    """
+
+    def __init__(self, client, bucket: str, prefix: str = S3_PREFIX, spool_dir: str | None = None,
+                 presign_expires: int = S3_PRESIGN_EXPIRES):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.spool_dir = spool_dir
+        self.presign_expires = presign_expires
+
+    def _key(self, sha256: str) -> str:
+        return f"{self.prefix}/{_blob_key(sha256)}" if self.prefix else _blob_key(sha256)
+
+    def _split(self, location: str) -> tuple[str, str]:
+        bucket, _, key = location.removeprefix("s3://").partition("/")
+        return bucket, key
+
+    def put_stream(self, src: BinaryIO, max_bytes: int) -> StoredUpload:
+        tmp_path, size, sha256 = spool(src, self.spool_dir or tempfile.gettempdir(), max_bytes, UPLOAD_CHUNK_SIZE)
+        key = self._key(sha256)
+        location = f"s3://{self.bucket}/{key}"
+        try:
+            # identical content is uploaded once; a copy onto itself bumps
+            # LastModified so storage_gc does not remove the object before
+            # this upload's row is committed
+            try:
+                self.client.copy_object(
+                    Bucket=self.bucket,
+                    Key=key,
+                    CopySource={"Bucket": self.bucket, "Key": key},
+                    MetadataDirective="REPLACE",
+                )
+            except Exception as exc:
+                if not _is_not_found(exc):
+                    raise
+                self.client.upload_file(tmp_path, self.bucket, key)
+        finally:
+            discard(tmp_path)
+        return StoredUpload(path=location, size=size, sha256=sha256)
+
+    def put_bytes(self, location: str, data: bytes, content_type: str) -> None:
+        bucket, key = self._split(location)
+        self.client.put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+
+    def _head(self, location: str) -> dict | None:
+        bucket, key = self._split(location)
+        try:
+            return self.client.head_object(Bucket=bucket, Key=key)
+        except Exception as exc:
+            if _is_not_found(exc):
+                return None
+            raise
+
+    def exists(self, location: str) -> bool:
+        return self._head(location) is not None
+
+    def modified(self, location: str) -> float | None:
+        head = self._head(location)
+        return head["LastModified"].timestamp() if head is not None else None
+
+    def open_stream(self, location: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        bucket, key = self._split(location)
+        body = self.client.get_object(Bucket=bucket, Key=key)["Body"]
+        try:
+            while chunk := body.read(chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    def delete(self, location: str) -> None:
+        bucket, key = self._split(location)
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+    def iter_objects(self) -> Iterator[StoredObject]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        prefix = f"{self.prefix}/" if self.prefix else ""
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                yield StoredObject(f"s3://{self.bucket}/{obj['Key']}", obj["Size"], obj["LastModified"].timestamp())
+
+    def presigned_url(self, location: str, filename: str, content_type: str) -> str | None:
+        bucket, key = self._split(location)
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": bucket,
+                "Key": key,
+                "ResponseContentDisposition": attachment_disposition(filename),
+                "ResponseContentType": content_type,
+            },
+            ExpiresIn=self.presign_expires,
+        )
+
+
+def _is_not_found(exc: Exception) -> bool:
+    # botocore.exceptions.ClientError carries the S3 error code in .response
+    code = str(getattr(exc, "response", {}).get("Error", {}).get("Code", ""))
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+# ============================================================
+# Backend selection
+# ============================================================
+_local: LocalStorage | None = None
+_s3: S3Storage | None = None
+
+
+def _s3_from_env() -> S3Storage:
+    if boto3 is None:
+        raise RuntimeError("S3 storage requires boto3 (pip install boto3)")
+    if not S3_BUCKET:
+        raise RuntimeError("S3_BUCKET must be set for S3 storage")
+    client = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL, region_name=S3_REGION)
+    return S3Storage(client, S3_BUCKET)
+
+
+def get_local_storage() -> LocalStorage:
+    global _local
+    if _local is None:
+        _local = LocalStorage()
+    return _local
+
+
+def get_s3_storage() -> S3Storage:
+    global _s3
+    if _s3 is None:
+        _s3 = _s3_from_env()
+    return _s3
+
+
+def get_storage() -> StorageBackend:
+    """Backend that new uploads go to."""
+    return get_s3_storage() if STORAGE_BACKEND == "s3" else get_local_storage()
+
+
+def storage_for(location: str) -> StorageBackend:
+    """Backend that holds an existing row's blob."""
+    return get_s3_storage() if location.startswith("s3://") else get_local_storage()
+
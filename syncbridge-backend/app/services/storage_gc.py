@@ -0,0 +1,264 @@
+"""
+Storage garbage collection and reconciliation.
+
+Blobs and ``files`` rows can drift apart: upload_file stores the blob before
+its row is committed, and delete_file as well as cascade deletes of messages /
+blocks / forms drop rows without touching storage (blobs are shared by
+content hash, so removing one inline would race a concurrent upload of the
+same content). This job is what frees their space. In the other direction a blob can be lost while its row remains.
+
+``reconcile`` checks both directions incrementally:
+
+- storage -> DB: objects are listed lazily and checked GC_BATCH_SIZE at a
+  time with one indexed ``content_hash IN (...)`` query per batch. A blob no
+  row references is an orphan once it is older than GC_GRACE_SECONDS (an
+  upload in flight has a blob but no row yet). Previews
+  (``<blob>.preview.*``) follow their blob; ``.upload-*`` temp files are
+  orphans once older than the grace period.
+- DB -> storage: ``files`` rows are read by keyset pagination and rows whose
+  blob is missing are reported. They are never deleted here.
+
+Neither side is loaded into memory as a whole. GC_BATCH_PAUSE_SECONDS
+between batches and GC_MAX_DELETES per run keep the job from competing with
+requests for the DB and the disk. Without ``delete=True`` nothing is removed.
+
+    python -m app.services.storage_gc [--delete]
+
+STORAGE_GC_INTERVAL_SECONDS > 0 (the default) also runs it, deleting, inside
+the API process that holds the "storage_gc" lease, see start_gc_loop.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, Iterator
+
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.repositories import files as file_repo
+from app.services.leases import LeaderLease
+from app.services.storage import (
+    STORAGE_BACKEND,
+    StorageBackend,
+    StoredObject,
+    get_local_storage,
+    get_s3_storage,
+    storage_for,
+)
+
+logger = logging.getLogger(__name__)
+
+GC_BATCH_SIZE = int(os.getenv("STORAGE_GC_BATCH_SIZE", "500"))
+GC_BATCH_PAUSE_SECONDS = float(os.getenv("STORAGE_GC_BATCH_PAUSE_SECONDS", "0.2"))
+GC_GRACE_SECONDS = int(os.getenv("STORAGE_GC_GRACE_SECONDS", "86400"))
+GC_MAX_DELETES = int(os.getenv("STORAGE_GC_MAX_DELETES", "1000"))
+GC_INTERVAL_SECONDS = int(os.getenv("STORAGE_GC_INTERVAL_SECONDS", "3600"))  # 0: no in-process loop
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+_PREVIEW_MARKER = ".preview."
+_TEMP_PREFIX = ".upload-"
+_MISSING_SAMPLE = 100
+
+
+@dataclass
+class GCReport:
+    scanned_objects: int = 0
+    skipped_recent: int = 0
+    orphan_blobs: int = 0
+    orphan_previews: int = 0
+    stale_temp_files: int = 0
+    orphan_bytes: int = 0
+    deleted: int = 0
+    reclaimed_bytes: int = 0
+    delete_errors: int = 0
+    scanned_rows: int = 0
+    missing_blobs: int = 0
+    missing_file_ids: list[int] = field(default_factory=list)  # first _MISSING_SAMPLE
+
+
+def _name(location: str) -> str:
+    return location.rsplit("/", 1)[-1]
+
+
+def _blob_of(location: str) -> str:
+    """The blob a location belongs to (itself, or the blob a preview was rendered from)."""
+    base, marker, _ = location.rpartition(_PREVIEW_MARKER)
+    return base if marker else location
+
+
+def _batches(objects: Iterable[StoredObject], size: int) -> Iterator[list[StoredObject]]:
+    batch: list[StoredObject] = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _referenced(db: Session, blobs: Iterable[str]) -> set[str]:
+    hashes, legacy = set(), set()
+    for blob in blobs:
+        name = _name(blob)
+        if _SHA256.fullmatch(name):
+            hashes.add(name)
+        else:
+            legacy.add(blob)  # pre content-addressing name: only its storage_path identifies it
+    return file_repo.referenced_locations(db, hashes, legacy)
+
+
+def _still_orphan(db: Session, storage: StorageBackend, obj: StoredObject, cutoff: float) -> bool:
+    """Re-check one candidate right before deleting it (a row or a re-upload may have appeared since)."""
+    modified = storage.modified(obj.location)
+    if modified is None:
+        return False  # already gone
+    if modified > cutoff:
+        return False  # re-stored by a concurrent upload of the same content
+    if _name(obj.location).startswith(_TEMP_PREFIX):
+        return True
+    return not _referenced(db, [_blob_of(obj.location)])
+
+
+def _sweep_storage(db: Session, storage: StorageBackend, report: GCReport, delete: bool,
+                   batch_size: int, grace_seconds: int, max_deletes: int, pause: float) -> None:
+    for batch in _batches(storage.iter_objects(), batch_size):
+        cutoff = time.time() - grace_seconds
+        report.scanned_objects += len(batch)
+        candidates = []
+        for obj in batch:
+            if obj.modified > cutoff:
+                report.skipped_recent += 1
+            else:
+                candidates.append(obj)
+        blobs = {_blob_of(o.location) for o in candidates if not _name(o.location).startswith(_TEMP_PREFIX)}
+        referenced = _referenced(db, blobs)
+        for obj in candidates:
+            name = _name(obj.location)
+            if name.startswith(_TEMP_PREFIX):
+                report.stale_temp_files += 1
+            elif _blob_of(obj.location) in referenced:
+                continue
+            elif _PREVIEW_MARKER in name:
+                report.orphan_previews += 1
+            else:
+                report.orphan_blobs += 1
+            report.orphan_bytes += obj.size
+            if not delete or report.deleted >= max_deletes:
+                continue
+            if not _still_orphan(db, storage, obj, cutoff):
+                continue
+            try:
+                storage.delete(obj.location)
+            except Exception:
+                report.delete_errors += 1
+                logger.exception("Storage GC could not delete %s", obj.location)
+                continue
+            report.deleted += 1
+            report.reclaimed_bytes += obj.size
+        if pause:
+            time.sleep(pause)
+
+
+def _check_rows(db: Session, report: GCReport, batch_size: int, pause: float) -> None:
+    after_id = 0
+    while True:
+        rows = file_repo.page_locations(db, after_id, batch_size)
+        if not rows:
+            return
+        checked: dict[str, bool] = {}
+        for file_id, location in rows:
+            if location not in checked:
+                checked[location] = bool(location) and storage_for(location).exists(location)
+            if not checked[location]:
+                report.missing_blobs += 1
+                if len(report.missing_file_ids) < _MISSING_SAMPLE:
+                    report.missing_file_ids.append(file_id)
+        report.scanned_rows += len(rows)
+        after_id = rows[-1][0]
+        if pause:
+            time.sleep(pause)
+
+
+def _default_backends() -> list[StorageBackend]:
+    backends: list[StorageBackend] = [get_local_storage()]
+    if STORAGE_BACKEND == "s3":
+        backends.append(get_s3_storage())
+    return backends
+
+
+def reconcile(
+    db: Session,
+    backends: list[StorageBackend] | None = None,
+    delete: bool = False,
+    batch_size: int = GC_BATCH_SIZE,
+    grace_seconds: int = GC_GRACE_SECONDS,
+    max_deletes: int = GC_MAX_DELETES,
+    pause: float = GC_BATCH_PAUSE_SECONDS,
+) -> GCReport:
+    """One reconciliation pass over storage and the files table; dry run unless ``delete``."""
+    report = GCReport()
+    for storage in backends if backends is not None else _default_backends():
+        _sweep_storage(db, storage, report, delete, batch_size, grace_seconds, max_deletes, pause)
+    _check_rows(db, report, batch_size, pause)
+    logger.info("Storage GC: %s", asdict(report))
+    return report
+
+
+def _run_once(delete: bool) -> GCReport:
+    db = SessionLocal()
+    try:
+        return reconcile(db, delete=delete)
+    finally:
+        db.close()
+
+
+async def _gc_loop():
+    while True:
+        await asyncio.sleep(GC_INTERVAL_SECONDS)
+        try:
+            # file system / object store walk: keep it off the event loop
+            await asyncio.to_thread(_run_once, True)
+        except Exception:
+            logger.exception("Storage GC run failed")
+
+
+gc_lease = LeaderLease("storage_gc")
+
+
+async def start_gc_loop():
+    # one process per deployment walks the storage
+    await gc_lease.run(_gc_loop)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Reconcile attachment storage with the files table.")
+    parser.add_argument("--delete", action="store_true", help="remove orphans (default: report only)")
+    parser.add_argument("--batch-size", type=int, default=GC_BATCH_SIZE)
+    parser.add_argument("--grace-seconds", type=int, default=GC_GRACE_SECONDS)
+    parser.add_argument("--max-deletes", type=int, default=GC_MAX_DELETES)
+    parser.add_argument("--pause", type=float, default=GC_BATCH_PAUSE_SECONDS)
+    args = parser.parse_args(argv)
+    db = SessionLocal()
+    try:
+        report = reconcile(
+            db,
+            delete=args.delete,
+            batch_size=args.batch_size,
+            grace_seconds=args.grace_seconds,
+            max_deletes=args.max_deletes,
+            pause=args.pause,
+        )
+    finally:
+        db.close()
+    print(json.dumps(asdict(report), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+"""
+Streaming, content-addressed upload storage.
+
+The upload is copied to a temp file next to its destination in fixed-size
+chunks, hashed on the fly, and renamed into place only once it is complete,
+so the request never holds the whole file in memory and a half-written file
+never appears under its final name. The size limit is checked per chunk:
+an oversized upload is abandoned as soon as it crosses the limit.
+
+Attachments are stored as blobs named by their SHA-256 (``store_blob``), so
+identical content is kept once however many messages attach it. Deleting a
+``files`` row never touches its blob (another upload of the same content may
+be reusing it); blobs no row references are removed by storage_gc.
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+def spool(src: BinaryIO, directory: str, max_bytes: int, chunk_size: int) -> tuple[str, int, str]:
+    """Copy ``src`` into a temp file in ``directory``; returns (temp path, size, sha256 hex)."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        discard(tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+
+def discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ============================================================
+# Content-addressed blobs
+# ============================================================
+def blob_path(root: str, sha256: str) -> str:
+    """``root/ab/cd/<sha256>``: two levels of fan-out keep directories small."""
+    return os.path.join(root, sha256[:2], sha256[2:4], sha256)
+
+
+def store_blob(src: BinaryIO, root: str, max_bytes: int, chunk_size: int = UPLOAD_CHUNK_SIZE) -> StoredUpload:
+    """
+    Store ``src`` under its SHA-256; identical content is kept once. Rows in
+    ``files`` reference blobs by (content_hash, storage_path); unreferenced
+    blobs are removed by storage_gc.
+    """
+    tmp_path, size, sha256 = spool(src, root, max_bytes, chunk_size)
+    path = blob_path(root, sha256)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Replace even when the blob exists: same bytes, and the fresh mtime
+        # keeps storage_gc from removing it before this upload's row is committed
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard(tmp_path)
+        raise
+    return StoredUpload(path=path, size=size, sha256=sha256)
@@ -1,45 +1,290 @@
 import asyncio
-import json
-from typing import Dict, Set
+import logging
+import os
+from contextlib import suppress
+from typing import Awaitable, Callable, Dict, Set
 
 from fastapi import WebSocket
 
+from app.utils.frames import encode_frame
+
+logger = logging.getLogger(__name__)
+
+# e.g. WS_BACKPLANE_URL="redis://localhost:6379/0"; empty = single-process (in-memory) fan-out
+WS_BACKPLANE_URL = os.getenv("WS_BACKPLANE_URL", "")
+WS_BACKPLANE_CHANNEL = os.getenv("WS_BACKPLANE_CHANNEL", "syncbridge:ws")
+# Max frames buffered per socket before it is treated as a slow consumer
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# 1008 = policy violation, sent to clients evicted for not keeping up
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+DeliverFn = Callable[[str, bytes], Awaitable[None]]
+
+
+# ============================================================
+# Backplanes: how a broadcast reaches every worker's local rooms
+# ============================================================
+class Backplane:
+    """Transport between the ConnectionManager instances of all workers.
+
+    ``publish`` is called once per broadcast with the pre-encoded frame; the
+    backplane must invoke the ``deliver(room, frame)`` callback given to ``start`` exactly once in every
+    process that is subscribed (including the publishing one).
+    """
+
+    async def start(self, deliver: DeliverFn) -> None:
+        raise NotImplementedError
+
+    async def publish(self, room: str, frame: bytes) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        return None
+
+
+class InProcessBackplane(Backplane):
+    """Default backplane: delivers straight to the local rooms (single worker)."""
 
-class ConnectionManager:
     def __init__(self):
+        self._deliver: DeliverFn | None = None
+
+    async def start(self, deliver: DeliverFn) -> None:
+        self._deliver = deliver
+
+    async def publish(self, room: str, frame: bytes) -> None:
+        if self._deliver is not None:
+            await self._deliver(room, frame)
+
+
+class BrokerBackplane(Backplane):
+    """Pub/sub broker backplane (redis.asyncio compatible client).
+
+    The client needs ``publish(channel, data)`` and ``pubsub()`` returning an
+    object with ``subscribe(channel)``, ``listen()`` and ``unsubscribe(channel)``.
+    Every worker subscribes to one channel; each event is the room key, a
+    newline, then the frame bytes as-is (no second JSON encoding). If the
+    subscription fails or ends (broker restart, dropped connection), the
+    listener logs it and subscribes again with exponential backoff; events
+    published while it was down are not replayed.
+    """
+
+    def __init__(self, client, channel: str = WS_BACKPLANE_CHANNEL, retry_base: float = 0.5, retry_max: float = 30.0):
+        self.client = client
+        self.channel = channel
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.resubscribes = 0
+        self._pubsub = None
+        self._listener: asyncio.Task | None = None
+
+    async def start(self, deliver: DeliverFn) -> None:
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen(deliver))
+
+    async def _listen(self, deliver: DeliverFn) -> None:
+        delay = self.retry_base
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self.client.pubsub()
+                    await self._pubsub.subscribe(self.channel)
+                    self.resubscribes += 1
+                    logger.info("Backplane channel %s subscribed again", self.channel)
+                async for item in self._pubsub.listen():
+                    delay = self.retry_base
+                    await self._handle(deliver, item)
+                raise ConnectionError("subscription ended")
+            except Exception:
+                logger.exception("Backplane subscription to %s lost; retrying in %.1fs", self.channel, delay)
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    with suppress(Exception):
+                        await pubsub.unsubscribe(self.channel)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+
+    async def _handle(self, deliver: DeliverFn, item: dict) -> None:
+        if item.get("type") != "message":
+            return
+        data = item.get("data")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        try:
+            room, frame = bytes(data).split(b"\n", 1)
+            await deliver(room.decode("utf-8"), frame)
+        except Exception:
+            # One bad envelope must not kill the subscription
+            logger.exception("Dropping malformed backplane message")
+
+    async def publish(self, room: str, frame: bytes) -> None:
+        await self.client.publish(self.channel, room.encode("utf-8") + b"\n" + frame)
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+        if self._pubsub is not None:
+            with suppress(Exception):
+                await self._pubsub.unsubscribe(self.channel)
+            self._pubsub = None
+
+
+def create_backplane(url: str = WS_BACKPLANE_URL) -> Backplane:
+    if not url:
+        return InProcessBackplane()
+    if url.startswith(("redis://", "rediss://")):
+        # Optional dependency: only needed for multi-worker deployments
+        import redis.asyncio as redis_asyncio
+
+        return BrokerBackplane(redis_asyncio.from_url(url))
+    raise RuntimeError(f"Unsupported WS_BACKPLANE_URL scheme: {url}")
+
+
+# ============================================================
+# Per-connection writer: bounded queue drained by one task
+# ============================================================
+class _ConnectionWriter:
+    def __init__(self, websocket: WebSocket, maxsize: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=maxsize)
+        self.task = asyncio.create_task(self._drain())
+        self.sent = 0
+        self.errors = 0
+
+    def enqueue(self, text: str) -> bool:
+        """Non-blocking; returns False when the socket's queue is full."""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _drain(self):
+        while True:
+            text = await self.queue.get()
+            try:
+                await self.websocket.send_text(text)
+                self.sent += 1
+            except Exception:
+                # Socket is gone; the endpoint's receive loop handles cleanup.
+                self.errors += 1
+                return
+
+    def close(self):
+        self.task.cancel()
+
+
+# ============================================================
+# Connection manager (one per worker process)
+# ============================================================
+class ConnectionManager:
+    def __init__(self, backplane: Backplane | None = None, queue_size: int = WS_SEND_QUEUE_SIZE):
         self.rooms: Dict[str, Set[WebSocket]] = {}
+        self.writers: Dict[WebSocket, _ConnectionWriter] = {}
         self.lock = asyncio.Lock()
+        self.backplane = backplane or InProcessBackplane()
+        self.queue_size = queue_size
+        self.metrics = {
+            "frames_enqueued": 0,
+            "frames_sent": 0,
+            "send_errors": 0,
+            "slow_consumer_evictions": 0,
+        }
+        self._started = False
+
+    async def start(self):
+        """Subscribe this worker to the backplane (idempotent)."""
+        if self._started:
+            return
+        self._started = True
+        await self.backplane.start(self._deliver_local)
+
+    async def stop(self):
+        if self._started:
+            self._started = False
+            await self.backplane.stop()
 
     async def connect(self, room: str, websocket: WebSocket):
+        # A worker only needs the backplane once it holds local sockets
+        await self.start()
         async with self.lock:
             if room not in self.rooms:
                 self.rooms[room] = set()
             self.rooms[room].add(websocket)
+            if websocket not in self.writers:
+                self.writers[websocket] = _ConnectionWriter(websocket, self.queue_size)
 
     async def disconnect(self, room: str, websocket: WebSocket):
         async with self.lock:
-            if room in self.rooms and websocket in self.rooms[room]:
-                self.rooms[room].remove(websocket)
-                if not self.rooms[room]:
-                    del self.rooms[room]
+            self._remove(room, websocket)
+
+    def _remove(self, room: str, websocket: WebSocket):
+        if room in self.rooms and websocket in self.rooms[room]:
+            self.rooms[room].remove(websocket)
+            if not self.rooms[room]:
+                del self.rooms[room]
+        writer = self.writers.pop(websocket, None)
+        if writer:
+            self.metrics["frames_sent"] += writer.sent
+            self.metrics["send_errors"] += writer.errors
+            writer.close()
 
     async def broadcast(self, room: str, message: dict):
-        text = json.dumps(message, default=str)
+        """Publish once; every subscribed worker delivers to its local room members."""
+        await self.backplane.publish(room, encode_frame(message))
+
+    async def _deliver_local(self, room: str, frame: bytes):
+        # Enqueue-only: never awaits a socket, so one stalled client cannot
+        # hold up the broadcast (or the HTTP request that triggered it).
+        # Decoded once per worker; every queue holds the same str object.
+        text = frame.decode("utf-8")
         async with self.lock:
-            recipients = list(self.rooms.get(room, set()))
-        coros = [self._safe_send(ws, text) for ws in recipients]
-        if coros:
-            await asyncio.gather(*coros, return_exceptions=True)
+            for ws in list(self.rooms.get(room, ())):
+                writer = self.writers.get(ws)
+                if writer is None:
+                    continue
+                if writer.enqueue(text):
+                    self.metrics["frames_enqueued"] += 1
+                else:
+                    self._evict(room, ws)
 
-    async def _safe_send(self, websocket: WebSocket, text: str):
+    def _evict(self, room: str, websocket: WebSocket):
+        self.metrics["slow_consumer_evictions"] += 1
+        self._remove(room, websocket)
+        asyncio.create_task(self._close(websocket, SLOW_CONSUMER_CLOSE_CODE))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
         try:
-            await websocket.send_text(text)
+            await websocket.close(code=code)
         except Exception:
-            # Ignore transient send errors; cleanup happens on disconnect.
             pass
 
     async def send_to(self, websocket: WebSocket, message: dict):
-        await self._safe_send(websocket, json.dumps(message, default=str))
+        text = encode_frame(message).decode("utf-8")
+        writer = self.writers.get(websocket)
+        if writer is None:
+            try:
+                await websocket.send_text(text)
+            except Exception:
+                # Ignore transient send errors; cleanup happens on disconnect.
+                pass
+        elif writer.enqueue(text):
+            self.metrics["frames_enqueued"] += 1
+
+    def stats(self) -> dict:
+        live = list(self.writers.values())
+        return {
+            **self.metrics,
+            "frames_sent": self.metrics["frames_sent"] + sum(w.sent for w in live),
+            "send_errors": self.metrics["send_errors"] + sum(w.errors for w in live),
+            "connections": len(live),
+            "rooms": len(self.rooms),
+            "queued_frames": sum(w.queue.qsize() for w in live),
+        }
 
 
-manager = ConnectionManager()
+manager = ConnectionManager(create_backplane())
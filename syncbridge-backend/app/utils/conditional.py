@@ -0,0 +1,52 @@
+"""
+HTTP validators for immutable downloads (RFC 9110 section 13).
+
+Attachments never change once stored, so a strong ETag is simply their
+content hash and Last-Modified is when the row was created. Both are known
+from the database row, which lets a conditional GET be answered with 304
+before the file system is touched.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from starlette.datastructures import Headers
+
+
+def strong_etag(content_hash: str) -> str:
+    return f'"{content_hash}"'
+
+
+def http_date(value: datetime) -> str:
+    """Format a naive-UTC (as stored) or aware datetime as an IMF-fixdate."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def is_not_modified(headers: Headers, etag: str, last_modified: datetime | None) -> bool:
+    """True when the request's validators say the client's copy is current."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # when present, If-None-Match takes precedence over If-Modified-Since
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return last_modified.replace(microsecond=0) <= since
@@ -0,0 +1,25 @@
+"""
+Content-Disposition for downloads (RFC 6266).
+
+User file names go into a header (and, for presigned object-store URLs, into
+a signed query parameter), so they are never pasted in raw: the name is
+sent as RFC 5987 ``filename*`` (UTF-8, percent-encoded) with a plain ASCII
+``filename`` fallback for old clients, stripped of quotes, backslashes and
+control characters.
+"""
+import unicodedata
+from urllib.parse import quote
+
+
+def _ascii_fallback(filename: str) -> str:
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode()
+    cleaned = "".join("_" if c in '"\\' or ord(c) < 0x20 or ord(c) == 0x7F else c for c in ascii_name).strip()
+    return cleaned or "download"
+
+
+def attachment_disposition(filename: str) -> str:
+    fallback = _ascii_fallback(filename)
+    quoted = quote(filename, safe="")
+    if quoted == filename and fallback == filename:
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quoted}"
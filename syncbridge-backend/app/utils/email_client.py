@@ -4,16 +4,21 @@ import resend
 SENDER_EMAIL = os.getenv("RESEND_SENDER_EMAIL", "bridge-no-reply@icu.584743.xyz")
 
 
-def send_email(to: list[str], subject: str, html: str):
+def send_email(to: list[str], subject: str, html: str, idempotency_key: str | None = None):
     if not to:
         return
     api_key = os.getenv("RESEND_API_KEY")
     if not api_key:
         raise RuntimeError("RESEND_API_KEY not configured")
     resend.api_key = api_key
-    resend.Emails.send({
+    params = {
         "from": SENDER_EMAIL,
         "to": to,
         "subject": subject,
         "html": html,
-    })
+    }
+    if idempotency_key:
+        # Resend drops a repeat of the same key (24h), so a retried send is delivered once
+        resend.Emails.send(params, {"idempotency_key": idempotency_key})
+    else:
+        resend.Emails.send(params)
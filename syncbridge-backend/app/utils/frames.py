@@ -0,0 +1,21 @@
+"""
+WebSocket frame encoding.
+
+Each event is serialized exactly once into bytes; every recipient (and the
+backplane) shares that buffer. orjson is used when installed, otherwise the
+stdlib encoder with compact separators. Both render datetimes via ``str()``
+so the wire format does not depend on which encoder is active.
+"""
+import json
+from typing import Any
+
+try:  # optional fast path
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+
+def encode_frame(message: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(message, default=str, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(message, default=str, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
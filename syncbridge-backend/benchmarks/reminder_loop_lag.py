@@ -0,0 +1,109 @@
+"""
+Benchmark: event-loop lag during a reminder burst.
+
+Seeds N overdue urgent blocks and runs one urgent scan plus delivery on the
+event loop while a LoopLagMonitor samples the loop, first the old way (the
+sync scan and every send_email called directly from the coroutine), then
+through reminders.scan_due_async and the outbox dispatcher (DB threads +
+bounded send pool). send_email is replaced by a blocking sleep of
+BENCH_SEND_LATENCY seconds, standing in for the HTTP call to the email
+provider. Uses a throwaway file-backed SQLite database.
+
+    python -m benchmarks.reminder_loop_lag [blocks]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="bench-reminders-"), "bench.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_PATH}"
+
+from app.core.database import SessionLocal, engine  # noqa: E402
+from app.models import Block, EmailOutbox, Form, User  # noqa: E402
+from app.models.base import Base  # noqa: E402
+from app.services import background, outbox, reminders  # noqa: E402
+from app.services.loop_monitor import LoopLagMonitor  # noqa: E402
+
+SEND_LATENCY = float(os.getenv("BENCH_SEND_LATENCY", "0.05"))
+
+
+def _seed(n: int) -> None:
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", password_hash="x", display_name="Bench", role="client", is_active=1)
+        db.add(user)
+        db.flush()
+        form = Form(type="mainform", user_id=user.id, created_by=user.id, title="Bench", message="m",
+                    budget="b", expected_time="t", status="processing")
+        db.add(form)
+        db.flush()
+        idle_since = datetime.utcnow() - timedelta(hours=1)
+        db.add_all(
+            Block(form_id=form.id, status="urgent", type="function", target_id=i,
+                  last_message_at=idle_since, reminder_sent=0)
+            for i in range(n)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _blocking_send(recipients, subject, html, idempotency_key=None):
+    time.sleep(SEND_LATENCY)
+
+
+async def _inline_scan() -> None:
+    db = SessionLocal()
+    try:
+        # the old scan: every page read and queued on the event loop's thread
+        deadline = datetime.utcnow() - reminders.THRESHOLDS["urgent"]
+        after = None
+        while page := reminders._fetch_due_page(db, "urgent", deadline, after, reminders.REMINDER_PAGE_SIZE):
+            reminders._enqueue(db, page, deadline)
+            after = (page[-1].last_message_at, page[-1].block_id)
+        # the old loop: one blocking send after another, on the event loop
+        for row in db.query(EmailOutbox).filter(EmailOutbox.status == "pending"):
+            _blocking_send(row.recipients, row.subject, row.html)
+    finally:
+        db.close()
+
+
+async def _offloop_scan() -> None:
+    await reminders.scan_due_async("urgent", datetime.utcnow() - reminders.THRESHOLDS["urgent"])
+    await outbox.dispatcher.drain()
+
+
+async def _measure(scan) -> tuple[float, dict]:
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await scan()
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    return elapsed, monitor.snapshot()
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    outbox.send_email = _blocking_send
+    print(f"{n} due blocks, {SEND_LATENCY * 1000:.0f}ms per send, "
+          f"send concurrency {outbox.dispatcher.concurrency}")
+    for name, scan in (("inline", _inline_scan), ("off-loop", _offloop_scan)):
+        _seed(n)
+        elapsed, lag = asyncio.run(_measure(scan))
+        print(f"{name:>9}: scan {elapsed:6.2f}s  loop lag p50 {lag['p50_ms']:8.1f}ms  "
+              f"p99 {lag['p99_ms']:8.1f}ms  max {lag['max_ms']:8.1f}ms")
+    outbox.dispatcher.shutdown()
+    background.shutdown()
+
+
+if __name__ == "__main__":
+    main()
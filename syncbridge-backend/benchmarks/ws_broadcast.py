@@ -0,0 +1,95 @@
+"""
+Micro-benchmark: per-recipient cost of a room broadcast.
+
+Compares the old path (json.dumps per broadcast, one awaited send coroutine
+per recipient via gather) against the current ConnectionManager (one encode, enqueue per recipient,
+writer tasks drain). Sockets are in-memory fakes, so the numbers isolate
+the manager's own overhead.
+
+    python -m benchmarks.ws_broadcast [recipients] [broadcasts]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from app.services.websocket_manager import ConnectionManager  # noqa: E402
+from app.utils import frames  # noqa: E402
+
+
+class _Socket:
+    __slots__ = ("received",)
+
+    def __init__(self):
+        self.received = 0
+
+    async def send_text(self, text):
+        self.received += 1
+
+
+def _event(i: int) -> dict:
+    return {
+        "type": "message",
+        "action": "create",
+        "message": {
+            "id": i,
+            "block_id": 1,
+            "user_id": 7,
+            "text_content": "Could we move the delivery milestone to next Friday? " * 3,
+            "created_at": datetime.utcnow(),
+        },
+    }
+
+
+async def _legacy(sockets, n):
+    async def send(ws, text):
+        try:
+            await ws.send_text(text)
+        except Exception:
+            pass
+
+    start = time.perf_counter()
+    for i in range(n):
+        text = json.dumps(_event(i), default=str)
+        await asyncio.gather(*(send(ws, text) for ws in sockets), return_exceptions=True)
+    return time.perf_counter() - start, 0.0
+
+
+async def _current(sockets, n):
+    mgr = ConnectionManager(queue_size=n + 1)
+    for ws in sockets:
+        await mgr.connect("room", ws)
+    start = time.perf_counter()
+    for i in range(n):
+        await mgr.broadcast("room", _event(i))
+    enqueued = time.perf_counter() - start
+    while any(ws.received < n for ws in sockets):
+        await asyncio.sleep(0)
+    total = time.perf_counter() - start
+    for ws in sockets:
+        await mgr.disconnect("room", ws)
+    return total, enqueued
+
+
+def main():
+    recipients = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    broadcasts = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    encoder = "orjson" if frames.orjson is not None else "json"
+    print(f"{recipients} sockets x {broadcasts} broadcasts (encoder: {encoder})")
+    for name, fn in (("legacy   ", _legacy), ("current  ", _current)):
+        sockets = [_Socket() for _ in range(recipients)]
+        total, enqueued = asyncio.run(fn(sockets, broadcasts))
+        per_recipient_us = total / (recipients * broadcasts) * 1e6
+        line = f"{name} total {total * 1000:8.1f} ms  per recipient {per_recipient_us:6.2f} us"
+        if enqueued:
+            line += f"  broadcast() returned after {enqueued / broadcasts * 1000:.2f} ms avg"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
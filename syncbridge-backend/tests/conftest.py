@@ -1,11 +1,13 @@
 import os
+import tempfile
 from datetime import datetime, timedelta
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
 # Ensure required env vars exist before importing app modules (override to avoid stale values)
 os.environ["SECRET_KEY"] = "test-secret-key"
@@ -13,20 +15,28 @@ os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 os.environ["AUDIT_ENABLED"] = "false"
 os.environ["JWT_ALGORITHM"] = "HS256"
 os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "60"
+os.environ["PREVIEW_WORKERS"] = "0"  # render previews inline: deterministic, no process pool
 
-from app.api.v1.deps import get_db
+from app.api.v1.deps import get_async_db, get_db
 from app.main import app
 from app.models import License, User
 from app.models.base import Base
+from app.repositories.blocks import block_ids
+from app.services.access import form_access_cache
+from app.services.deadlines import deadlines
+from app.services.identity_cache import identity_cache
 from app.utils import get_password_hash
 
-# In-memory SQLite shared across threads for tests
+# File-backed SQLite so the sync (pysqlite) and async (aiosqlite) engines see the same data
+_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="syncbridge-tests-"), "test.db")
 engine = create_engine(
-    "sqlite:///:memory:",
+    f"sqlite:///{_DB_PATH}",
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
+    poolclass=NullPool,
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{_DB_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 
 def override_get_db():
@@ -37,15 +47,26 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 # Disable background reminder loops for tests
 app.router.on_startup.clear()
 app.router.on_shutdown.clear()
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 
 @pytest.fixture(autouse=True)
 def setup_database():
     """Recreate all tables before each test for isolation."""
+    # ids are reused across tests, so per-process caches must start empty
+    identity_cache.clear()
+    form_access_cache.clear()
+    block_ids.clear()
+    deadlines.clear()
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
     yield
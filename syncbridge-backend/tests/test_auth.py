@@ -1,8 +1,13 @@
 from datetime import datetime, timedelta
 
 import pytest
+from sqlalchemy import event
 
-from tests.conftest import create_license, create_user
+from app.models import User
+from app.repositories import licenses as license_repo
+from app.services.identity_cache import IdentityCache, identity_cache
+from app.utils import decode_token
+from tests.conftest import create_license, create_user, engine
 
 
 AUTH_BASE = "/api/v1/auth"
@@ -291,3 +296,69 @@ def test_reactivate_license_not_unused(client, db_session):
     assert resp.status_code == 403
     detail = resp.json()["detail"]
     assert detail["code"] == "FORBIDDEN"
+
+
+# ---------- Identity cache ----------
+
+def _login_token(client, db_session, email, key):
+    user = create_user(db_session, email=email, password="StrongPass123", role="client", is_active=1)
+    create_license(db_session, key=key, role="client", status="active", user=user)
+    resp = client.post(f"{AUTH_BASE}/login", json={"email": email, "password": "StrongPass123"})
+    return user, resp.json()["data"]["access_token"]
+
+
+def test_me_reuses_cached_principal(client, db_session):
+    _, token = _login_token(client, db_session, "cache@example.com", "LIC-CACHE")
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        for _ in range(3):
+            resp = client.get(f"{AUTH_BASE}/me", headers={"Authorization": f"Bearer {token}"})
+            assert resp.status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+    assert len([s for s in statements if "FROM users" in s]) == 1
+
+
+def test_identity_cache_invalidated_on_user_change(client, db_session):
+    user, token = _login_token(client, db_session, "cache2@example.com", "LIC-CACHE2")
+    headers = {"Authorization": f"Bearer {token}"}
+    iat = decode_token(token)["iat"]
+    assert client.get(f"{AUTH_BASE}/me", headers=headers).json()["data"]["role"] == "client"
+    assert identity_cache.get(user.id, iat) is not None
+
+    # license activation changes the role: a token issued before still resolves to the new state
+    create_license(db_session, key="LIC-CACHE2-DEV", role="developer", status="unused")
+    resp = client.post(
+        f"{AUTH_BASE}/reactivate",
+        json={"email": "cache2@example.com", "password": "StrongPass123", "license_key": "LIC-CACHE2-DEV"},
+    )
+    assert resp.status_code == 200
+    assert client.get(f"{AUTH_BASE}/me", headers=headers).json()["data"]["role"] == "developer"
+
+    # a login that finds the license expired deactivates the user
+    lic = license_repo.get_by_user(db_session, user.id)
+    lic.expires_at = datetime.utcnow() - timedelta(days=1)
+    db_session.commit()
+    assert identity_cache.get(user.id, iat).is_active == 1
+    resp = client.post(f"{AUTH_BASE}/login", json={"email": "cache2@example.com", "password": "StrongPass123"})
+    assert resp.status_code == 403
+    assert identity_cache.get(user.id, iat) is None
+    assert client.get(f"{AUTH_BASE}/me", headers=headers).status_code == 200
+    assert identity_cache.get(user.id, iat).is_active == 0
+
+
+def test_identity_cache_ttl_and_lru():
+    now = [0.0]
+    cache = IdentityCache(ttl=10, max_entries=2, clock=lambda: now[0])
+    for uid in (1, 2, 3):
+        cache.put(uid, 100, User(id=uid, email=f"u{uid}@example.com", role="client", is_active=1))
+    assert cache.get(1, 100) is None  # evicted (LRU)
+    assert cache.get(3, 100).email == "u3@example.com"
+    assert cache.get(3, 101) is None  # other token
+    now[0] = 11
+    assert cache.get(3, 100) is None  # expired
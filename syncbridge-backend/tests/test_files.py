@@ -1,7 +1,21 @@
+import hashlib
+import io
 import os
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime, timezone
 
+import pytest
+from sqlalchemy import event
+
+from app.api.v1 import files as files_api
 from app.repositories import forms as form_repo, files as file_repo
-from tests.conftest import create_user, create_license
+from app.models import Message
+from app.services import archives, previews, storage, storage_gc
+from app.services.access import form_access_cache, resolve_form
+from app.services.uploads import UPLOAD_CHUNK_SIZE, UploadTooLarge
+from tests.conftest import create_user, create_license, engine
 
 AUTH_BASE = "/api/v1/auth"
 API_BASE = "/api/v1"
@@ -73,6 +87,8 @@ def test_upload_and_get_file_success(client, db_session):
     )
     assert del_resp.status_code == 200
     assert file_repo.get_by_id(db_session, file_id) is None
+    # the blob is freed by storage_gc, not inline
+    storage_gc.reconcile(db_session, [storage.get_local_storage()], delete=True, grace_seconds=0, pause=0)
     assert not os.path.exists(rec.storage_path)
 
 
@@ -143,6 +159,8 @@ def test_delete_file_only_sender(client, db_session):
     )
     assert resp_ok.status_code == 200
     assert file_repo.get_by_id(db_session, file_id) is None
+    # the blob is freed by storage_gc, not inline
+    storage_gc.reconcile(db_session, [storage.get_local_storage()], delete=True, grace_seconds=0, pause=0)
     assert not os.path.exists(rec.storage_path)
 
 
@@ -168,3 +186,558 @@ def test_upload_file_message_not_found_and_too_large(client, db_session):
         headers={"Authorization": f"Bearer {owner_token}"},
     )
     assert resp_too_large.status_code == 400
+
+
+def test_get_file_authorizes_in_one_query(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner6@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    message_id = _post_message(client, owner_token, form.id, text="one query")
+    headers = {"Authorization": f"Bearer {owner_token}"}
+    file_id = client.post(
+        f"{API_BASE}/file",
+        params={"message_id": message_id},
+        files={"file": ("q.txt", b"q", "text/plain")},
+        headers=headers,
+    ).json()["data"]["file_id"]
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        resp = client.get(f"{API_BASE}/file/{file_id}", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+    assert resp.status_code == 200
+    assert len(statements) == 1  # principal is cached; file -> message -> block -> form is one join
+
+    client.delete(f"{API_BASE}/file/{file_id}", headers=headers)
+
+
+def test_form_access_cache_invalidated_on_form_change(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner7@example.com", "client")
+    dev, _ = _make_user_with_token(client, db_session, "file-dev7@example.com", "developer")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=dev.id)
+
+    assert resolve_form(db_session, form.id).developer_id == dev.id
+    assert form_access_cache.get(form.id) is not None
+
+    form_repo.update_form(db_session, form, {"developer_id": None})
+    assert form_access_cache.get(form.id) is None
+    assert resolve_form(db_session, form.id).developer_id is None
+
+
+class _ZeroStream:
+    """File-like source producing ``size`` bytes without ever holding them."""
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def read(self, n=-1):
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        self.remaining -= n
+        return b"\0" * n
+
+
+def test_put_stream_memory_bounded_by_chunk_size(tmp_path):
+    local = storage.LocalStorage(str(tmp_path))
+    tracemalloc.start()
+    try:
+        stored = local.put_stream(_ZeroStream(8 * 1024 * 1024), 16 * 1024 * 1024)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert stored.size == 8 * 1024 * 1024
+    assert stored.sha256 == hashlib.sha256(b"\0" * stored.size).hexdigest()
+    assert os.path.getsize(stored.path) == stored.size
+    assert peak < 4 * UPLOAD_CHUNK_SIZE
+
+
+def test_put_stream_aborts_past_limit(tmp_path):
+    local = storage.LocalStorage(str(tmp_path))
+    src = _ZeroStream(10 * 1024 * 1024)
+    with pytest.raises(UploadTooLarge):
+        local.put_stream(src, 1024 * 1024)
+    # stopped right after crossing the limit, and nothing is left on disk
+    assert src.remaining == 10 * 1024 * 1024 - (1024 * 1024 + UPLOAD_CHUNK_SIZE)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_identical_uploads_share_one_blob(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner8@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    headers = {"Authorization": f"Bearer {owner_token}"}
+    content = b"%PDF-1.4 shared spec " + os.urandom(16)
+
+    file_ids = []
+    for i in range(2):
+        message_id = _post_message(client, owner_token, form.id, text=f"spec {i}")
+        resp = client.post(
+            f"{API_BASE}/file",
+            params={"message_id": message_id},
+            files={"file": (f"spec{i}.pdf", content, "application/pdf")},
+            headers=headers,
+        )
+        assert resp.status_code == 200
+        file_ids.append(resp.json()["data"]["file_id"])
+
+    first, second = (file_repo.get_by_id(db_session, fid) for fid in file_ids)
+    digest = hashlib.sha256(content).hexdigest()
+    assert first.content_hash == second.content_hash == digest
+    assert first.storage_path == second.storage_path
+    assert first.storage_path.endswith(os.path.join(digest[:2], digest[2:4], digest))
+    blob = first.storage_path
+
+    # still referenced by the second row -> kept
+    assert client.delete(f"{API_BASE}/file/{file_ids[0]}", headers=headers).status_code == 200
+    assert os.path.exists(blob)
+    assert client.get(f"{API_BASE}/file/{file_ids[1]}", headers=headers).content == content
+
+    # last reference: the blob is left to storage_gc (a concurrent upload of the same content may reuse it)
+    assert client.delete(f"{API_BASE}/file/{file_ids[1]}", headers=headers).status_code == 200
+    assert os.path.exists(blob)
+    storage_gc.reconcile(db_session, [storage.get_local_storage()], delete=True, grace_seconds=0, pause=0)
+    assert not os.path.exists(blob)
+
+
+def test_get_file_validators_and_ranges(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner9@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    message_id = _post_message(client, owner_token, form.id, text="ranges")
+    headers = {"Authorization": f"Bearer {owner_token}"}
+    content = b"0123456789" * 10 + os.urandom(8)
+    file_id = client.post(
+        f"{API_BASE}/file",
+        params={"message_id": message_id},
+        files={"file": ("r.bin", content, "application/octet-stream")},
+        headers=headers,
+    ).json()["data"]["file_id"]
+    url = f"{API_BASE}/file/{file_id}"
+
+    full = client.get(url, headers=headers)
+    assert full.status_code == 200
+    etag = full.headers["etag"]
+    assert etag == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert full.headers["accept-ranges"] == "bytes"
+    last_modified = full.headers["last-modified"]
+
+    part = client.get(url, headers={**headers, "Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.content == content[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(content)}"
+
+    resumed = client.get(url, headers={**headers, "Range": "bytes=100-", "If-Range": etag})
+    assert resumed.status_code == 206 and resumed.content == content[100:]
+    stale = client.get(url, headers={**headers, "Range": "bytes=100-", "If-Range": '"other"'})
+    assert stale.status_code == 200 and stale.content == content
+
+    # 304s are answered from the row alone, even with the blob gone from disk
+    blob = file_repo.get_by_id(db_session, file_id).storage_path
+    os.remove(blob)
+    for validators in ({"If-None-Match": etag}, {"If-None-Match": f'"x", W/{etag}'}, {"If-Modified-Since": last_modified}):
+        resp = client.get(url, headers={**headers, **validators})
+        assert resp.status_code == 304
+        assert resp.content == b""
+        assert resp.headers["etag"] == etag
+    assert client.get(url, headers={**headers, "If-None-Match": '"other"'}).status_code == 404
+
+    client.delete(url, headers=headers)
+
+
+class _NotFound(Exception):
+    def __init__(self):
+        super().__init__("Not Found")
+        self.response = {"Error": {"Code": "404"}}
+
+
+class _Body:
+    def __init__(self, data):
+        self._buf = io.BytesIO(data)
+
+    def read(self, n=-1):
+        return self._buf.read(n)
+
+    def close(self):
+        pass
+
+
+class _FakeS3:
+    """In-memory stand-in for the subset of the boto3 S3 client the backend uses."""
+
+    def __init__(self):
+        self.objects = {}
+        self.modified = {}
+        self.uploads = 0
+
+    def _stored(self, bucket, key, data):
+        self.objects[(bucket, key)] = data
+        self.modified[(bucket, key)] = datetime.now(timezone.utc)
+
+    def upload_file(self, filename, bucket, key):
+        self.uploads += 1
+        with open(filename, "rb") as f:
+            self._stored(bucket, key, f.read())
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective):
+        source = (CopySource["Bucket"], CopySource["Key"])
+        if source not in self.objects:
+            raise _NotFound()
+        self._stored(Bucket, Key, self.objects[source])
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise _NotFound()
+        return {"ContentLength": len(self.objects[(Bucket, Key)]), "LastModified": self.modified[(Bucket, Key)]}
+
+    def get_object(self, Bucket, Key):
+        return {"Body": _Body(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+        self.modified.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, op, Params, ExpiresIn):
+        self.presigned = Params
+        return f"https://s3.example.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+    def get_paginator(self, name):
+        return _FakePaginator(self)
+
+
+class _FakePaginator:
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def paginate(self, Bucket, Prefix):
+        yield {
+            "Contents": [
+                {"Key": key, "Size": len(data), "LastModified": self.s3.modified[(bucket, key)]}
+                for (bucket, key), data in list(self.s3.objects.items())
+                if bucket == Bucket and key.startswith(Prefix)
+            ]
+        }
+
+
+def test_s3_backend_upload_redirect_stream_delete(client, db_session, monkeypatch, tmp_path):
+    s3 = _FakeS3()
+    monkeypatch.setattr(storage, "_s3", storage.S3Storage(s3, "bucket", spool_dir=str(tmp_path)))
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "s3")
+
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner10@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    headers = {"Authorization": f"Bearer {owner_token}"}
+    content = b"object store " + os.urandom(16)
+    digest = hashlib.sha256(content).hexdigest()
+    key = f"attachments/{digest[:2]}/{digest[2:4]}/{digest}"
+
+    file_ids = []
+    for i in range(2):
+        message_id = _post_message(client, owner_token, form.id, text=f"s3 {i}")
+        resp = client.post(
+            f"{API_BASE}/file",
+            params={"message_id": message_id},
+            files={"file": ("s3.bin", content, "application/octet-stream")},
+            headers=headers,
+        )
+        assert resp.status_code == 200
+        file_ids.append(resp.json()["data"]["file_id"])
+    assert s3.objects == {("bucket", key): content}
+    assert s3.uploads == 1  # identical content uploaded once
+    assert list(tmp_path.iterdir()) == []  # spool file cleaned up
+    assert file_repo.get_by_id(db_session, file_ids[0]).storage_path == f"s3://bucket/{key}"
+
+    url = f"{API_BASE}/file/{file_ids[0]}"
+    redirect = client.get(url, headers=headers, follow_redirects=False)
+    assert redirect.status_code == 307
+    assert redirect.headers["location"].startswith(f"https://s3.example.test/bucket/{key}")
+
+    monkeypatch.setattr(files_api, "STORAGE_REDIRECT_DOWNLOADS", False)
+    streamed = client.get(url, headers=headers)
+    assert streamed.status_code == 200
+    assert streamed.content == content
+    assert streamed.headers["etag"] == f'"{digest}"'
+    assert 'filename="s3.bin"' in streamed.headers["content-disposition"]
+
+    client.delete(url, headers=headers)
+    client.delete(f"{API_BASE}/file/{file_ids[1]}", headers=headers)
+    assert ("bucket", key) in s3.objects
+    storage_gc.reconcile(db_session, [storage._s3], delete=True, grace_seconds=0, pause=0)
+    assert s3.objects == {}
+
+
+@pytest.mark.parametrize(
+    "filename, expected",
+    [
+        ("report.pdf", 'attachment; filename="report.pdf"'),
+        ('a"b\r\nX-Evil: 1.txt', "attachment; filename=\"a_b__X-Evil: 1.txt\"; filename*=UTF-8''a%22b%0D%0AX-Evil%3A%201.txt"),
+        ("需求 résumé.pdf", "attachment; filename=\"resume.pdf\"; filename*=UTF-8''%E9%9C%80%E6%B1%82%20r%C3%A9sum%C3%A9.pdf"),
+    ],
+)
+def test_presigned_url_content_disposition(tmp_path, filename, expected):
+    s3 = _FakeS3()
+    backend = storage.S3Storage(s3, "bucket", spool_dir=str(tmp_path))
+    backend.presigned_url("s3://bucket/attachments/ab/cd/abcd", filename, "application/pdf")
+    disposition = s3.presigned["ResponseContentDisposition"]
+    assert disposition == expected
+    assert "\r" not in disposition and "\n" not in disposition
+
+
+def _upload(client, headers, message_id, name, content, content_type):
+    resp = client.post(
+        f"{API_BASE}/file",
+        params={"message_id": message_id},
+        files={"file": (name, content, content_type)},
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    return resp.json()["data"]["file_id"]
+
+
+def test_text_preview_generated_and_regenerated(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner11@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    message_id = _post_message(client, owner_token, form.id, text="notes")
+    headers = {"Authorization": f"Bearer {owner_token}"}
+    content = ("héllo " * 1000 + os.urandom(4).hex()).encode()
+    file_id = _upload(client, headers, message_id, "notes.txt", content, "text/plain")
+
+    blob = file_repo.get_by_id(db_session, file_id).storage_path
+    preview_path = previews.preview_location(blob, previews.TEXT)
+    assert os.path.exists(preview_path)  # rendered after upload
+
+    resp = client.get(f"{API_BASE}/file/{file_id}/preview", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert resp.text == content.decode()[: previews.PREVIEW_TEXT_CHARS]
+    etag = resp.headers["etag"]
+    assert client.get(f"{API_BASE}/file/{file_id}/preview", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    # lost previews are rendered again on demand
+    os.remove(preview_path)
+    assert client.get(f"{API_BASE}/file/{file_id}/preview", headers=headers).status_code == 200
+    assert os.path.exists(preview_path)
+
+    client.delete(f"{API_BASE}/file/{file_id}", headers=headers)
+    storage_gc.reconcile(db_session, [storage.get_local_storage()], delete=True, grace_seconds=0, pause=0)
+    assert not os.path.exists(preview_path) and not os.path.exists(blob)
+
+
+def test_preview_skipped_for_large_source(client, db_session, monkeypatch):
+    monkeypatch.setattr(previews, "PREVIEW_MAX_SOURCE_BYTES", 1024)
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner16@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    message_id = _post_message(client, owner_token, form.id, text="big log")
+    headers = {"Authorization": f"Bearer {owner_token}"}
+    file_id = _upload(client, headers, message_id, "big.txt", b"x" * 2048 + os.urandom(4).hex().encode(), "text/plain")
+    rendered = previews.pipeline.metrics["generated"]
+
+    blob = file_repo.get_by_id(db_session, file_id).storage_path
+    # not rendered after upload, nor lazily on request
+    assert client.get(f"{API_BASE}/file/{file_id}/preview", headers=headers).status_code == 404
+    assert not os.path.exists(previews.preview_location(blob, previews.TEXT))
+    assert previews.pipeline.metrics["generated"] == rendered
+
+
+def test_image_and_pdf_previews(client, db_session):
+    Image = pytest.importorskip("PIL.Image")
+    pypdfium2 = pytest.importorskip("pypdfium2")
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner12@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    message_id = _post_message(client, owner_token, form.id, text="pictures")
+    headers = {"Authorization": f"Bearer {owner_token}"}
+
+    buf = io.BytesIO()
+    Image.new("RGB", (2000, 1000), (200, 30, 30)).save(buf, format="PNG")
+    image_id = _upload(client, headers, message_id, "big.png", buf.getvalue(), "image/png")
+
+    pdf = pypdfium2.PdfDocument.new()
+    pdf.new_page(612, 792)
+    buf = io.BytesIO()
+    pdf.save(buf)
+    pdf.close()
+    pdf_id = _upload(client, headers, message_id, "spec.pdf", buf.getvalue(), "application/pdf")
+
+    for file_id, expected in ((image_id, (512, 256)), (pdf_id, (396, 512))):
+        resp = client.get(f"{API_BASE}/file/{file_id}/preview", headers=headers)
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "image/webp"
+        with Image.open(io.BytesIO(resp.content)) as thumb:
+            assert thumb.size == expected
+        client.delete(f"{API_BASE}/file/{file_id}", headers=headers)
+
+
+def test_preview_unsupported_type(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner13@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    message_id = _post_message(client, owner_token, form.id, text="zip")
+    headers = {"Authorization": f"Bearer {owner_token}"}
+    file_id = _upload(client, headers, message_id, "a.zip", b"PK\x03\x04" + os.urandom(8), "application/zip")
+    assert client.get(f"{API_BASE}/file/{file_id}/preview", headers=headers).status_code == 404
+    client.delete(f"{API_BASE}/file/{file_id}", headers=headers)
+
+
+def test_preview_pipeline_process_pool(tmp_path):
+    local = storage.LocalStorage(str(tmp_path))
+    stored = local.put_stream(io.BytesIO(b"rendered in a worker process"), 1024)
+    pipeline = previews.PreviewPipeline(workers=1, timeout=60)
+    try:
+        # concurrent requests for the same preview share one render
+        pipeline.schedule(local, stored.path, stored.size, "text/plain", "txt")
+        assert pipeline.ensure(local, stored.path, previews.TEXT, stored.size)
+    finally:
+        pipeline.shutdown()
+    with open(previews.preview_location(stored.path, previews.TEXT), "rb") as f:
+        assert f.read() == b"rendered in a worker process"
+    assert pipeline.metrics["generated"] == 1
+
+
+def test_export_form_and_block_files_zip(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner14@example.com", "client")
+    other, other_token = _make_user_with_token(client, db_session, "file-other14@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    headers = {"Authorization": f"Bearer {owner_token}"}
+    general_msg = _post_message(client, owner_token, form.id, text="general")
+    fn_resp = client.post(
+        f"{API_BASE}/message",
+        json={"form_id": form.id, "function_id": 7, "text_content": "fn"},
+        headers=headers,
+    )
+    fn_msg = fn_resp.json()["data"]["message_id"]
+
+    a = b"spec v1 " + os.urandom(8)
+    b = b"spec v2 " + os.urandom(8)
+    c = os.urandom(64)
+    ids = [
+        _upload(client, headers, general_msg, "spec.txt", a, "text/plain"),
+        _upload(client, headers, general_msg, "spec.txt", b, "text/plain"),
+        _upload(client, headers, fn_msg, "../evil/diagram.png", c, "image/png"),
+    ]
+
+    resp = client.get(f"{API_BASE}/form/{form.id}/files.zip", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in zf.namelist()} == {
+            "general/spec.txt": a,
+            "general/spec (2).txt": b,
+            "function-7/diagram.png": c,
+        }
+        assert zf.getinfo("function-7/diagram.png").compress_type == zipfile.ZIP_STORED
+
+    block_id = db_session.query(Message).get(fn_msg).block_id
+    resp = client.get(f"{API_BASE}/block/{block_id}/files.zip", headers=headers)
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert zf.namelist() == ["function-7/diagram.png"]
+
+    forbidden = client.get(f"{API_BASE}/form/{form.id}/files.zip", headers={"Authorization": f"Bearer {other_token}"})
+    assert forbidden.status_code == 403
+
+    for file_id in ids:
+        client.delete(f"{API_BASE}/file/{file_id}", headers=headers)
+
+
+def test_stream_zip_memory_bounded(tmp_path):
+    local = storage.LocalStorage(str(tmp_path))
+    stored = local.put_stream(_ZeroStream(8 * 1024 * 1024), 16 * 1024 * 1024)
+    entries = [archives.ArchiveEntry(f"f{i}.bin", stored.path, stored.size) for i in range(2)]
+
+    tracemalloc.start()
+    try:
+        total = 0
+        pieces = 0
+        for piece in archives.stream_zip(entries):
+            total += len(piece)
+            pieces += 1
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert pieces > 2
+    assert peak < 1024 * 1024  # two 8 MiB members, never buffered whole
+    assert total > 0
+
+
+def _aged(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_storage_gc_reconciles_both_ways(client, db_session, tmp_path):
+    owner, owner_token = _make_user_with_token(client, db_session, "file-owner15@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    message_id = _post_message(client, owner_token, form.id)
+    local = storage.LocalStorage(str(tmp_path))
+
+    kept = local.put_stream(io.BytesIO(b"referenced"), 1024)
+    file_repo.create_record(db_session, message_id, "kept.txt", "text/plain", kept.size, kept.path, "txt", kept.sha256)
+    local.put_bytes(f"{kept.path}.preview.txt", b"ref", "text/plain")
+    legacy = tmp_path / "0123abcd_secret.txt"
+    legacy.write_bytes(b"legacy")
+    file_repo.create_record(db_session, message_id, "secret.txt", "text/plain", 6, str(legacy), "txt", None)
+    orphan = local.put_stream(io.BytesIO(b"orphaned"), 1024)
+    local.put_bytes(f"{orphan.path}.preview.webp", b"thumb", "image/webp")
+    stale_tmp = tmp_path / ".upload-abandoned"
+    stale_tmp.write_bytes(b"partial")
+    fresh_orphan = local.put_stream(io.BytesIO(b"upload in flight"), 1024)
+    fresh_tmp = tmp_path / ".upload-inflight"
+    fresh_tmp.write_bytes(b"partial")
+    lost = file_repo.create_record(db_session, message_id, "lost.txt", "text/plain", 4, str(tmp_path / "gone"), "txt", None)
+
+    for obj in local.iter_objects():
+        if obj.location not in (fresh_orphan.path, str(fresh_tmp)):
+            _aged(obj.location, 7200)
+
+    dry = storage_gc.reconcile(db_session, [local], batch_size=2, grace_seconds=3600, pause=0)
+    assert (dry.scanned_objects, dry.skipped_recent) == (8, 2)
+    assert (dry.orphan_blobs, dry.orphan_previews, dry.stale_temp_files) == (1, 1, 1)
+    assert dry.deleted == 0 and os.path.exists(orphan.path)
+    assert (dry.scanned_rows, dry.missing_blobs, dry.missing_file_ids) == (3, 1, [lost.id])
+
+    capped = storage_gc.reconcile(db_session, [local], delete=True, batch_size=2, grace_seconds=3600, max_deletes=1, pause=0)
+    assert capped.deleted == 1
+
+    report = storage_gc.reconcile(db_session, [local], delete=True, batch_size=2, grace_seconds=3600, pause=0)
+    assert capped.deleted + report.deleted == 3
+    remaining = {obj.location for obj in local.iter_objects()}
+    assert remaining == {kept.path, f"{kept.path}.preview.txt", str(legacy), fresh_orphan.path, str(fresh_tmp)}
+
+
+def test_storage_gc_spares_blob_reuploaded_during_sweep(client, db_session, tmp_path, monkeypatch):
+    local = storage.LocalStorage(str(tmp_path))
+    blob = local.put_stream(io.BytesIO(b"dedup race"), 1024)
+    _aged(blob.path, 7200)
+    real_referenced = storage_gc._referenced
+
+    def referenced_then_reuploaded(db, blobs):
+        found = real_referenced(db, blobs)
+        # same content stored again between the batch query and the delete
+        local.put_stream(io.BytesIO(b"dedup race"), 1024)
+        return found
+
+    monkeypatch.setattr(storage_gc, "_referenced", referenced_then_reuploaded)
+    report = storage_gc.reconcile(db_session, [local], delete=True, grace_seconds=3600, pause=0)
+    assert report.orphan_blobs == 1 and report.deleted == 0
+    assert os.path.exists(blob.path)
+
+
+def test_storage_gc_spares_s3_object_deduplicated_during_sweep(db_session, tmp_path, monkeypatch):
+    s3 = _FakeS3()
+    backend = storage.S3Storage(s3, "bucket", spool_dir=str(tmp_path))
+    blob = backend.put_stream(io.BytesIO(b"s3 dedup race"), 1024)
+    key = backend._split(blob.path)[1]
+    s3.modified[("bucket", key)] = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    real_referenced = storage_gc._referenced
+
+    def referenced_then_reuploaded(db, blobs):
+        found = real_referenced(db, blobs)
+        # same content uploaded again between the batch query and the delete
+        backend.put_stream(io.BytesIO(b"s3 dedup race"), 1024)
+        return found
+
+    monkeypatch.setattr(storage_gc, "_referenced", referenced_then_reuploaded)
+    report = storage_gc.reconcile(db_session, [backend], delete=True, grace_seconds=3600, pause=0)
+    assert report.orphan_blobs == 1 and report.deleted == 0
+    assert ("bucket", key) in s3.objects
+    assert s3.uploads == 1  # the duplicate was refreshed in place, not uploaded again
@@ -1,6 +1,12 @@
-from app.models import Message, Block
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from app.models import File, Message, Block
 from app.repositories import blocks as block_repo, forms as form_repo, messages as message_repo
-from tests.conftest import create_user, create_license
+from tests.conftest import async_engine, create_user, create_license, engine
 
 AUTH_BASE = "/api/v1/auth"
 API_BASE = "/api/v1"
@@ -221,3 +227,139 @@ def test_get_messages_form_not_found_and_forbidden(client, db_session):
         headers={"Authorization": f"Bearer {other_token}"},
     )
     assert resp_forbidden.status_code == 403
+
+
+def test_get_messages_cursor_pagination(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "msg-owner9@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    block = block_repo.get_or_create(db_session, form.id)
+    same_ts = datetime(2025, 1, 1, 12, 0, 0)
+    for i in range(7):
+        # identical timestamps force the id tie-breaker to matter
+        db_session.add(Message(block_id=block.id, user_id=owner.id, text_content=f"m{i}", created_at=same_ts, updated_at=same_ts))
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {owner_token}"}
+
+    first = client.get(f"{API_BASE}/messages?form_id={form.id}&page_size=3", headers=headers).json()["data"]
+    assert first["total"] == 7
+    seen = [m["text_content"] for m in first["messages"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        data = client.get(
+            f"{API_BASE}/messages",
+            params={"form_id": form.id, "page_size": 3, "cursor": cursor, "include_total": "false"},
+            headers=headers,
+        ).json()["data"]
+        assert data["total"] is None
+        seen.extend(m["text_content"] for m in data["messages"])
+        cursor = data["next_cursor"]
+    assert seen == [f"m{i}" for i in reversed(range(7))]
+
+    bad = client.get(f"{API_BASE}/messages?form_id={form.id}&cursor=not-a-cursor", headers=headers)
+    assert bad.status_code == 400
+
+    empty = client.get(f"{API_BASE}/messages?form_id={form.id}&page_size=0", headers=headers)
+    assert empty.status_code == 200
+    assert empty.json()["data"]["messages"] == [] and empty.json()["data"]["next_cursor"] is None
+
+
+def test_get_messages_query_count_independent_of_page_size(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "msg-owner10@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    block = block_repo.get_or_create(db_session, form.id)
+    for i in range(12):
+        m = Message(block_id=block.id, user_id=owner.id, text_content=f"m{i}")
+        db_session.add(m)
+        db_session.flush()
+        for j in range(2):
+            db_session.add(File(message_id=m.id, file_name=f"f{i}-{j}.txt", file_type="text/plain", file_size=1, storage_path="/tmp/x"))
+    db_session.commit()
+    form_id = form.id
+    headers = {"Authorization": f"Bearer {owner_token}"}
+
+    def count_queries(page_size):
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            resp = client.get(f"{API_BASE}/messages?form_id={form_id}&page_size={page_size}", headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+        assert resp.status_code == 200
+        files = [f for m in resp.json()["data"]["messages"] for f in m["files"]]
+        assert len(files) == 2 * min(page_size, 12)
+        return len(statements)
+
+    count_queries(1)  # warm the identity cache so both runs resolve the caller the same way
+    assert count_queries(1) == count_queries(10)
+
+
+def test_post_message_is_one_transaction(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "msg-owner11@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+    form_id = form.id
+    headers = {"Authorization": f"Bearer {owner_token}"}
+
+    commits = []
+    statements = []
+
+    def _commit(conn):
+        commits.append(conn)
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0])
+
+    def post(text):
+        commits.clear()
+        statements.clear()
+        event.listen(async_engine.sync_engine, "commit", _commit)
+        event.listen(async_engine.sync_engine, "before_cursor_execute", _record)
+        try:
+            resp = client.post(f"{API_BASE}/message", json={"form_id": form_id, "text_content": text}, headers=headers)
+        finally:
+            event.remove(async_engine.sync_engine, "commit", _commit)
+            event.remove(async_engine.sync_engine, "before_cursor_execute", _record)
+        assert resp.status_code == 200
+        return resp.json()["data"]["message_id"]
+
+    # first message: form access SELECT, block upsert, message INSERT; no refresh after the commit
+    first = post("first")
+    assert len(commits) == 1
+    assert statements == ["SELECT", "INSERT", "INSERT"]
+
+    # block id (and form access) now cached: bump the block, insert the message
+    second = post("second")
+    assert len(commits) == 1
+    assert statements == ["UPDATE", "INSERT"]
+
+    block = db_session.query(Block).filter(Block.form_id == form_id).one()
+    msgs = db_session.query(Message).filter(Message.id.in_([first, second])).order_by(Message.id).all()
+    assert {m.block_id for m in msgs} == {block.id}
+    assert block.reminder_sent == 0
+    assert block.last_message_at == msgs[-1].created_at
+
+
+def test_block_upsert_is_idempotent(db_session):
+    owner = create_user(db_session, email="msg-owner12@example.com", password="StrongPass123", role="client", is_active=1)
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+
+    first = block_repo._upsert(db_session, form.id, "general", None, None)
+    again = block_repo._upsert(db_session, form.id, "general", None, datetime.utcnow())
+    fn_block = block_repo._upsert(db_session, form.id, "function", 5, None)
+    db_session.commit()
+    assert first == again != fn_block
+    assert db_session.query(Block).filter(Block.form_id == form.id).count() == 2
+
+    # the cache is only a shortcut: a stale id falls back to the upsert
+    block_repo.block_ids.put((form.id, "function", 5), 999999)
+    assert block_repo.touch_or_create(db_session, form.id, "function", 5, datetime.utcnow()) == fn_block
+    db_session.commit()
+
+    # the unique key rejects a duplicate even when the upsert path is bypassed
+    db_session.add(Block(form_id=form.id, type="general", target_id=None))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import QueuePool
+
+from app.core.pool_metrics import PoolMetrics, instrumented
+from app.utils import create_access_token
+from tests.conftest import create_user
+
+API_BASE = "/api/v1"
+
+
+def test_metrics_requires_admin(client, db_session):
+    admin = create_user(db_session, email="ops@example.com", role="admin")
+    member = create_user(db_session, email="member@example.com", role="client")
+
+    resp = client.get(f"{API_BASE}/metrics", headers={"Authorization": f"Bearer {create_access_token({'sub': member.id})}"})
+    assert resp.status_code == 403
+
+    resp = client.get(f"{API_BASE}/metrics", headers={"Authorization": f"Bearer {create_access_token({'sub': admin.id})}"})
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert set(data["db_pool"]) == {"sync", "async"}
+    assert "checkout_latency_ms" in data["db_pool"]["sync"]
+    assert "slow_consumer_evictions" in data["websocket"]
+    assert "published" in data["event_bus"]
+    assert {"queued", "sent", "failed", "dead"} <= set(data["email_outbox"])
+    assert {"scans", "reconciliations", "next_due"} <= set(data["reminder_scheduler"])
+    assert data["reminder_scheduler"]["lease"]["is_leader"] is False
+    assert {"p99_ms", "max_ms"} <= set(data["event_loop_lag"])
+
+
+def test_pool_metrics_track_checkouts_overflow_and_timeouts():
+    metrics = PoolMetrics("test")
+    eng = create_engine(
+        "sqlite://",
+        poolclass=instrumented(QueuePool, metrics),
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=0.05,
+    )
+    first = eng.connect()
+    second = eng.connect()  # beyond pool_size -> overflow connection
+    snap = metrics.snapshot(eng.pool)
+    assert snap["checkouts"] == 2
+    assert snap["overflow_checkouts"] == 1
+    assert snap["checked_out"] == 2 and snap["saturation"] == 1.0
+
+    with pytest.raises(exc.TimeoutError):
+        eng.connect()
+    assert metrics.snapshot()["timeouts"] == 1
+
+    first.close()
+    second.close()
+    eng.dispose()
+    # pool recreation keeps the same metrics object
+    eng.connect().close()
+    assert metrics.snapshot()["checkouts"] == 3
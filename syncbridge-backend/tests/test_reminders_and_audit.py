@@ -1,11 +1,22 @@
+import asyncio
+import threading
+import time
 from datetime import datetime, timedelta
 
 import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
 
-from app.models import AuditLog, Block, Form
+from app.models import AuditLog, Block, EmailOutbox, Form
 from app.services import audit as audit_service
-from app.services import reminders
-from tests.conftest import create_license, create_user
+from app.repositories import blocks as block_repo
+from app.repositories import email_outbox as outbox_repo
+from app.repositories import scheduler_leases as lease_repo
+from app.services import background, outbox, reminders
+from app.services.deadlines import DeadlineHeap, deadlines
+from app.services.leases import LeaderLease
+from app.services.loop_monitor import LoopLagMonitor
+from tests.conftest import TestingSessionLocal, create_license, create_user, engine
 
 
 def _make_user_with_token(client, db_session, email, role):
@@ -20,13 +31,34 @@ def _make_user_with_token(client, db_session, email, role):
     return user, token
 
 
-def test_reminder_process_sets_flag_and_sends_email(monkeypatch, db_session):
+@pytest.fixture
+def dispatcher(monkeypatch):
+    """A fresh outbox dispatcher whose DB work uses the test database."""
+    monkeypatch.setattr(background, "SessionLocal", TestingSessionLocal)
+    instance = outbox.OutboxDispatcher(concurrency=4, timeout=5, backoff_base=30, backoff_max=3600, max_attempts=3)
+    monkeypatch.setattr(outbox, "dispatcher", instance)
+    yield instance
+    instance.shutdown()
+
+
+def _dispatch(dispatcher) -> int:
+    return asyncio.run(dispatcher.dispatch_once())
+
+
+def _scan(status, deadline=None, **kwargs) -> int:
+    """One scan of ``status`` the way the scheduler runs it (needs the dispatcher fixture for the DB)."""
+    if deadline is None:
+        deadline = datetime.utcnow() - reminders.THRESHOLDS[status]
+    return asyncio.run(reminders.scan_due_async(status, deadline, **kwargs))
+
+
+def test_reminder_scan_sets_flag_and_sends_email(monkeypatch, db_session, dispatcher):
     send_calls = []
 
-    def fake_send_email(recipients, subject, html):
+    def fake_send_email(recipients, subject, html, idempotency_key=None):
         send_calls.append((tuple(recipients), subject, html))
 
-    monkeypatch.setattr(reminders, "send_email", fake_send_email)
+    monkeypatch.setattr(outbox, "send_email", fake_send_email)
 
     client_user = create_user(db_session, email="rem-client@example.com", password="StrongPass123", role="client", is_active=1)
     dev_user = create_user(db_session, email="rem-dev@example.com", password="StrongPass123", role="developer", is_active=1)
@@ -58,18 +90,20 @@ def test_reminder_process_sets_flag_and_sends_email(monkeypatch, db_session):
     db_session.commit()
     db_session.refresh(block)
 
-    reminders._process_blocks(db_session, [block])
+    assert _scan("urgent") == 1
     db_session.refresh(block)
     assert block.reminder_sent == 1
+    assert send_calls == []  # queued, not sent inline
+    assert _dispatch(dispatcher) == 1
     assert len(send_calls) == 1
     recipients, _, _ = send_calls[0]
     assert "rem-client@example.com" in recipients
     assert "rem-dev@example.com" in recipients
 
 
-def test_reminder_process_no_recipients_sets_flag(monkeypatch, db_session):
+def test_reminder_scan_no_recipients_sets_flag(monkeypatch, db_session, dispatcher):
     send_calls = []
-    monkeypatch.setattr(reminders, "send_email", lambda recipients, subject, html: send_calls.append(recipients))
+    monkeypatch.setattr(outbox, "send_email", lambda recipients, subject, html, idempotency_key=None: send_calls.append(recipients))
 
     # user without usable email (empty string to skip recipient list)
     client_user = create_user(db_session, email="", password="StrongPass123", role="client", is_active=1)
@@ -100,10 +134,514 @@ def test_reminder_process_no_recipients_sets_flag(monkeypatch, db_session):
     db_session.commit()
     db_session.refresh(block)
 
-    reminders._process_blocks(db_session, [block])
+    assert _scan("normal") == 0
     db_session.refresh(block)
     assert block.reminder_sent == 1
+    assert _dispatch(dispatcher) == 0
     assert send_calls == []
+    assert db_session.query(EmailOutbox).count() == 0
+
+
+def _make_form(db_session, client_user, developer=None, title="F"):
+    form = Form(
+        type="mainform",
+        user_id=client_user.id,
+        developer_id=developer.id if developer else None,
+        created_by=client_user.id,
+        title=title,
+        message="msg",
+        budget="b",
+        expected_time="t",
+        status="processing",
+    )
+    db_session.add(form)
+    db_session.commit()
+    db_session.refresh(form)
+    return form
+
+
+def _make_block(db_session, form, status, idle, target_id):
+    block = Block(
+        form_id=form.id,
+        status=status,
+        type="function",
+        target_id=target_id,
+        last_message_at=datetime.utcnow() - idle,
+        reminder_sent=0,
+    )
+    db_session.add(block)
+    db_session.commit()
+    db_session.refresh(block)
+    return block
+
+
+def test_reminder_scan_is_set_based(monkeypatch, db_session, dispatcher):
+    send_calls = []
+    monkeypatch.setattr(
+        outbox, "send_email",
+        lambda recipients, subject, html, idempotency_key=None: send_calls.append((tuple(recipients), idempotency_key)),
+    )
+    client_user = create_user(db_session, email="scan-client@example.com", role="client", is_active=1)
+    dev_user = create_user(db_session, email="scan-dev@example.com", role="developer", is_active=1)
+    forms = [_make_form(db_session, client_user, dev_user, title=f"S{i}") for i in range(3)]
+    due = [_make_block(db_session, forms[i % 3], "urgent", timedelta(minutes=10 + i), i) for i in range(5)]
+    fresh = _make_block(db_session, forms[0], "urgent", timedelta(minutes=1), 100)
+    normal = _make_block(db_session, forms[0], "normal", timedelta(minutes=30), 101)
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 1)[0].upper())
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        queued = _scan("urgent", page_size=2)
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+    assert queued == 5
+    # per page (3 + the empty one): the joined SELECT, then one UPDATE, one re-read of the
+    # marked ids and one batched INSERT into the outbox; no per-block lookups
+    assert statements.count("SELECT") == 4 + 3
+    assert statements.count("UPDATE") == 3
+    assert statements.count("INSERT") == 3
+    db_session.expire_all()
+    assert [db_session.get(Block, b.id).reminder_sent for b in due] == [1] * 5
+    assert db_session.get(Block, fresh.id).reminder_sent == 0
+    assert db_session.get(Block, normal.id).reminder_sent == 0
+
+    assert _dispatch(dispatcher) == 5
+    assert all(recipients == ("scan-client@example.com", "scan-dev@example.com") for recipients, _ in send_calls)
+    assert len({key for _, key in send_calls}) == 5  # every email carries its own idempotency key
+    assert dispatcher.snapshot()["queued"]["total"] == 5
+    assert dispatcher.snapshot()["sent"]["total"] == 5
+    assert db_session.query(EmailOutbox).filter(EmailOutbox.status == "sent").count() == 5
+    assert _dispatch(dispatcher) == 0  # nothing is sent twice
+
+
+def test_reminder_scan_skips_block_touched_before_marking(monkeypatch, db_session, dispatcher):
+    client_user = create_user(db_session, email="scan-touch@example.com", role="client", is_active=1)
+    block = _make_block(db_session, _make_form(db_session, client_user), "urgent", timedelta(minutes=20), 1)
+    fetch_page = reminders._fetch_due_page
+
+    def fetch_then_new_message(*args):
+        page = fetch_page(*args)
+        with engine.begin() as conn:
+            conn.execute(
+                Block.__table__.update().where(Block.id == block.id).values(last_message_at=datetime.utcnow())
+            )
+        return page
+
+    monkeypatch.setattr(reminders, "_fetch_due_page", fetch_then_new_message)
+    assert _scan("urgent") == 0
+    db_session.expire_all()
+    assert db_session.get(Block, block.id).reminder_sent == 0
+    assert db_session.query(EmailOutbox).count() == 0
+
+
+def test_reminder_scan_skips_only_keys_already_queued(db_session, dispatcher):
+    client_user = create_user(db_session, email="scan-overlap@example.com", role="client", is_active=1)
+    form = _make_form(db_session, client_user)
+    first = _make_block(db_session, form, "urgent", timedelta(minutes=20), 1)
+    second = _make_block(db_session, form, "urgent", timedelta(minutes=10), 2)
+    # another scanner whose page only overlapped on the first block queued its email already
+    reminder = reminders.DueReminder(
+        first.id, "urgent", first.type, first.last_message_at, form.id, form.title, ("scan-overlap@example.com",)
+    )
+    assert outbox.enqueue(db_session, reminders._idempotency_key(reminder), ["scan-overlap@example.com"], "s", "h") == 1
+    db_session.commit()
+
+    assert _scan("urgent") == 1
+    db_session.expire_all()
+    assert db_session.get(Block, first.id).reminder_sent == 1
+    assert db_session.get(Block, second.id).reminder_sent == 1
+    assert db_session.query(EmailOutbox).count() == 2
+
+
+def test_outbox_backoff_and_dead_letter(monkeypatch, db_session, dispatcher):
+    attempts = []
+
+    def provider_down(recipients, subject, html, idempotency_key=None):
+        attempts.append(idempotency_key)
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(outbox, "send_email", provider_down)
+    outbox.enqueue(db_session, "test:1", ["a@example.com"], "s", "<p>h</p>")
+    db_session.commit()
+
+    for expected_delay in (30, 60):
+        started = datetime.utcnow()
+        assert _dispatch(dispatcher) == 1
+        row = db_session.query(EmailOutbox).one()
+        db_session.refresh(row)
+        assert row.status == "pending" and row.last_error == "RuntimeError: provider down"
+        delay = (row.next_attempt_at - started).total_seconds()
+        assert expected_delay - 1 < delay < expected_delay + 5
+        assert _dispatch(dispatcher) == 0  # not due yet: no retry storm
+        row.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db_session.commit()
+
+    assert _dispatch(dispatcher) == 1
+    db_session.refresh(row)
+    assert (row.status, row.attempts) == ("dead", 3)
+    assert attempts == ["test:1"] * 3
+    snap = dispatcher.snapshot()
+    assert (snap["failed"]["total"], snap["dead"]["total"], snap["sent"]["total"]) == (3, 1, 0)
+
+
+def test_outbox_send_timeout_schedules_retry(monkeypatch, db_session, dispatcher):
+    dispatcher.timeout = 0.05
+    monkeypatch.setattr(outbox, "send_email", lambda recipients, subject, html, idempotency_key=None: time.sleep(0.3))
+    outbox.enqueue(db_session, "test:slow", ["a@example.com"], "s", "<p>h</p>")
+    db_session.commit()
+
+    assert _dispatch(dispatcher) == 1
+    row = db_session.query(EmailOutbox).one()
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert row.last_error.startswith("timed out")
+    assert dispatcher.snapshot()["failed"]["total"] == 1
+
+
+@pytest.mark.parametrize("returning", [True, False])
+def test_outbox_claim_is_atomic(monkeypatch, db_session, returning):
+    monkeypatch.setattr(engine.dialect, "update_returning", returning)
+    outbox.enqueue_many(db_session, [(f"test:claim:{i}", ["a@example.com"], "s", "<p>h</p>") for i in range(3)])
+    db_session.commit()
+    now = datetime.utcnow()
+    ids = [row.id for row in db_session.query(EmailOutbox.id)]
+
+    other = TestingSessionLocal()
+    try:
+        assert len(outbox_repo.claim_due(other, now, 10, 300)) == 3
+    finally:
+        other.close()
+    # a dispatcher that read the same rows before that claim committed wins none of them
+    assert outbox_repo._claim(db_session, ids, now, now + timedelta(seconds=300)) == set()
+    db_session.rollback()
+    assert outbox_repo.claim_due(db_session, now, 10, 300) == []
+
+
+def test_throughput_counter_reports_last_full_minute():
+    now = [600.0]
+    counter = outbox.ThroughputCounter(clock=lambda: now[0])
+    counter.add(3)
+    now[0] += 30
+    counter.add(2)
+    assert counter.snapshot() == {"total": 5, "last_minute": 0}
+    now[0] += 40  # next minute
+    assert counter.snapshot() == {"total": 5, "last_minute": 5}
+    now[0] += 120  # idle minutes in between
+    assert counter.snapshot() == {"total": 5, "last_minute": 0}
+
+
+def test_reminder_digest_one_email_per_recipient(monkeypatch, db_session, dispatcher):
+    sends = []
+    monkeypatch.setattr(
+        outbox, "send_email",
+        lambda recipients, subject, html, idempotency_key=None: sends.append((tuple(recipients), subject, html)),
+    )
+    client_user = create_user(db_session, email="digest-client@example.com", role="client", is_active=1)
+    dev_user = create_user(db_session, email="digest-dev@example.com", role="developer", is_active=1)
+    solo_user = create_user(db_session, email="digest-solo@example.com", role="client", is_active=1)
+    forms = [_make_form(db_session, client_user, dev_user if i < 2 else None, title=f"Digest{i}") for i in range(4)]
+    for i in range(40):
+        _make_block(db_session, forms[i % 4], "normal", timedelta(hours=50, minutes=i), i)
+    solo_form = _make_form(db_session, solo_user, title="Solo")
+    _make_block(db_session, solo_form, "normal", timedelta(hours=60), 1)
+
+    deadline = datetime.utcnow() - timedelta(hours=48)
+    # pages smaller than a recipient's share: grouping spans the whole cycle
+    assert _scan("normal", deadline, page_size=7, digest=True) == 3
+    assert _scan("normal", deadline, page_size=7, digest=True) == 0
+    assert _dispatch(dispatcher) == 3
+
+    by_recipient = {recipients: (subject, html) for recipients, subject, html in sends}
+    assert set(by_recipient) == {("digest-client@example.com",), ("digest-dev@example.com",), ("digest-solo@example.com",)}
+    subject, html = by_recipient[("digest-client@example.com",)]
+    assert subject.startswith("[SyncBridge] 40 normal blocks")
+    assert html.count("<li>") == 40 and all(f"Digest{i}" in html for i in range(4))
+    assert by_recipient[("digest-dev@example.com",)][1].count("<li>") == 20
+    # a single due block reads as the usual reminder
+    assert by_recipient[("digest-solo@example.com",)][0] == f"[SyncBridge] Normal reminder for form {solo_form.id}"
+    assert db_session.query(Block).filter(Block.reminder_sent == 0).count() == 0
+
+
+def test_reminder_loop_sends_off_the_event_loop(monkeypatch, db_session, dispatcher):
+    sends = []
+
+    def slow_send(recipients, subject, html, idempotency_key=None):
+        time.sleep(0.2)  # blocking HTTP call to the provider
+        sends.append(recipients)
+
+    monkeypatch.setattr(outbox, "send_email", slow_send)
+    client_user = create_user(db_session, email="loop-client@example.com", role="client", is_active=1)
+    form = _make_form(db_session, client_user)
+    blocks = [_make_block(db_session, form, "urgent", timedelta(minutes=10 + i), i) for i in range(8)]
+
+    async def scenario():
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0)
+        try:
+            queued = await reminders.scan_due_async("urgent", datetime.utcnow() - timedelta(minutes=5), page_size=4)
+            await dispatcher.drain()
+            await asyncio.sleep(0.02)
+        finally:
+            await monitor.stop()
+        return queued, monitor.snapshot()
+
+    started = time.perf_counter()
+    queued, lag = asyncio.run(scenario())
+    elapsed = time.perf_counter() - started
+
+    assert queued == 8 and len(sends) == 8
+    assert elapsed < 8 * 0.2  # 4 sends in flight at a time
+    # inline, every send would have stalled the loop for 200ms
+    assert lag["samples"] > 0 and lag["max_ms"] < 150
+    db_session.expire_all()
+    assert all(db_session.get(Block, b.id).reminder_sent == 1 for b in blocks)
+
+
+def test_deadline_heap_keeps_earliest_per_status():
+    heap = DeadlineHeap()
+    wakes = []
+    heap.on_earlier = lambda: wakes.append(1)
+    t0 = datetime(2026, 1, 1)
+
+    assert heap.push("normal", t0 + timedelta(hours=48))
+    assert heap.push("urgent", t0 + timedelta(minutes=5))
+    assert not heap.push("urgent", t0 + timedelta(minutes=9))  # the earlier wake-up covers it
+    assert heap.push("urgent", t0 + timedelta(minutes=1))
+    assert len(wakes) == 3 and heap.next_due() == t0 + timedelta(minutes=1)
+
+    assert heap.pop_due(t0) == set()
+    assert heap.pop_due(t0 + timedelta(minutes=5)) == {"urgent"}  # the superseded 5-minute entry is gone too
+    assert heap.next_due() == t0 + timedelta(hours=48)
+
+
+def test_reminder_scheduler_sleeps_until_next_deadline(monkeypatch, db_session, dispatcher):
+    monkeypatch.setattr(outbox, "send_email", lambda *args, **kwargs: None)
+    t0 = datetime.utcnow()
+    clock = [t0]
+    scheduler = reminders.ReminderScheduler(clock=lambda: clock[0], reconcile_seconds=3600, refresh_seconds=3600)
+    client_user = create_user(db_session, email="sched-client@example.com", role="client", is_active=1)
+    form = _make_form(db_session, client_user)
+    block = Block(form_id=form.id, status="urgent", type="function", target_id=1,
+                  last_message_at=t0 - timedelta(minutes=2), reminder_sent=0)
+    db_session.add(block)
+    db_session.commit()
+
+    # first tick reconciles both statuses and queues the pending block's deadline
+    asyncio.run(scheduler.tick())
+    assert scheduler.metrics["scans"] == 2
+    assert scheduler.delay() == 180
+
+    clock[0] = t0 + timedelta(minutes=2, seconds=59)
+    asyncio.run(scheduler.tick())
+    assert scheduler.metrics["scans"] == 2  # not due yet: no query
+    assert scheduler.delay() == 1
+
+    clock[0] = t0 + timedelta(minutes=3)
+    asyncio.run(scheduler.tick())
+    assert scheduler.metrics["scans"] == 3 and scheduler.metrics["queued"] == 1
+    assert scheduler.delay() == 3600 - 180  # nothing pending: next stop is the reconciliation
+
+    # a reply resets the clock and pushes the new deadline
+    wakes = []
+    deadlines.on_earlier = lambda: wakes.append(1)
+    db_session.expire_all()
+    touched = block_repo.touch_activity(db_session, db_session.get(Block, block.id))
+    due = touched.last_message_at + reminders.THRESHOLDS["urgent"]
+    assert wakes and deadlines.next_due() == due
+    assert scheduler.delay() == (due - clock[0]).total_seconds()
+
+    clock[0] = due
+    asyncio.run(scheduler.tick())
+    assert scheduler.metrics["queued"] == 2
+    assert db_session.query(EmailOutbox).count() == 2
+
+
+def test_reminder_scheduler_sees_activity_from_other_workers(monkeypatch, db_session, dispatcher):
+    monkeypatch.setattr(outbox, "send_email", lambda *args, **kwargs: None)
+    t0 = datetime.utcnow()
+    clock = [t0]
+    # the leader's own heap: pushes made by request handlers in other processes never reach it
+    scheduler = reminders.ReminderScheduler(
+        heap=DeadlineHeap(), clock=lambda: clock[0], reconcile_seconds=900, refresh_seconds=60
+    )
+    client_user = create_user(db_session, email="peer-client@example.com", role="client", is_active=1)
+    form = _make_form(db_session, client_user)
+    block = Block(form_id=form.id, status="urgent", type="function", target_id=1,
+                  last_message_at=t0 - timedelta(hours=1), reminder_sent=1)
+    db_session.add(block)
+    db_session.commit()
+
+    asyncio.run(scheduler.tick())
+    assert scheduler.metrics["queued"] == 0
+    assert scheduler.delay() == 60  # next DB refresh, not the 15-minute reconciliation
+
+    # a reply handled by another worker
+    touched = block_repo.touch_activity(db_session, block)
+    due = touched.last_message_at + reminders.THRESHOLDS["urgent"]
+
+    clock[0] = t0 + timedelta(seconds=60)
+    asyncio.run(scheduler.tick())
+    assert scheduler.heap.next_due() == due
+
+    clock[0] = due
+    asyncio.run(scheduler.tick())
+    assert scheduler.metrics["queued"] == 1
+    assert db_session.query(EmailOutbox).count() == 1
+
+
+def test_reminder_scheduler_wakes_for_earlier_deadline(monkeypatch, dispatcher):
+    scans = []
+
+    async def fake_scan(status, deadline):
+        scans.append(status)
+        return 0
+
+    scheduler = reminders.ReminderScheduler(scan=fake_scan, reconcile_seconds=3600)
+
+    async def scenario():
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.1)
+        reconciled = list(scans)
+        # pushed from a request thread while the scheduler sleeps for the next hour
+        await asyncio.to_thread(deadlines.push, "urgent", datetime.utcnow() + timedelta(seconds=0.1))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return reconciled
+
+    assert asyncio.run(scenario()) == ["normal", "urgent"]
+    assert scans == ["normal", "urgent", "urgent"]
+    assert deadlines.on_earlier is None
+
+
+def test_scheduler_lease_single_holder_and_takeover(db_session):
+    t0 = datetime(2026, 1, 1)
+    assert lease_repo.try_acquire(db_session, "reminders", "a", t0, 30)
+    assert not lease_repo.try_acquire(db_session, "reminders", "b", t0 + timedelta(seconds=10), 30)
+    assert lease_repo.try_acquire(db_session, "reminders", "a", t0 + timedelta(seconds=20), 30)  # heartbeat
+    # a missed the heartbeats: b takes over once the lease has expired
+    assert not lease_repo.try_acquire(db_session, "reminders", "b", t0 + timedelta(seconds=45), 30)
+    assert lease_repo.try_acquire(db_session, "reminders", "b", t0 + timedelta(seconds=51), 30)
+    assert not lease_repo.try_acquire(db_session, "reminders", "a", t0 + timedelta(seconds=52), 30)
+    # a clean release hands it over without waiting for the TTL
+    lease_repo.release(db_session, "reminders", "b", t0 + timedelta(seconds=53))
+    assert lease_repo.try_acquire(db_session, "reminders", "a", t0 + timedelta(seconds=54), 30)
+
+
+def test_leader_lease_runs_work_once_and_fails_over(monkeypatch):
+    monkeypatch.setattr(background, "SessionLocal", TestingSessionLocal)
+    running = []
+
+    def job(name):
+        async def work():
+            running.append(name)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                running.remove(name)
+        return work
+
+    async def scenario():
+        first = LeaderLease("reminders", ttl=2, renew=0.05, holder="worker-1")
+        second = LeaderLease("reminders", ttl=2, renew=0.05, holder="worker-2")
+        first_task = asyncio.create_task(first.run(job("worker-1")))
+        await asyncio.sleep(0.2)
+        second_task = asyncio.create_task(second.run(job("worker-2")))
+        await asyncio.sleep(0.3)
+        before = list(running)
+        # worker-1 shuts down: worker-2 takes over well before the 2s TTL
+        first_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first_task
+        await asyncio.sleep(0.3)
+        after = list(running)
+        second_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second_task
+        return before, after, second.metrics
+
+    before, after, metrics = asyncio.run(scenario())
+    assert before == ["worker-1"]
+    assert after == ["worker-2"]
+    assert metrics["acquired"] == 1 and running == []
+
+
+def test_leader_lease_stops_work_when_heartbeat_stalls(monkeypatch):
+    monkeypatch.setattr(background, "SessionLocal", TestingSessionLocal)
+    t0 = datetime(2024, 1, 1, 12, 0)
+    now = [t0]
+    stalled = threading.Event()
+    released = threading.Event()
+
+    def try_acquire(db, name, holder, at, ttl):
+        if at > t0:
+            stalled.set()
+            released.wait(5)  # the DB hangs on every renewal
+        return True
+
+    monkeypatch.setattr(lease_repo, "try_acquire", try_acquire)
+    monkeypatch.setattr(lease_repo, "release", lambda db, name, holder, at: None)
+    running = []
+
+    async def work():
+        running.append(True)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            running.remove(True)
+
+    async def scenario():
+        lease = LeaderLease("reminders", ttl=30, renew=0.05, holder="worker-1", clock=lambda: now[0])
+        task = asyncio.create_task(lease.run(work))
+        await asyncio.sleep(0.1)
+        started = list(running)
+        # 0.2s of validity left when the renewals start hanging
+        now[0] = t0 + timedelta(seconds=29.8)
+        await asyncio.to_thread(stalled.wait, 5)
+        await asyncio.sleep(0.5)
+        stopped = list(running)
+        released.set()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return started, stopped, lease.metrics
+
+    started, stopped, metrics = asyncio.run(scenario())
+    assert started == [True]
+    assert stopped == []  # cancelled once the lease ran out, while try_acquire was still blocked
+    assert metrics["lost"] == 1 and metrics["errors"] >= 1
+
+
+def test_reminder_scan_skip_locked_mode(monkeypatch, db_session, dispatcher):
+    statements = []
+
+    def _record(state):
+        statements.append(state.statement)
+
+    event.listen(db_session, "do_orm_execute", _record)
+    try:
+        reminders._fetch_due_page(db_session, "urgent", datetime.utcnow(), None, 10, skip_locked=True)
+    finally:
+        event.remove(db_session, "do_orm_execute", _record)
+    # SQLite ignores row locks; check the statement PostgreSQL would get
+    assert "FOR UPDATE OF blocks SKIP LOCKED" in str(statements[0].compile(dialect=postgresql.dialect()))
+
+    client_user = create_user(db_session, email="skip-client@example.com", role="client", is_active=1)
+    form = _make_form(db_session, client_user)
+    blocks = [_make_block(db_session, form, "urgent", timedelta(minutes=10 + i), i) for i in range(5)]
+    queued = asyncio.run(
+        reminders.scan_due_async("urgent", datetime.utcnow() - timedelta(minutes=5), page_size=2, skip_locked=True)
+    )
+    assert queued == 5
+    db_session.expire_all()
+    assert all(db_session.get(Block, b.id).reminder_sent == 1 for b in blocks)
+    assert db_session.query(EmailOutbox).count() == 5
 
 
 def test_audit_log_written_when_enabled(client, db_session):
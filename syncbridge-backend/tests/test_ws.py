@@ -1,9 +1,15 @@
+import asyncio
 import json
+from datetime import datetime
+
 import pytest
 
 from starlette.websockets import WebSocketDisconnect
 
 from app.repositories import forms as form_repo
+from app.services.events import EventBus, MessageDeleted
+from app.services.websocket_manager import BrokerBackplane, ConnectionManager
+from app.utils.frames import encode_frame
 from tests.conftest import create_user, create_license
 
 AUTH_BASE = "/api/v1/auth"
@@ -104,3 +110,229 @@ def test_websocket_developer_allowed_when_available_and_denied_when_processing(c
     with pytest.raises(WebSocketDisconnect):
         with client.websocket_connect(f"{API_BASE}/ws?token={dev_token}&form_id={form_processing.id}") as ws:
             ws.receive_text()
+
+
+class _FakeBroker:
+    """Local stand-in for a redis.asyncio client: fan-out to every subscriber queue."""
+
+    def __init__(self):
+        self.subscribers: list[asyncio.Queue] = []
+        self.published = 0
+
+    async def publish(self, channel, data):
+        self.published += 1
+        for q in list(self.subscribers):
+            q.put_nowait({"type": "message", "channel": channel, "data": data})
+
+    def pubsub(self):
+        return _FakePubSub(self)
+
+
+class _FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.broker.subscribers.append(self.queue)
+
+    async def unsubscribe(self, channel):
+        self.broker.subscribers.remove(self.queue)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+
+class _FakeSocket:
+    def __init__(self):
+        self.sent: list[str] = []
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+def test_broker_backplane_fans_out_across_managers():
+    async def scenario():
+        broker = _FakeBroker()
+        worker_a = ConnectionManager(BrokerBackplane(broker))
+        worker_b = ConnectionManager(BrokerBackplane(broker))
+        ws_a, ws_b, ws_other = _FakeSocket(), _FakeSocket(), _FakeSocket()
+        await worker_a.connect("form:1:general", ws_a)
+        await worker_b.connect("form:1:general", ws_b)
+        await worker_b.connect("form:2:general", ws_other)
+
+        await worker_a.broadcast("form:1:general", {"type": "message", "action": "create"})
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        await worker_a.stop()
+        await worker_b.stop()
+        return broker, ws_a, ws_b, ws_other
+
+    broker, ws_a, ws_b, ws_other = asyncio.run(scenario())
+    assert broker.published == 1
+    assert [json.loads(t)["action"] for t in ws_a.sent] == ["create"]
+    assert [json.loads(t)["action"] for t in ws_b.sent] == ["create"]
+    assert ws_other.sent == []
+
+
+class _FlakyBroker(_FakeBroker):
+    """Drops every live subscription on ``drop()``; the next ``failures`` subscribe attempts fail."""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 0
+
+    def drop(self, failures: int):
+        self.failures = failures
+        for q in list(self.subscribers):
+            q.put_nowait(ConnectionError("connection reset by broker"))
+
+    def pubsub(self):
+        return _FlakyPubSub(self)
+
+
+class _FlakyPubSub(_FakePubSub):
+    async def subscribe(self, channel):
+        if self.broker.failures:
+            self.broker.failures -= 1
+            raise ConnectionError("broker unavailable")
+        await super().subscribe(channel)
+
+    async def unsubscribe(self, channel):
+        if self.queue in self.broker.subscribers:
+            self.broker.subscribers.remove(self.queue)
+
+    async def listen(self):
+        while True:
+            item = await self.queue.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def test_broker_backplane_resubscribes_after_connection_loss(caplog):
+    async def scenario():
+        broker = _FlakyBroker()
+        backplane = BrokerBackplane(broker, retry_base=0.01, retry_max=0.05)
+        worker = ConnectionManager(backplane)
+        ws = _FakeSocket()
+        await worker.connect("form:1:general", ws)
+        await worker.broadcast("form:1:general", {"type": "message", "action": "before"})
+        await asyncio.sleep(0.01)
+
+        broker.drop(failures=2)  # connection lost, broker down for two attempts
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if broker.subscribers:
+                break
+        await worker.broadcast("form:1:general", {"type": "message", "action": "after"})
+        await asyncio.sleep(0.01)
+        await worker.stop()
+        return backplane, ws
+
+    backplane, ws = asyncio.run(scenario())
+    assert [json.loads(t)["action"] for t in ws.sent] == ["before", "after"]
+    assert backplane.resubscribes == 1
+    assert "Backplane subscription" in caplog.text
+
+
+class _StalledSocket(_FakeSocket):
+    """Never finishes a send, like a client whose TCP window is full."""
+
+    def __init__(self):
+        super().__init__()
+        self.closed_with = None
+
+    async def send_text(self, text):
+        await asyncio.Event().wait()
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_consumer_is_evicted_without_blocking_broadcast():
+    async def scenario():
+        mgr = ConnectionManager(queue_size=2)
+        fast, stalled = _FakeSocket(), _StalledSocket()
+        await mgr.connect("room", fast)
+        await mgr.connect("room", stalled)
+
+        for i in range(4):
+            # Each broadcast must return without waiting on the stalled socket
+            await asyncio.wait_for(mgr.broadcast("room", {"n": i}), timeout=0.5)
+            await asyncio.sleep(0)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return mgr, fast, stalled
+
+    mgr, fast, stalled = asyncio.run(scenario())
+    assert [json.loads(t)["n"] for t in fast.sent] == [0, 1, 2, 3]
+    assert stalled.closed_with == 1008
+    assert stalled not in mgr.rooms["room"]
+    assert mgr.metrics["slow_consumer_evictions"] == 1
+
+
+def test_encode_frame_is_compact_and_keeps_datetime_format():
+    ts = datetime(2025, 1, 2, 3, 4, 5, 678)
+    frame = encode_frame({"created_at": ts, "text": "héllo"})
+    assert isinstance(frame, bytes)
+    assert json.loads(frame) == {"created_at": str(ts), "text": "héllo"}
+
+
+def test_posted_message_reaches_room_via_event_bus(client, db_session):
+    owner, owner_token = _make_user_with_token(client, db_session, "ws-owner6@example.com", "client")
+    form = _make_form(owner.id, db_session, status="processing", developer_id=None)
+
+    with client.websocket_connect(f"{API_BASE}/ws?token={owner_token}&form_id={form.id}") as ws:
+        assert json.loads(ws.receive_text())["action"] == "join"
+
+        resp = client.post(
+            f"{API_BASE}/message",
+            json={"form_id": form.id, "text_content": "pushed"},
+            headers={"Authorization": f"Bearer {owner_token}"},
+        )
+        assert resp.status_code == 200
+        event = json.loads(ws.receive_text())
+        assert event["type"] == "message" and event["action"] == "create"
+        assert event["message"]["id"] == resp.json()["data"]["message_id"]
+        assert event["message"]["text_content"] == "pushed"
+
+        # Sync route (threadpool) publishes into the running bus as well
+        block_id = event["message"]["block_id"]
+        resp = client.put(
+            f"{API_BASE}/block/{block_id}/status",
+            json={"status": "urgent"},
+            headers={"Authorization": f"Bearer {owner_token}"},
+        )
+        assert resp.status_code == 200
+        event = json.loads(ws.receive_text())
+        assert event == {"type": "block", "action": "status", "block_id": block_id, "status": "urgent"}
+
+
+def test_event_bus_keeps_room_order_and_isolates_handler_errors():
+    seen = []
+
+    async def record(event):
+        seen.append((event.room, event.message_id))
+
+    async def explode(event):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        bus = EventBus(workers=3)
+        bus.subscribe(MessageDeleted, explode)
+        bus.subscribe(MessageDeleted, record)
+        for i in range(20):
+            bus.publish(MessageDeleted(form_id=i % 2 + 1, block_type="general", target_id=None, message_id=i))
+        await bus.drain()
+        await bus.stop()
+        return bus
+
+    bus = asyncio.run(scenario())
+    for room in ("form:1:general", "form:2:general"):
+        ids = [mid for r, mid in seen if r == room]
+        assert ids == sorted(ids) and len(ids) == 10
+    assert bus.metrics["handler_errors"] == 20
+    assert bus.metrics["delivered"] == 20